@@ -1,21 +1,80 @@
-from .exceptions import UpdateMalformed
-from .handlers import AioHttpWebSocketClient, StarletteWebSocketServer  # handlers; clients
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+from .binary import BinaryTransport
+from .dispatch import Dispatcher
+from .exceptions import SlowConsumer, UpdateMalformed
+from .journal import Journal
 from .json import JSONTransport
+from .metrics import LoggingSink, MemorySink, Sink
 from .model import BaseModel, Field, PrivateAttr  # ListModel,; DictModel,
+from .patch import Patch
 from .transport import Transport
 from .update import Update
 
+if TYPE_CHECKING:
+    from .fleet import Fleet
+    from .handlers import (  # handlers; clients
+        AioHttpWebSocketClient,
+        ASGIWebSocketServer,
+        Loopback,
+        LoopbackClient,
+        LoopbackServer,
+        SessionPool,
+        StarletteWebSocketServer,
+        WebSocketsServer,
+    )
+
 __version__ = "0.1.2"
 
+# handlers and fleets pull in web frameworks, so they are imported on first use rather than with the package, see `__getattr__`
+_lazy = {
+    "Fleet": ".fleet",
+    "StarletteWebSocketServer": ".handlers",
+    "ASGIWebSocketServer": ".handlers",
+    "WebSocketsServer": ".handlers",
+    "AioHttpWebSocketClient": ".handlers",
+    "SessionPool": ".handlers",
+    "Loopback": ".handlers",
+    "LoopbackServer": ".handlers",
+    "LoopbackClient": ".handlers",
+}
+
 
 __all__ = [
-    "__version__",
+    "ASGIWebSocketServer",
+    "AioHttpWebSocketClient",
     "BaseModel",
+    "BinaryTransport",
+    "Dispatcher",
     "Field",
+    "Fleet",
+    "JSONTransport",
+    "Journal",
+    "LoggingSink",
+    "Loopback",
+    "LoopbackClient",
+    "LoopbackServer",
+    "MemorySink",
+    "Patch",
     "PrivateAttr",
+    "SessionPool",
+    "Sink",
+    "StarletteWebSocketServer",
     "Transport",
     "Update",
-    "JSONTransport",
-    "StarletteWebSocketServer",
-    "AioHttpWebSocketClient",
+    "WebSocketsServer",
+    "__version__",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module = _lazy.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = getattr(import_module(module, __name__), name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
@@ -0,0 +1,20 @@
+from typing import List, Type
+
+from .chunks import encode_chunked
+from .json import JSONTransport
+from .update import Update
+
+
+class BinaryTransport(JSONTransport):
+    """JSON encoded updates sent as raw bytes, skipping the decode to and from text"""
+
+    type: Type = bytes
+
+    def encode(self, update: Update) -> bytes:  # type: ignore[override]
+        return update.binary()
+
+    def _encodeLarge(self, update: Update) -> bytes:  # type: ignore[override]
+        return encode_chunked(update)
+
+    def encodeBatch(self, updates: List[bytes]) -> bytes:  # type: ignore[override]
+        return b"[" + b",".join(updates) + b"]"
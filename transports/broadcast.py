@@ -0,0 +1,184 @@
+from asyncio import Lock, Task, get_running_loop
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from .model import BaseModel, conflation_key, conflation_target, overwrites
+from .queues import Policy, UpdateQueue
+from .replay import ReplayBuffer
+from .update import Update
+
+T = TypeVar("T")
+
+
+class Broadcast:
+    """Fan out updates from one shared model to every client hosting it.
+
+    Each update is encoded exactly once, and the same encoded frame
+    is handed to the channel of every subscribed client.
+    """
+
+    model: BaseModel
+    channels: Dict[str, UpdateQueue]  # Client -> (conflation key, encoded frame, update id, what it overwrites, conflation target)
+    echo: Dict[str, bool]  # Client -> T/F
+    replay: Optional[ReplayBuffer]  # recent frames for resuming clients, if enabled
+    published: int  # number of updates published so far
+
+    _encode: Callable[[Update], Awaitable[Any]]
+    _journal: Optional[Callable[[Optional[Update], Any], Awaitable[None]]]  # called with each sequenced update and its frame, see `checkpoint`
+    _task: Optional[Task]
+    _lock: Lock
+    _held: Optional[Update]  # pulled from the model's queue, waiting for the lock to be published, see `settle`
+
+    def __init__(
+        self,
+        model: BaseModel,
+        encode: Callable[[Update], Awaitable[Any]],
+        replay: Optional[ReplayBuffer] = None,
+        journal: Optional[Callable[[Optional[Update], Any], Awaitable[None]]] = None,
+    ):
+        self.model = model
+        self.channels = {}
+        self.echo = {}
+        self.replay = replay
+        self.published = 0
+        self._encode = encode
+        self._journal = journal if replay is not None else None
+        self._task = None
+        self._lock = Lock()
+        self._held = None
+
+    def subscribe(self, client_id: str, echo: bool = True, queue_size: int = 0, queue_policy: Policy = "block") -> UpdateQueue:
+        """Subscribe a client to the model's updates.
+
+        Args:
+            client_id (str): client id
+            echo (bool, optional): Whether or not the client should receive the changes it sent itself. Defaults to True.
+            queue_size (int, optional): bound on the client's channel, 0 for unbounded. Defaults to 0.
+            queue_policy (Policy, optional): what to do once the client's channel is full. Defaults to "block".
+
+        Returns:
+            UpdateQueue: the client's channel of encoded frames
+        """
+        channel = self.channels[client_id] = UpdateQueue(
+            maxsize=queue_size, policy=queue_policy, key=_frame_key, overwrites=_frame_overwrites, target=_frame_target
+        )
+        self.echo[client_id] = echo
+
+        # start pumping the model's outgoing queue on first subscriber
+        if self._task is None:
+            self._task = get_running_loop().create_task(self.run())
+        return channel
+
+    def unsubscribe(self, client_id: str) -> None:
+        self.channels.pop(client_id, None)
+        self.echo.pop(client_id, None)
+
+        # stop pumping once nobody is listening
+        if not self.channels and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def publish(self, update: Update, origin: Optional[str] = None) -> None:
+        """Encode an update once and hand it to every subscribed client.
+
+        Args:
+            update (Update): update to broadcast
+            origin (Optional[str], optional): client id the update came from, if any. Defaults to None.
+        """
+        # updates from the model and from clients may be published concurrently,
+        # keep them in one order from sequencing through to every channel
+        async with self._lock:
+            await self._publish(update, origin)
+
+    async def apply(self, apply: Callable[[], Awaitable[None]], update: Update, origin: str) -> None:
+        """Apply an update from a client to the model, then publish it, with no snapshot taken in between, see `settle`
+
+        Args:
+            apply (Callable[[], Awaitable[None]]): applies the update to the model
+            update (Update): update to broadcast
+            origin (str): client id the update came from
+        """
+        async with self._lock:
+            await apply()
+            await self._publish(update, origin)
+
+    async def settle(self, client_id: str, take: Callable[[], Awaitable[T]]) -> T:
+        """Run `take`, e.g. to snapshot the model for a client which just subscribed, in between two published updates.
+
+        Whatever the model queued beforehand is published to every other client first,
+        and dropped from the client's channel along with anything already in there, as the snapshot reflects it.
+        The client is only sent what is published afterwards, with later sequence numbers.
+
+        Args:
+            client_id (str): client id
+            take (Callable[[], Awaitable[T]]): takes the snapshot
+
+        Returns:
+            T: the result of `take`
+        """
+        async with self._lock:
+            queue = self.model._queue()
+            while self._held is not None or queue.backlog():
+                update = self._held if self._held is not None else queue.get_nowait()
+                self._held = None
+                await self._publish(update, skip=client_id)
+
+            channel = self.channels.get(client_id)
+            if channel is not None:
+                channel.clear()
+            return await take()
+
+    async def _publish(self, update: Update, origin: Optional[str] = None, skip: Optional[str] = None) -> None:
+        if self.replay is not None:
+            # sequence the update, and keep it for clients which resume later
+            update = update.model_copy(update={"seq": self.replay.next()})
+            frame = await self._encode(update)
+            self.replay.append(frame, origin=origin)
+            if self._journal is not None:
+                await self._journal(update, frame)
+        else:
+            frame = await self._encode(update)
+
+        item = (conflation_key(update), frame, update.id, overwrites(update), conflation_target(update))
+        for client_id, channel in list(self.channels.items()):
+            if client_id == skip or (client_id == origin and not self.echo[client_id]):
+                continue
+            # NOTE: a full channel under the `block` policy holds up every client
+            await channel.put(item)
+        self.published += 1
+
+    async def checkpoint(self) -> None:
+        """Give the journal a chance to snapshot the model in between updates"""
+        if self._journal is not None:
+            async with self._lock:
+                await self._journal(None, None)
+
+    async def get(self, client_id: str) -> Tuple[Any, str]:
+        """Next encoded frame for a client, along with the id of the update it encodes"""
+        _, frame, update_id, _, _ = await self.channels[client_id].get()
+        return frame, update_id
+
+    def getNowait(self, client_id: str) -> Tuple[Any, str]:
+        _, frame, update_id, _, _ = self.channels[client_id].get_nowait()
+        return frame, update_id
+
+    async def run(self) -> None:
+        while True:
+            self._held = await self.model.getAsync()
+            async with self._lock:
+                if self._held is None:
+                    # already published by `settle`
+                    continue
+                update, self._held = self._held, None
+                await self._publish(update)
+
+
+def _frame_key(item: Any) -> Any:
+    return item[0]
+
+
+def _frame_overwrites(item: Any) -> Any:
+    return item[3]
+
+
+def _frame_target(item: Any) -> Any:
+    return item[4]
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+Key = Tuple[str, str]  # (model id, model target)
+
+
+def _size(frame: Any) -> int:
+    # NOTE: characters rather than bytes for text, close enough for json and much cheaper to count
+    return len(frame) if isinstance(frame, (str, bytes, bytearray)) else 0
+
+
+class SnapshotCache:
+    """Least recently used encoded snapshots, one per model, valid for a single version of the model.
+
+    Entries for a model are replaced as soon as it is looked up at a newer version,
+    and the least recently used are evicted to stay within `max_bytes` and `max_entries`.
+    """
+
+    max_bytes: int
+    max_entries: int
+    size: int  # bytes held
+    hits: int
+    misses: int
+    evictions: int
+
+    _entries: "OrderedDict[Key, Tuple[Hashable, Any]]"  # key -> (version, frame), most recently used last
+
+    def __init__(self, max_bytes: int, max_entries: int = 1024):
+        """
+        Args:
+            max_bytes (int): budget for encoded snapshots, ones larger than this aren't cached
+            max_entries (int, optional): bound on the number of snapshots. Defaults to 1024.
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Key, version: Hashable) -> Optional[Any]:
+        """The cached frame for a model at `version`, None if there isn't one"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Key, version: Hashable, frame: Any) -> None:
+        """Cache the frame for a model at `version`, replacing any other version"""
+        self.discard(key)
+        size = _size(frame)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (version, frame)
+        self.size += size
+        while self.size > self.max_bytes or len(self._entries) > self.max_entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= _size(evicted)
+            self.evictions += 1
+
+    def discard(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= _size(entry[1])
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
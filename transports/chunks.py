@@ -0,0 +1,115 @@
+from typing import Any, Dict, Iterator, List, Union
+
+from orjson import dumps
+from pydantic import TypeAdapter, ValidationError
+
+from .exceptions import UpdateMalformed
+from .model import BaseModel, attach
+from .update import Chunk, Update
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def _adapter(annotation: Any) -> TypeAdapter:
+    adapter = _adapters.get(annotation)
+    if adapter is None:
+        adapter = _adapters[annotation] = TypeAdapter(annotation)
+    return adapter
+
+
+def encode_chunked(update: Update, chunk_size: int = 1000) -> bytes:
+    """Encode an update like `Update.binary`, a few rows at a time.
+
+    Serialization holds the GIL for as long as each call into pydantic or orjson takes,
+    so a single call for a large model blocks every other thread, including the event loop's.
+    Encoding the model's large list fields in slices gives other threads a chance to run in between.
+    The result decodes to the same update, though the large fields come last in the model.
+
+    Args:
+        update (Update): update with a full model to encode
+        chunk_size (int, optional): items per slice of a large list field. Defaults to 1000.
+
+    Returns:
+        bytes: the encoded update
+    """
+    model = update.model
+    if model is None:
+        return update.binary()
+
+    large = {
+        name: field.annotation
+        for name, field in model.__class__.model_fields.items()
+        if isinstance(model.__dict__[name], list) and len(model.__dict__[name]) > chunk_size
+    }
+    if not large:
+        return update.binary()
+
+    head = dumps(update.dict(exclude={"model"}))
+    body = dumps(model.model_dump(exclude=set(large), serialize_as_any=True))
+
+    parts: List[bytes] = [body[1:-1]] if body != b"{}" else []
+    for name, annotation in large.items():
+        adapter, rows = _adapter(annotation), model.__dict__[name]
+        slices = [dumps(adapter.dump_python(rows[i : i + chunk_size], serialize_as_any=True))[1:-1] for i in range(0, len(rows), chunk_size)]
+        parts.append(dumps(name) + b":[" + b",".join(slices) + b"]")
+
+    # splice the model back in as the update's last key
+    return head[:-1] + b',"model":{' + b",".join(parts) + b"}}"
+
+
+def split(update: Update, chunk_size: int) -> Iterator[Union[Update, Chunk]]:
+    """Split a snapshot into a head, with its large list fields left empty, followed by chunks of their items.
+
+    Only the lists are copied up front, so items are encoded one chunk at a time as they are sent,
+    and the peer can assemble the model as they arrive, see `extend`.
+
+    Args:
+        update (Update): snapshot to split
+        chunk_size (int): items per chunk, lists no longer than this are sent in the head
+
+    Returns:
+        Iterator[Union[Update, Chunk]]: the head, then its chunks
+    """
+    model = update.model
+    if model is None or chunk_size <= 0:
+        yield update
+        return
+
+    large = {
+        name: list(model.__dict__[name])
+        for name in model.__class__.model_fields
+        if isinstance(model.__dict__[name], list) and len(model.__dict__[name]) > chunk_size
+    }
+    if not large:
+        yield update
+        return
+
+    chunks = sum((len(rows) + chunk_size - 1) // chunk_size for rows in large.values())
+    yield update.model_copy(update={"model": model.model_copy(update={name: [] for name in large}), "chunks": chunks})
+    for name, rows in large.items():
+        for i in range(0, len(rows), chunk_size):
+            # addressed to the model itself, which a subscription's snapshot may not be
+            yield Chunk(id=update.id, model_target=model.id, field=name, items=rows[i : i + chunk_size])
+
+
+def extend(model: BaseModel, field: str, items: List[Any]) -> None:
+    """Append the items of a chunk to the model's list field, validated like the field itself
+
+    Args:
+        model (BaseModel): model the chunk is for
+        field (str): name of the list field
+        items (List[Any]): items, as decoded from the wire
+    """
+    annotation = model.__class__.model_fields[field].annotation if field in model.__class__.model_fields else None
+    if annotation is None or not isinstance(model.__dict__[field], list):
+        raise UpdateMalformed(f"Chunk for {model.__class__.__name__} has no list field ({field})")
+    try:
+        items = _adapter(annotation).validate_python(items)
+    except ValidationError as e:
+        raise UpdateMalformed(str(e)) from e
+    getattr(model, field).extend(items)
+
+    transport = model._transport
+    if transport is not None:
+        # nested models become reachable by id, like the rest of the snapshot
+        attach(items, transport, root=transport.roots.get(model.id, model.id))
@@ -1,9 +1,11 @@
-from asyncio import gather
-from typing import Optional, Type
+from asyncio import sleep
+from random import uniform
+from typing import Optional, Tuple, Type
 
 from .connection import Connection
 from .model import BaseModel
 from .transport import Transport
+from .update import Subscription
 
 
 class Client(Connection):
@@ -11,16 +13,36 @@ class Client(Connection):
     _transport_type: Type
     _model: BaseModel
     _client_id: str = ""
+    _reconnect: bool
+    _backoff: float  # initial delay between reconnect attempts, in seconds
+    _max_backoff: float
+    _partial: bool  # return models before the rest of a chunked snapshot arrives
+    _closed: bool = False
+
+    # errors from `connect` which are worth retrying, to be overloaded by specific client implementations
+    _connect_errors: Tuple[Type[BaseException], ...] = (OSError,)
 
     def __init__(
         self,
         transport: Transport,
         client_id: Optional[str] = None,
+        batch_size: int = 1,
+        batch_time: float = 0.0,
+        reconnect: bool = False,
+        backoff: float = 0.1,
+        max_backoff: float = 10.0,
+        partial: bool = False,
         **kwargs,
     ):
         self._transport = transport
         self._transport_type = transport.type
         self._client_id = client_id or ""
+        self._batch_size = batch_size
+        self._batch_time = batch_time
+        self._reconnect = reconnect
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._partial = partial
 
     async def open(self) -> BaseModel:
         # wait for client connection
@@ -33,9 +55,61 @@ class Client(Connection):
         initial = await self.receive()
 
         # register and return
-        return await self._transport.onInitial(initial)
+        self._model = await self._transport.onInitial(initial, client_id=self._client_id)
+        if not self._partial:
+            # read the rest of a chunked snapshot, otherwise `handle` fills it in, see `Transport.loaded`
+            while self._model.id in self._transport.loading:
+                await self._transport.receive(client_id=self._client_id, update=await self.receive())
+        return self._model
+
+    async def reconnect(self) -> None:
+        """Reconnect after the connection dropped, retrying with jittered exponential backoff.
+
+        The server is told the last update we saw, see `lastSeq`, and sends
+        only the updates we missed if it still has them, or a full snapshot otherwise,
+        which our model takes the id of if the server hosts each client its own copy.
+        Either way, they are picked up by the receiver like any other update.
+        """
+        delay = self._backoff
+        while not self._closed:
+            # full jitter, so that clients dropped together don't all come back together
+            await sleep(uniform(0, delay))
+            try:
+                await self.connect(client_id=self._client_id)
+                if getattr(self, "_model", None) is not None:
+                    # servers which host each client its own copy send a new one, see `Transport.rebind`
+                    self._transport.rebind(client_id=self._client_id, model_id=self._model.id)
+                return
+            except self._connect_errors:
+                delay = min(delay * 2, self._max_backoff)
+
+    async def subscribe(self, model_id: str) -> BaseModel:
+        """Receive another model over this connection, `handle` must be running to receive it
+
+        Args:
+            model_id (str): id of a model served by the server
+
+        Returns:
+            BaseModel: the model, kept in sync like the one returned by `open`
+        """
+        snapshot = self._transport.expect(model_id)
+        await self.send(self._transport.encode(Subscription(op="subscribe", model_target=model_id)))  # type: ignore[arg-type]
+        model = await snapshot
+        return model if self._partial else await self._transport.loaded(model.id)
+
+    async def unsubscribe(self, model: BaseModel) -> None:
+        """Stop receiving a model returned by `subscribe`"""
+        self._transport.unsubscribe(client_id=self._client_id, model_id=model.id)
+        await self.send(self._transport.encode(Subscription(op="unsubscribe", model_target=model.id)))  # type: ignore[arg-type]
+
+    def lastSeq(self) -> Optional[int]:
+        """Sequence number of the last update received from the server, None if unknown"""
+        model = getattr(self, "_model", None)
+        return None if model is None else self._transport.seqs.get(model.id)
 
     async def close(self):
+        self._closed = True
+
         # Notify transport of connection
         await self._transport.disconnect()
         await self.disconnect()
@@ -47,7 +121,12 @@ class Client(Connection):
     async def handle(self) -> None:
         try:
             # Now enter an infinite loop listening for updates from client/server forever
-            await gather(self.sender(), self.receiver(), return_exceptions=True)
+            await self.run()
+
+            # until closed, pick up where we left off if the connection drops
+            while self._reconnect and not self._closed:
+                await self.reconnect()
+                await self.run()
         except:
             raise
         finally:
@@ -1,15 +1,38 @@
 from abc import ABC, abstractmethod
+from asyncio import FIRST_COMPLETED, ensure_future, gather, get_running_loop, wait
 from contextlib import contextmanager
-from typing import Optional, Type
+from typing import Any, Optional, Type
 
+from .exceptions import SlowConsumer
 from .transport import Transport
 from .update import Update
 
+# websocket subprotocols used to negotiate the frame type
+TEXT_PROTOCOL = "transports.text"
+BINARY_PROTOCOL = "transports.binary"
+
 
 class Connection(ABC):
     _transport: Transport
     _transport_type: Type
     _client_id: str
+    _binary: bool = False  # negotiated frame type, text if False
+    _batch_size: int = 1  # max updates per frame, 1 disables batching
+    _batch_time: float = 0.0  # seconds at most to wait for more updates while a batch is short
+
+    def _to_frame(self, update: Any) -> Any:
+        """convert an encoded update to the negotiated frame type"""
+        if self._binary:
+            return update.encode() if isinstance(update, str) else update
+        return update.decode() if isinstance(update, bytes) else update
+
+    def _from_frame(self, frame: Any) -> Any:
+        """convert a received frame to the transport's type"""
+        if self._transport_type is bytes and isinstance(frame, str):
+            return frame.encode()
+        if self._transport_type is str and isinstance(frame, bytes):
+            return frame.decode()
+        return frame
 
     @contextmanager
     def handleDisconnect(self):
@@ -28,24 +51,85 @@ class Connection(ABC):
         except (KeyboardInterrupt,):
             ...
 
+    async def run(self) -> None:
+        """Run the sender and receiver until either one stops, e.g. on disconnect, raising whatever stopped it otherwise"""
+        tasks = [ensure_future(self.sender()), ensure_future(self.receiver())]
+        try:
+            done, _ = await wait(tasks, return_when=FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await gather(*tasks, return_exceptions=True)
+
+        for task in done:
+            # e.g. a failed update, see `Dispatcher`, disconnects are handled by `handleDisconnect`
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()  # type: ignore[misc]
+
     async def receiver(self) -> None:
         with self.handleDisconnect():
             while True:
                 # grab from client
                 update: Update = await self.receive()
 
+                if self._transport.sink is not None:
+                    self._transport.onReceived(client_id=self._client_id, frame=update)
+
                 # send to transport to be sent to models
                 await self._transport.receive(client_id=self._client_id, update=update)
 
     async def sender(self) -> None:
         """An infinite async generator that should"""
         with self.handleDisconnect():
-            while True:
-                # get update from transport derived from models
-                update: Update = await self._transport.send(client_id=self._client_id)
+            try:
+                while True:
+                    # get update from transport derived from models
+                    update: Update = await self._transport.send(client_id=self._client_id)
+
+                    if self._batch_size > 1:
+                        # combine with anything else already queued
+                        update = await self._batch(update)
+
+                    # send to client
+                    await self.send(update)
+
+                    if self._transport.sink is not None:
+                        self._transport.onSent(client_id=self._client_id, frame=update)
+            except SlowConsumer:
+                # client can't keep up and its queue overflowed, drop it
+                await self.disconnect()
+
+    async def _batch(self, update: Any) -> Any:
+        """drain queued updates behind `update` into a single frame, up to the batch size,
+        waiting up to the batch time in total for more while the batch is short"""
+        loop = get_running_loop()
+        deadline = loop.time() + self._batch_time
+        updates = [update]
+        while len(updates) < self._batch_size:
+            queued = self._transport.sendNowait(client_id=self._client_id)
+            if queued is None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                # give the producers a chance to fill up the batch
+                queued = await self._next(remaining)
+                if queued is None:
+                    break
+            updates.append(queued)
+
+        if len(updates) == 1:
+            return update
+        return self._transport.encodeBatch(updates)
 
-                # send to client
-                await self.send(update)
+    async def _next(self, timeout: float) -> Optional[Any]:
+        """the next update from the transport, or None if there is none within `timeout` seconds"""
+        pending = ensure_future(self._transport.send(client_id=self._client_id))
+        done, _ = await wait((pending,), timeout=timeout)
+        if not done:
+            # NOTE: safe, nothing is taken off the queues until the mux is woken up
+            pending.cancel()
+            return None
+        return pending.result()
 
     @abstractmethod
     async def connect(self, client_id: Optional[str] = None) -> str: ...
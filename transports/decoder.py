@@ -0,0 +1,184 @@
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Type, Union, get_args, get_origin
+
+from orjson import loads
+from pydantic import BaseModel as PydanticBaseModel, PrivateAttr, ValidationError, create_model
+
+from .exceptions import UpdateMalformed
+from .model import BaseModel
+from .patch import Patch
+from .update import Update
+
+Converter = Callable[[Any], Any]
+
+# `Update.dict` leads with the model type, so it can be read without parsing the frame
+_PREFIX = '{"model_type":"'
+_PREFIX_BYTES = _PREFIX.encode()
+
+
+def peek_model_type(update: Union[str, bytes]) -> Optional[str]:
+    """Read the model type from the front of an encoded update, None if it isn't there"""
+    if isinstance(update, str):
+        if update.startswith(_PREFIX):
+            end = update.find('"', len(_PREFIX))
+            return update[len(_PREFIX) : end] if end > 0 else None
+    elif update.startswith(_PREFIX_BYTES):
+        end = update.find(b'"', len(_PREFIX_BYTES))
+        return update[len(_PREFIX_BYTES) : end].decode() if end > 0 else None
+    return None
+
+
+#################
+# Trusted plans #
+#################
+class _Plan:
+    """How to build one model type from trusted json"""
+
+    converters: Dict[str, Converter]  # Field name -> converter from json
+    private: Optional[Dict[str, Any]]  # Private name -> default, None if any need a factory
+    fields: int  # number of fields
+
+    def __init__(self):
+        self.converters = {}
+        self.private = {}
+        self.fields = 0
+
+
+_plans: Dict[Type[BaseModel], _Plan] = {}
+_IMMUTABLE = (type(None), bool, int, float, str, bytes)
+
+
+class _Private(PydanticBaseModel):
+    _private: int = PrivateAttr(0)
+
+
+# what pydantic runs after constructing a model with private attributes and no `model_post_init` of its own
+_INIT_PRIVATE = _Private.model_post_init
+
+
+def _unwrap(annotation: Any) -> Any:
+    # Optional[X] -> X
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _converter(annotation: Any) -> Optional[Converter]:
+    """build a function turning raw json into `annotation`, None if it can be used as is"""
+    annotation = _unwrap(annotation)
+    origin, args = get_origin(annotation), get_args(annotation)
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return lambda value: construct(annotation, value)
+    if annotation is datetime:
+        return lambda value: datetime.fromisoformat(value) if isinstance(value, str) else value
+    if annotation is date:
+        return lambda value: date.fromisoformat(value) if isinstance(value, str) else value
+    if origin in (list, set, frozenset, tuple) and args:
+        item = _converter(args[0])
+        if origin is list:
+            return (lambda value: [item(v) for v in value]) if item else None
+        return lambda value: origin(item(v) for v in value) if item else origin(value)
+    if origin is dict and len(args) == 2:
+        item = _converter(args[1])
+        return (lambda value: {k: item(v) for k, v in value.items()}) if item else None
+    return None
+
+
+def _plan(model_type: Type[BaseModel]) -> _Plan:
+    plan = _plans.get(model_type)
+    if plan is None:
+        # register before building so self-referencing models terminate
+        plan = _plans[model_type] = _Plan()
+        plan.fields = len(model_type.model_fields)
+        for name, field in model_type.model_fields.items():
+            converter = _converter(field.annotation)
+            if converter is not None:
+                plan.converters[name] = converter
+
+        for name, private in model_type.__private_attributes__.items():
+            if private.default_factory is not None or not isinstance(private.default, _IMMUTABLE):
+                plan.private = None
+                break
+            plan.private[name] = private.default  # type: ignore[index]
+
+        if model_type.__pydantic_post_init__ is not None and model_type.model_post_init is not _INIT_PRIVATE:
+            # custom `model_post_init`, beyond pydantic's own private attribute setup
+            plan.private = None
+    return plan
+
+
+def construct(model_type: Type[BaseModel], data: Any) -> Any:
+    """Build a model from trusted json data without validating it"""
+    if not isinstance(data, dict):
+        return data
+
+    plan = _plan(model_type)
+    for name, converter in plan.converters.items():
+        value = data.get(name)
+        if value is not None:
+            data[name] = converter(value)
+
+    if plan.private is None or len(data) != plan.fields:
+        # missing fields or nontrivial initialization, let pydantic handle it
+        return model_type.model_construct(**data)
+
+    # equivalent to `model_construct` for complete data, without re-resolving every default
+    model = model_type.__new__(model_type)
+    object.__setattr__(model, "__dict__", data)
+    object.__setattr__(model, "__pydantic_fields_set__", set(data))
+    object.__setattr__(model, "__pydantic_extra__", None)
+    object.__setattr__(model, "__pydantic_private__", plan.private.copy())
+    return model
+
+
+###########
+# Decoder #
+###########
+class Decoder:
+    """Compiled decoder for updates to one model type.
+
+    By default, updates are validated by pydantic-core straight from the wire.
+    Trusted decoders skip validation entirely, and should only be used
+    between peers which are known to send well formed updates.
+    """
+
+    model_type: Type[BaseModel]
+    update_type: Type[Update]
+
+    def __init__(self, model_type: Type[BaseModel]):
+        self.model_type = model_type
+        # an `Update` specialized to carry this model type
+        self.update_type = create_model(f"{model_type.__name__}Update", __base__=Update, model=(Optional[model_type], None))  # type: ignore[call-overload]
+
+        # compile eagerly
+        _plan(model_type)
+
+    def decode(self, update: Union[str, bytes]) -> Update:
+        try:
+            return self.update_type.model_validate_json(update)
+        except ValidationError as e:
+            raise UpdateMalformed(str(e)) from e
+
+    def decodeTrusted(self, update: Union[str, bytes]) -> Update:
+        return self.decodeDataTrusted(loads(update))
+
+    def decodeData(self, data: Dict[str, Any]) -> Update:
+        """like `decode`, from json already parsed, e.g. an element of a batch"""
+        try:
+            return self.update_type.model_validate(data)
+        except ValidationError as e:
+            raise UpdateMalformed(str(e)) from e
+
+    def decodeDataTrusted(self, data: Dict[str, Any]) -> Update:
+        """like `decodeTrusted`, from json already parsed, e.g. an element of a batch"""
+        if data.get("model") is not None:
+            data["model"] = construct(self.model_type, data["model"])
+        if data.get("patch") is not None:
+            data["patch"] = [Patch.model_construct(**patch) for patch in data["patch"]]
+        for name in ("created", "modified"):
+            if isinstance(data.get(name), str):
+                data[name] = datetime.fromisoformat(data[name])
+        return self.update_type.model_construct(**data)
@@ -0,0 +1,129 @@
+from asyncio import Event, Semaphore, get_running_loop
+from collections import deque
+from concurrent.futures import Executor
+from sys import modules
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .exceptions import UpdateMalformed
+from .metrics import Sink
+
+
+class Dispatcher:
+    """Apply incoming updates concurrently across models, in order within each one.
+
+    Every key gets a lane, drained by its own task while it has work, so a slow
+    handler only holds up later updates with the same key. The number of updates
+    dispatched but not yet handled is bounded, past which `dispatch` waits, which
+    in turn stops the connection reading from its socket.
+
+    Synchronous handlers run on the loop, or in `executor` if given. Models are
+    updated in place, so the executor must be a thread pool, process pools are refused.
+
+    Malformed updates are counted as `updates.rejected` in `sink` and skipped.
+    Any other error stops the lane, dropping whatever was queued behind it,
+    and is raised by the next call to `dispatch` or `join`, e.g. to end the connection.
+    """
+
+    executor: Optional[Executor]
+    max_inflight: int
+    sink: Optional[Sink]  # where rejected updates are counted, the transport's if None
+    inflight: int  # updates dispatched but not yet handled
+    error: Optional[BaseException]  # the first unexpected error from a handler, until raised
+
+    _lanes: Dict[Any, Deque[Tuple[Callable[..., Awaitable[Any]], Tuple[Any, ...]]]]
+    _slots: Semaphore
+    _idle: Event
+
+    def __init__(self, executor: Optional[Executor] = None, max_inflight: int = 1024, sink: Optional[Sink] = None):
+        """
+        Args:
+            executor (Optional[Executor], optional): thread pool to run synchronous handlers in, see `call`. Defaults to None, on the loop.
+            max_inflight (int, optional): bound on updates dispatched but not yet handled. Defaults to 1024.
+            sink (Optional[Sink], optional): where rejected updates are counted. Defaults to None, the transport's.
+        """
+        # NOTE: looked up rather than imported, which would pull in multiprocessing on startup
+        process = modules.get("concurrent.futures.process")
+        if process is not None and isinstance(executor, process.ProcessPoolExecutor):
+            # handlers are bound to models in this process, which they update in place
+            raise TypeError("Dispatcher can't run handlers in a process pool, use a thread pool instead")
+        self.executor = executor
+        self.max_inflight = max_inflight
+        self.sink = sink
+        self.inflight = 0
+        self.error = None
+        self._lanes = {}
+        self._slots = Semaphore(max_inflight)
+        self._idle = Event()
+        self._idle.set()
+
+    async def dispatch(self, key: Any, handler: Callable[..., Awaitable[Any]], *args: Any) -> None:
+        """Queue `handler(*args)` behind everything else dispatched with the same key,
+        waiting first if too many updates are in flight.
+
+        Args:
+            key (Any): ordering key, e.g. the id of the targeted model
+            handler (Callable[..., Awaitable[Any]]): coroutine function to run
+        """
+        self._raise()
+        await self._slots.acquire()
+        self.inflight += 1
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self._idle.clear()
+            get_running_loop().create_task(self._drain(key, lane))
+        lane.append((handler, args))
+
+    async def call(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run a synchronous handler, in the executor if there is one"""
+        if self.executor is None:
+            return function(*args)
+        return await get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def join(self) -> None:
+        """Wait for everything dispatched so far to be handled"""
+        await self._idle.wait()
+        self._raise()
+
+    def _raise(self) -> None:
+        error = self.error
+        if error is not None:
+            self.error = None
+            raise error
+
+    async def _drain(self, key: Any, lane: Deque[Tuple[Callable[..., Awaitable[Any]], Tuple[Any, ...]]]) -> None:
+        try:
+            while lane:
+                handler, args = lane.popleft()
+                try:
+                    await handler(*args)
+                except (UpdateMalformed, ValidationError) as e:
+                    self._rejected(key, e)
+                except Exception as e:
+                    # nobody awaits the lane, see `_raise`
+                    if self.error is None:
+                        self.error = e
+                    break
+                finally:
+                    self.inflight -= 1
+                    self._slots.release()
+        finally:
+            # left behind an unexpected error
+            for _ in range(len(lane)):
+                self.inflight -= 1
+                self._slots.release()
+
+            # nothing can be dispatched between the last check and here
+            del self._lanes[key]
+            if not self._lanes:
+                self._idle.set()
+
+    def _rejected(self, key: Any, error: Exception) -> None:
+        if self.sink is not None:
+            self.sink.count("updates.rejected", error=error.__class__.__name__)
+            return
+        # nobody is waiting on the result, so report like any other task
+        get_running_loop().call_exception_handler({"message": f"Rejected update for {key}", "exception": error})
@@ -1 +1,4 @@
 class UpdateMalformed(RuntimeError): ...
+
+
+class SlowConsumer(RuntimeError): ...
@@ -0,0 +1,90 @@
+from asyncio import Semaphore, Task, ensure_future, gather
+from typing import List, Optional, Sequence
+
+from aiohttp import ClientError
+
+from .client import Client
+from .exceptions import UpdateMalformed
+from .model import BaseModel
+
+# why a client may fail to open or drop out, anything else is a bug and is raised
+_FAILURES = (ClientError, OSError, UpdateMalformed)
+
+
+class Fleet:
+    """Many clients driven on one event loop, e.g. to aggregate several servers, or as a load generator.
+
+    Clients are opened a bounded number at a time, so that hundreds of them don't all hit
+    the servers at once, then handled concurrently until the fleet is closed. Clients which
+    fail to open or drop out, on connection errors or malformed updates, are kept in `errors`
+    rather than taking the rest of the fleet down.
+    """
+
+    clients: List[Client]
+    models: List[Optional[BaseModel]]  # model of each client, None until opened
+    errors: List[Optional[BaseException]]  # why each client failed, if it did
+
+    _concurrency: int
+    _tasks: List[Task]
+
+    def __init__(self, clients: Sequence[Client], concurrency: int = 64):
+        """
+        Args:
+            clients (Sequence[Client]): clients to drive, each with its own transport
+            concurrency (int, optional): bound on the number of clients opening at once. Defaults to 64.
+        """
+        self.clients = list(clients)
+        self.models = [None] * len(self.clients)
+        self.errors = [None] * len(self.clients)
+        self._concurrency = concurrency
+        self._tasks = []
+
+    async def open(self) -> List[Optional[BaseModel]]:
+        """Open every client, returning their models, None for those which failed"""
+        semaphore = Semaphore(self._concurrency)
+
+        async def _open(index: int, client: Client) -> None:
+            async with semaphore:
+                try:
+                    self.models[index] = await client.open()
+                except _FAILURES as e:
+                    self.errors[index] = e
+
+        await gather(*(_open(index, client) for index, client in enumerate(self.clients)))
+        return self.models
+
+    def start(self) -> None:
+        """Start handling every opened client in the background"""
+        for index, client in enumerate(self.clients):
+            if self.models[index] is not None:
+                self._tasks.append(ensure_future(self._handle(index, client)))
+
+    async def run(self) -> None:
+        """Open and handle every client, until they are all closed"""
+        await self.open()
+        self.start()
+        await gather(*self._tasks)
+
+    async def _handle(self, index: int, client: Client) -> None:
+        try:
+            await client.handle()
+        except _FAILURES as e:
+            self.errors[index] = e
+
+    @property
+    def connected(self) -> int:
+        """Number of clients opened and still running"""
+        return sum(not task.done() for task in self._tasks)
+
+    async def close(self) -> None:
+        await gather(*(client.close() for client, model in zip(self.clients, self.models) if model is not None), return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def __aenter__(self) -> "Fleet":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
@@ -1,2 +1,36 @@
-from .aiohttp_client import AioHttpWebSocketClient
-from .starlette import StarletteWebSocketServer
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .aiohttp_client import AioHttpWebSocketClient, SessionPool
+    from .asgi import ASGIWebSocketServer, asgi_app
+    from .loopback import Loopback, LoopbackClient, LoopbackServer
+    from .starlette import StarletteWebSocketServer
+    from .websockets_server import WebSocketsServer
+
+# handlers import their web framework, so each is only imported once used
+_handlers = {
+    "AioHttpWebSocketClient": ".aiohttp_client",
+    "SessionPool": ".aiohttp_client",
+    "ASGIWebSocketServer": ".asgi",
+    "asgi_app": ".asgi",
+    "Loopback": ".loopback",
+    "LoopbackClient": ".loopback",
+    "LoopbackServer": ".loopback",
+    "StarletteWebSocketServer": ".starlette",
+    "WebSocketsServer": ".websockets_server",
+}
+
+__all__ = list(_handlers)
+
+
+def __getattr__(name: str) -> Any:
+    module = _handlers.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = getattr(import_module(module, __name__), name)
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_handlers))
@@ -1,19 +1,77 @@
+from contextlib import contextmanager
 from typing import Optional, Type
 
-from aiohttp import ClientSession, ClientWebSocketResponse
+from aiohttp import ClientConnectionError, ClientError, ClientSession, ClientWebSocketResponse, TCPConnector, WSMsgType
 
 from ..client import Client
+from ..connection import BINARY_PROTOCOL, TEXT_PROTOCOL
 from ..json import JSONTransport
 
 
+class SessionPool:
+    """One `ClientSession` shared by many clients, so that they share a single connection pool
+    and DNS cache rather than each holding its own. Closing a client leaves the pool open,
+    close the pool once every client using it is done.
+
+    NOTE: an open websocket holds on to its connection, so `limit` bounds the number of clients connected at once,
+    and clients beyond it wait in `connect` for a connection to free up.
+    """
+
+    _limit: int
+    _limit_per_host: int
+    _ttl_dns_cache: Optional[int]
+    _options: dict
+    _session: Optional[ClientSession]
+
+    def __init__(self, limit: int = 0, limit_per_host: int = 0, ttl_dns_cache: Optional[int] = 10, **kwargs):
+        """
+        Args:
+            limit (int, optional): bound on connections across all hosts, 0 for unbounded. Defaults to 0.
+            limit_per_host (int, optional): bound on connections to any one host, 0 for unbounded. Defaults to 0.
+            ttl_dns_cache (Optional[int], optional): seconds to cache DNS lookups for, None forever. Defaults to 10.
+            kwargs: `ClientSession` options, e.g. `headers` or `timeout`
+        """
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._ttl_dns_cache = ttl_dns_cache
+        self._options = kwargs
+        self._session = None
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    def session(self) -> ClientSession:
+        """The shared session, created on first use, must be called on the event loop running the clients"""
+        if self.closed:
+            connector = TCPConnector(limit=self._limit, limit_per_host=self._limit_per_host, ttl_dns_cache=self._ttl_dns_cache)
+            self._session = ClientSession(connector=connector, **self._options)
+        return self._session  # type: ignore[return-value]
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "SessionPool":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
 class AioHttpWebSocketClient(Client):
     _transport: JSONTransport
     _transport_type: Type = str
 
     _url: str
-    _session: ClientSession
+    _pool: Optional[SessionPool]  # shared sessions, else the client has its own
+    _session: Optional[ClientSession] = None
     _websocket: ClientWebSocketResponse
     _client_header: str
+    _seq_header: str
+
+    _connect_errors = (ClientError, OSError)
 
     def __init__(
         self,
@@ -21,23 +79,59 @@ class AioHttpWebSocketClient(Client):
         transport: JSONTransport,
         client_id: Optional[str] = None,
         client_header: str = "client-id",
+        seq_header: str = "last-seq",
+        pool: Optional[SessionPool] = None,
         **kwargs,
     ):
-        super().__init__(transport=transport, client_id=client_id)
+        super().__init__(transport=transport, client_id=client_id, **kwargs)
         self._url = url
+        self._pool = pool
         self._client_header = client_header
+        self._seq_header = seq_header
 
     async def connect(self, client_id: Optional[str] = None):
-        self._session = ClientSession()
-        self._websocket = await self._session.ws_connect(
-            self._url, headers={self._client_header: self._client_id} if self._client_id else None
-        ).__aenter__()
+        # offer our native frame type first, servers
+        # which don't negotiate will fall back to text
+        protocols = (BINARY_PROTOCOL, TEXT_PROTOCOL) if self._transport_type is bytes else (TEXT_PROTOCOL, BINARY_PROTOCOL)
+
+        headers = {self._client_header: self._client_id} if self._client_id else {}
+        seq = self.lastSeq()
+        if seq is not None:
+            # reconnecting, ask to resume where we left off
+            headers[self._seq_header] = str(seq)
+
+        if self._pool is not None:
+            self._session = self._pool.session()
+        elif self._session is None or self._session.closed:
+            # kept across reconnects, and closed on disconnect
+            self._session = ClientSession()
+        self._websocket = await self._session.ws_connect(self._url, headers=headers or None, protocols=protocols).__aenter__()
+        self._binary = self._websocket.protocol == BINARY_PROTOCOL
 
     async def disconnect(self) -> None:
-        await self._websocket.close()
+        websocket = getattr(self, "_websocket", None)
+        if websocket is not None:
+            await websocket.close()
+        if self._pool is None and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @contextmanager
+    def handleDisconnect(self):
+        with super().handleDisconnect():
+            try:
+                yield
+            except (ClientError, OSError):
+                ...
 
     async def receive(self) -> str:  # type: ignore[override]
-        return await self._websocket.receive_str()
+        message = await self._websocket.receive()
+        if message.type in (WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED, WSMsgType.ERROR):
+            raise ClientConnectionError(f"Websocket closed ({message.type.name})")
+        return self._from_frame(message.data)
 
     async def send(self, update: str) -> None:  # type: ignore[override]
-        await self._websocket.send_str(update)
+        if self._binary:
+            await self._websocket.send_bytes(self._to_frame(update))
+        else:
+            await self._websocket.send_str(self._to_frame(update))
@@ -0,0 +1,136 @@
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, MutableMapping, Type
+
+from ..connection import BINARY_PROTOCOL, TEXT_PROTOCOL
+from ..json import JSONTransport
+from ..model import BaseModel
+from ..server import Server
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+
+class ASGIDisconnect(Exception):
+    """The client hung up, or the ASGI server dropped the connection"""
+
+
+class ASGIWebSocketServer(Server):
+    """Server for a websocket connection of any ASGI server, working on its messages directly
+    rather than through a framework, see `asgi_app`."""
+
+    _transport: JSONTransport
+    _transport_type: Type = str
+
+    _scope: Scope
+    _receive: Receive
+    _send: Send
+    _headers: Dict[str, str]
+    _client_header: str
+    _seq_header: str
+    _closed: bool = False
+
+    def __init__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        transport: JSONTransport,
+        model: BaseModel,
+        shared: bool = True,
+        readonly: bool = False,
+        echo: bool = True,
+        client_header: str = "client-id",
+        seq_header: str = "last-seq",
+        **kwargs,
+    ):
+        super().__init__(transport=transport, model=model, shared=shared, readonly=readonly, echo=echo, **kwargs)
+        self._scope = scope
+        self._receive = receive
+        self._send = send
+        self._headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        self._client_header = client_header
+        self._seq_header = seq_header
+
+    async def connect(self):
+        message = await self._receive()
+        if message["type"] != "websocket.connect":
+            raise ASGIDisconnect()
+
+        # negotiate frame type, preferring the client's order
+        # and falling back to text if the client didn't ask
+        subprotocol = next((p for p in self._scope.get("subprotocols", []) if p in (BINARY_PROTOCOL, TEXT_PROTOCOL)), None)
+        self._binary = subprotocol == BINARY_PROTOCOL
+        await self._send({"type": "websocket.accept", "subprotocol": subprotocol})
+
+        # a reconnecting client tells us the last update it saw
+        seq = self._headers.get(self._seq_header, "")
+        self._last_seq = int(seq) if seq.isdigit() else None
+
+        # if null or empty will be autoassigned
+        return self._headers.get(self._client_header, "")
+
+    @contextmanager
+    def handleDisconnect(self):
+        with super().handleDisconnect():
+            try:
+                yield
+            except (ASGIDisconnect, OSError):
+                # OSError: sending once the client is gone, e.g. uvicorn's `ClientDisconnected`
+                self._closed = True
+
+    async def receive(self) -> str:  # type: ignore[override]
+        message = await self._receive()
+        if message["type"] == "websocket.disconnect":
+            self._closed = True
+            raise ASGIDisconnect()
+        # either frame type is accepted, whichever was negotiated
+        text = message.get("text")
+        return self._from_frame(message.get("bytes") if text is None else text)
+
+    async def send(self, update: str):  # type: ignore[override]
+        if self._binary:
+            await self._send({"type": "websocket.send", "bytes": self._to_frame(update)})
+        else:
+            await self._send({"type": "websocket.send", "text": self._to_frame(update)})
+
+    async def disconnect(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._send({"type": "websocket.close", "code": 1000})
+        except (RuntimeError, OSError):
+            # ignore if websocket already closed
+            ...
+
+    # Use common docstring
+    __init__.__doc__ = Server.__init__.__doc__
+
+
+def asgi_app(transport: JSONTransport, model: BaseModel, **kwargs) -> Callable[[Scope, Receive, Send], Awaitable[None]]:
+    """An ASGI application serving `model` to every websocket connection, and nothing else
+
+    Args:
+        transport (JSONTransport): server side transport
+        model (BaseModel): model to host for every client
+        kwargs: `ASGIWebSocketServer` options, e.g. `shared` or `readonly`
+    """
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "websocket":
+            await ASGIWebSocketServer(scope, receive, send, transport, model, **kwargs).handle()
+        elif scope["type"] == "http":
+            await send({"type": "http.response.start", "status": 404, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Not Found"})
+        elif scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+    return app
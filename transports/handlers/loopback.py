@@ -0,0 +1,235 @@
+from asyncio import Queue, Task, ensure_future, gather
+from contextlib import contextmanager
+from typing import Any, Optional, Set, Tuple
+
+from ..client import Client
+from ..decoder import construct
+from ..model import BaseModel
+from ..patch import Patch
+from ..server import Server
+from ..transport import Transport
+from ..update import Chunk, Update
+
+# put in a pipe to close it
+_CLOSE = object()
+
+
+class LoopbackClosed(Exception):
+    """The other end of a loopback connection hung up"""
+
+
+def _copy(value: Any) -> Any:
+    """copy of a value for the other end, sharing nothing mutable with it"""
+    if isinstance(value, BaseModel):
+        # NOTE: much cheaper than `deepcopy`, and private state isn't copied
+        return construct(value.__class__, value.model_dump())
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset, tuple)):
+        return value.__class__(_copy(item) for item in value)
+    return value
+
+
+def _copyFrame(frame: Any) -> Any:
+    if isinstance(frame, Update):
+        changes = {}
+        if frame.model is not None:
+            changes["model"] = _copy(frame.model)
+        if frame.patch is not None:
+            changes["patch"] = [Patch.model_construct(op=patch.op, path=list(patch.path), value=_copy(patch.value)) for patch in frame.patch]
+        return frame.model_copy(update=changes) if changes else frame
+    if isinstance(frame, Chunk):
+        return frame.model_copy(update={"items": _copy(frame.items)})
+    if isinstance(frame, list):
+        # batch, see `Transport.encodeBatch`
+        return [_copyFrame(item) for item in frame]
+    # already serialized, or immutable
+    return frame
+
+
+def _shareFrame(frame: Any) -> Any:
+    """a frame for the other end by reference, with a model of its own to hold its own queue and transport"""
+    if isinstance(frame, Update) and frame.model is not None:
+        # NOTE: shallow, everything below it is shared
+        return frame.model_copy(update={"model": frame.model.copy(clone=True)})
+    if isinstance(frame, list):
+        # batch, see `Transport.encodeBatch`
+        return [_shareFrame(item) for item in frame]
+    return frame
+
+
+class _Pipe:
+    """one end of a loopback connection"""
+
+    incoming: Queue
+    outgoing: Queue
+    copy: bool  # whether to copy what is sent, for the other end to own, rather than pass it by reference
+
+    def __init__(self, incoming: Queue, outgoing: Queue, copy: bool):
+        self.incoming = incoming
+        self.outgoing = outgoing
+        self.copy = copy
+
+    async def receive(self) -> Any:
+        frame = await self.incoming.get()
+        if frame is _CLOSE:
+            raise LoopbackClosed()
+        return frame
+
+    def send(self, frame: Any) -> None:
+        # copied now, the sender may change it in place before it is received
+        self.outgoing.put_nowait(_copyFrame(frame) if self.copy else _shareFrame(frame))
+
+    def close(self) -> None:
+        self.outgoing.put_nowait(_CLOSE)
+
+
+class LoopbackServer(Server):
+    """Server end of a loopback connection, created by `Loopback` for each client"""
+
+    _pipe: _Pipe
+    _connect_id: str
+    _connect_seq: Optional[int]
+
+    def __init__(
+        self,
+        transport: Transport,
+        model: BaseModel,
+        incoming: Queue,
+        outgoing: Queue,
+        client_id: str = "",
+        last_seq: Optional[int] = None,
+        copy: bool = False,
+        **kwargs,
+    ):
+        super().__init__(transport=transport, model=model, **kwargs)
+        self._pipe = _Pipe(incoming, outgoing, copy)
+        self._connect_id = client_id
+        self._connect_seq = last_seq
+
+    async def connect(self):
+        self._last_seq = self._connect_seq
+        return self._connect_id
+
+    @contextmanager
+    def handleDisconnect(self):
+        with super().handleDisconnect():
+            try:
+                yield
+            except (LoopbackClosed,):
+                ...
+
+    async def receive(self) -> Any:  # type: ignore[override]
+        return await self._pipe.receive()
+
+    async def send(self, update: Any) -> None:  # type: ignore[override]
+        self._pipe.send(update)
+
+    async def disconnect(self) -> None:
+        self._pipe.close()
+
+    async def onClose(self):
+        await super().onClose()
+        # hang up on the client, e.g. when stopped by `Loopback.close`
+        await self.disconnect()
+
+
+class Loopback:
+    """An in-process endpoint for `LoopbackClient`s to connect to, playing the part of a
+    websocket route: each connection is served by its own `LoopbackServer`.
+
+    Updates are passed between the two ends by reference, as they come out of the transports,
+    without any network in between, and without any serialization at all if the transports are plain
+    `Transport`s. Each end gets a model of its own, but shares everything nested in it and every value
+    sent with the other, which is only safe while neither changes in place what it has sent or received. Ends which do can ask for their own
+    copy of everything they are sent, see `copy`, which costs much less than serializing it.
+    """
+
+    _transport: Transport
+    _model: BaseModel
+    _copy: bool
+    _options: dict
+    _tasks: Set[Task]
+
+    def __init__(self, transport: Transport, model: BaseModel, copy: bool = False, **kwargs):
+        """
+        Args:
+            transport (Transport): server side transport
+            model (BaseModel): model to host for every client
+            copy (bool, optional): Whether what the server receives is copied as it is sent, see `LoopbackClient`. Defaults to False, by reference.
+            kwargs: `Server` options, e.g. `shared` or `readonly`
+        """
+        self._transport = transport
+        self._model = model
+        self._copy = copy
+        self._options = kwargs
+        self._tasks = set()
+
+    def accept(self, client_id: str = "", last_seq: Optional[int] = None, copy: bool = False) -> Tuple[Queue, Queue]:
+        """Serve a new connection, returning its pipes to and from the server.
+        The server copies what it sends if `copy`, what it receives is copied by the client as it is sent if `_copy`"""
+        to_server, from_server = Queue(), Queue()
+        server = LoopbackServer(
+            transport=self._transport,
+            model=self._model,
+            incoming=to_server,
+            outgoing=from_server,
+            client_id=client_id,
+            last_seq=last_seq,
+            copy=copy,
+            **self._options,
+        )
+        task = ensure_future(server.handle())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return to_server, from_server
+
+    async def close(self) -> None:
+        """Stop serving every connection"""
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+
+
+class LoopbackClient(Client):
+    _loopback: Loopback
+    _pipe: _Pipe
+    _copy: bool
+
+    def __init__(self, loopback: Loopback, transport: Transport, client_id: Optional[str] = None, copy: bool = False, **kwargs):
+        """
+        Args:
+            loopback (Loopback): endpoint to connect to
+            transport (Transport): client side transport, of the same kind as the server's
+            client_id (Optional[str], optional): client id, assigned by the server if not provided. Defaults to None.
+            copy (bool, optional): Whether the models and values received are copied as the server sends them, rather than shared with it.
+                                   Turn on if either end changes anything it has sent or received in place. Defaults to False, by reference.
+            kwargs: `Client` options, e.g. `reconnect`
+        """
+        super().__init__(transport=transport, client_id=client_id, **kwargs)
+        self._loopback = loopback
+        self._copy = copy
+
+    async def connect(self, client_id: Optional[str] = None):
+        to_server, from_server = self._loopback.accept(client_id=self._client_id, last_seq=self.lastSeq(), copy=self._copy)
+        # copied for the server, if it wants them to be
+        self._pipe = _Pipe(from_server, to_server, self._loopback._copy)
+
+    @contextmanager
+    def handleDisconnect(self):
+        with super().handleDisconnect():
+            try:
+                yield
+            except (LoopbackClosed,):
+                ...
+
+    async def receive(self) -> Any:  # type: ignore[override]
+        return await self._pipe.receive()
+
+    async def send(self, update: Any) -> None:  # type: ignore[override]
+        self._pipe.send(update)
+
+    async def disconnect(self) -> None:
+        self._pipe.close()
@@ -3,6 +3,7 @@ from typing import Type
 
 from starlette.websockets import WebSocket, WebSocketDisconnect
 
+from ..connection import BINARY_PROTOCOL, TEXT_PROTOCOL
 from ..json import JSONTransport
 from ..model import BaseModel
 from ..server import Server
@@ -14,6 +15,7 @@ class StarletteWebSocketServer(Server):
 
     _websocket: WebSocket
     _client_header: str
+    _seq_header: str
 
     def __init__(
         self,
@@ -22,17 +24,29 @@ class StarletteWebSocketServer(Server):
         model: BaseModel,
         shared: bool = True,
         readonly: bool = False,
+        echo: bool = True,
         client_header: str = "client-id",
+        seq_header: str = "last-seq",
         **kwargs,
     ):
-        super().__init__(transport=transport, model=model, shared=shared, readonly=readonly, **kwargs)
+        super().__init__(transport=transport, model=model, shared=shared, readonly=readonly, echo=echo, **kwargs)
         self._websocket = websocket
         self._client_header = client_header
+        self._seq_header = seq_header
 
     async def connect(self):
         # on open, receive data from websocket
+        # negotiate frame type, preferring the client's order
+        # and falling back to text if the client didn't ask
+        subprotocol = next((p for p in self._websocket.scope.get("subprotocols", []) if p in (BINARY_PROTOCOL, TEXT_PROTOCOL)), None)
+        self._binary = subprotocol == BINARY_PROTOCOL
+
         # connect to websocket
-        await self._websocket.accept()
+        await self._websocket.accept(subprotocol=subprotocol)
+
+        # a reconnecting client tells us the last update it saw
+        seq = self._websocket.headers.get(self._seq_header, "")
+        self._last_seq = int(seq) if seq.isdigit() else None
 
         # graph client information from websocket,
         # if null or empty will be autoassigned
@@ -48,11 +62,16 @@ class StarletteWebSocketServer(Server):
 
     async def receive(self) -> str:  # type: ignore[override]
         # grab from client
-        return await self._websocket.receive_text()
+        if self._binary:
+            return self._from_frame(await self._websocket.receive_bytes())
+        return self._from_frame(await self._websocket.receive_text())
 
     async def send(self, update: str):  # type: ignore[override]
         # send to client
-        await self._websocket.send_text(update)
+        if self._binary:
+            await self._websocket.send_bytes(self._to_frame(update))
+        else:
+            await self._websocket.send_text(self._to_frame(update))
 
     async def disconnect(self) -> None:
         try:
@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+from typing import Optional, Sequence, Type
+
+from websockets.asyncio.server import ServerConnection, serve as websockets_serve
+from websockets.exceptions import ConnectionClosed
+
+from ..connection import BINARY_PROTOCOL, TEXT_PROTOCOL
+from ..json import JSONTransport
+from ..model import BaseModel
+from ..server import Server
+
+
+def select_subprotocol(connection: ServerConnection, subprotocols: Sequence[str]) -> Optional[str]:
+    """Negotiate the frame type, preferring the client's order and falling back to text
+    if the client didn't ask, pass as `select_subprotocol` to `websockets.asyncio.server.serve`"""
+    return next((p for p in subprotocols if p in (BINARY_PROTOCOL, TEXT_PROTOCOL)), None)  # type: ignore[return-value]
+
+
+class WebSocketsServer(Server):
+    """Server for a connection of the `websockets` library's own server, see `serve`"""
+
+    _transport: JSONTransport
+    _transport_type: Type = str
+
+    _websocket: ServerConnection
+    _client_header: str
+    _seq_header: str
+
+    def __init__(
+        self,
+        websocket: ServerConnection,
+        transport: JSONTransport,
+        model: BaseModel,
+        shared: bool = True,
+        readonly: bool = False,
+        echo: bool = True,
+        client_header: str = "client-id",
+        seq_header: str = "last-seq",
+        **kwargs,
+    ):
+        super().__init__(transport=transport, model=model, shared=shared, readonly=readonly, echo=echo, **kwargs)
+        self._websocket = websocket
+        self._client_header = client_header
+        self._seq_header = seq_header
+
+    async def connect(self):
+        # already accepted by the time we're handed the connection,
+        # frame type negotiated by `select_subprotocol`
+        self._binary = self._websocket.subprotocol == BINARY_PROTOCOL
+        headers = self._websocket.request.headers if self._websocket.request is not None else {}
+
+        # a reconnecting client tells us the last update it saw
+        seq = headers.get(self._seq_header, "")
+        self._last_seq = int(seq) if seq.isdigit() else None
+
+        # if null or empty will be autoassigned
+        return headers.get(self._client_header, "")
+
+    @contextmanager
+    def handleDisconnect(self):
+        with super().handleDisconnect():
+            try:
+                yield
+            except (ConnectionClosed,):
+                ...
+
+    async def receive(self) -> str:  # type: ignore[override]
+        # text frames come in as str and binary as bytes, whichever was negotiated
+        return self._from_frame(await self._websocket.recv())
+
+    async def send(self, update: str):  # type: ignore[override]
+        await self._websocket.send(self._to_frame(update))
+
+    async def disconnect(self) -> None:
+        # no-op if already closed
+        await self._websocket.close()
+
+    # Use common docstring
+    __init__.__doc__ = Server.__init__.__doc__
+
+
+def serve(transport: JSONTransport, model: BaseModel, host: Optional[str] = None, port: Optional[int] = None, **kwargs) -> websockets_serve:
+    """Serve `model` to every connection with the `websockets` library's server,
+    to be awaited or used as an async context manager like `websockets.asyncio.server.serve`
+
+    Args:
+        transport (JSONTransport): server side transport
+        model (BaseModel): model to host for every client
+        host (Optional[str], optional): interface to listen on. Defaults to all.
+        port (Optional[int], optional): port to listen on.
+        kwargs: `WebSocketsServer` options, e.g. `shared` or `readonly`
+    """
+
+    async def handler(websocket: ServerConnection) -> None:
+        await WebSocketsServer(websocket, transport, model, **kwargs).handle()
+
+    return websockets_serve(handler, host, port, select_subprotocol=select_subprotocol)
@@ -0,0 +1,313 @@
+import os
+from array import array
+from mmap import ACCESS_READ, mmap
+from struct import Struct
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+from zlib import crc32
+
+# before every frame: sequence number, length, checksum of the frame
+_HEADER = Struct("<QII")
+
+_SEGMENT = ".log"
+_SNAPSHOT = ".snap"
+
+
+def _name(seq: int, suffix: str) -> str:
+    # zero padded, so that names sort in sequence order
+    return f"{seq:020d}{suffix}"
+
+
+def _frame(frame: Any) -> bytes:
+    if isinstance(frame, str):
+        return frame.encode()
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        return bytes(frame)
+    raise TypeError(f"Can only journal encoded updates, got {type(frame).__name__}")
+
+
+class _Segment:
+    """One log file of consecutive updates, preallocated and memory mapped"""
+
+    path: str
+    first: int  # sequence number of the first frame
+    offsets: array  # offset of each frame's header, by sequence number from `first`
+    end: int  # offset to write the next frame at
+
+    _fd: int
+    _map: mmap
+
+    def __init__(self, path: str, first: int, size: int = 0):
+        """
+        Args:
+            path (str): log file, created if it doesn't exist
+            first (int): sequence number of the first frame
+            size (int, optional): bytes to preallocate, for a segment to be appended to. Defaults to 0.
+        """
+        self.path = path
+        self.first = first
+        self.offsets = array("Q")
+        self.end = 0
+
+        # NOTE: a raw descriptor, only ever written through the map
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            # NOTE: sparse, zeros past the last frame mark the end
+            os.ftruncate(self._fd, size)
+        self._map = mmap(self._fd, 0)
+        self._scan()
+
+    def _scan(self) -> None:
+        """find the frames already written, up to the first one torn by a crash"""
+        view = self._map
+        offset, size = 0, len(view)
+        while offset + _HEADER.size <= size:
+            seq, length, checksum = _HEADER.unpack_from(view, offset)
+            start = offset + _HEADER.size
+            if seq != self.first + len(self.offsets) or start + length > size or crc32(view[start : start + length]) != checksum:
+                break
+            self.offsets.append(offset)
+            offset = start + length
+        self.end = offset
+
+    @property
+    def last(self) -> int:
+        """sequence number of the last frame, `first - 1` if empty"""
+        return self.first + len(self.offsets) - 1
+
+    def fits(self, length: int) -> bool:
+        return self.end + _HEADER.size + length <= len(self._map)
+
+    def append(self, seq: int, frame: bytes) -> None:
+        start = self.end + _HEADER.size
+        # frame first, so that a crash part way leaves no header pointing at it
+        self._map[start : start + len(frame)] = frame
+        _HEADER.pack_into(self._map, self.end, seq, len(frame), crc32(frame))
+        self.offsets.append(self.end)
+        self.end = start + len(frame)
+
+    def read(self, seq: int) -> bytes:
+        offset = self.offsets[seq - self.first]
+        _, length, _ = _HEADER.unpack_from(self._map, offset)
+        start = offset + _HEADER.size
+        return self._map[start : start + length]
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        """unmap, giving back the space preallocated past the last frame"""
+        self._map.close()
+        os.ftruncate(self._fd, self.end)
+        os.close(self._fd)
+        if not self.end:
+            os.remove(self.path)
+
+
+class _Log:
+    """Segments and snapshots of one model, in a directory of their own"""
+
+    directory: str
+    segments: List[_Segment]  # in sequence order, the last one appended to
+    snapshots: List[int]  # sequence numbers of the snapshots kept, in order
+    seq: Optional[int]  # sequence number of the latest update journaled, None if nothing is
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # created once there's something to journal
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        self.snapshots = [int(name[: -len(_SNAPSHOT)]) for name in names if name.endswith(_SNAPSHOT)]
+        self.segments = []
+        for name in names:
+            if name.endswith(_SEGMENT):
+                segment = _Segment(os.path.join(directory, name), int(name[: -len(_SEGMENT)]))
+                if segment.offsets:
+                    self.segments.append(segment)
+                else:
+                    segment.close()
+
+        last = [segment.last for segment in self.segments[-1:]] + self.snapshots[-1:]
+        self.seq = max(last) if last else None
+
+    def snapshot(self) -> Optional[int]:
+        return self.snapshots[-1] if self.snapshots else None
+
+
+class Journal:
+    """Append-only log of the encoded updates to shared models, so that they survive a restart, see `Transport.restore`.
+
+    Each model's updates are appended by sequence number to segment files, preallocated and
+    memory mapped so that appending is a copy into memory, and read back without decoding.
+    Every `snapshot_every` updates the model is snapshotted, and segments older than every
+    snapshot kept are deleted. Updates since the oldest snapshot kept can be replayed to clients,
+    see `history`.
+
+    NOTE: writes reach the OS page cache as they are made, surviving the process crashing but not
+    the machine, unless `sync` is set. Frames torn by a crash are detected and dropped on reopening.
+    """
+
+    path: str
+    segment_size: int  # bytes preallocated per segment file
+    snapshot_every: int  # updates between snapshots of a model
+    keep_snapshots: int  # snapshots kept per model, older segments are deleted
+    sync: bool  # flush every write to disk before returning
+
+    _logs: Dict[str, _Log]  # Model ID -> log
+
+    def __init__(self, path: str, segment_size: int = 16 << 20, snapshot_every: int = 1000, keep_snapshots: int = 2, sync: bool = False):
+        """
+        Args:
+            path (str): directory to journal to, created if needed
+            segment_size (int, optional): bytes preallocated per segment file. Defaults to 16 MiB.
+            snapshot_every (int, optional): updates between snapshots of a model. Defaults to 1000.
+            keep_snapshots (int, optional): snapshots kept per model, at least 1. Defaults to 2.
+            sync (bool, optional): Whether to flush every write to disk before returning. Defaults to False.
+        """
+        self.path = path
+        self.segment_size = segment_size
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = max(keep_snapshots, 1)
+        self.sync = sync
+        self._logs = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _log(self, model_id: str) -> _Log:
+        log = self._logs.get(model_id)
+        if log is None:
+            log = self._logs[model_id] = _Log(os.path.join(self.path, quote(model_id, safe="")))
+        return log
+
+    def models(self) -> List[str]:
+        """Ids of every model journaled"""
+        return sorted(unquote(name) for name in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, name)))
+
+    def seq(self, model_id: str) -> Optional[int]:
+        """Sequence number of the latest update journaled for a model, None if there is none"""
+        return self._log(model_id).seq
+
+    def snapshotted(self, model_id: str) -> bool:
+        """Whether there is a snapshot of the model to replay its updates onto"""
+        return bool(self._log(model_id).snapshots)
+
+    def due(self, model_id: str, seq: int) -> bool:
+        """Whether the model should be snapshotted at `seq`"""
+        snapshot = self._log(model_id).snapshot()
+        return snapshot is None or seq - snapshot >= self.snapshot_every
+
+    def append(self, model_id: str, seq: int, frame: Any) -> None:
+        """Journal the encoded update with sequence number `seq`, which must be later than any so far
+
+        Args:
+            model_id (str): id of the model updated
+            seq (int): sequence number of the update
+            frame (Any): the update, as encoded by a `JSONTransport` or `BinaryTransport`
+        """
+        log = self._log(model_id)
+        data = _frame(frame)
+        segment = log.segments[-1] if log.segments else None
+        if segment is None or segment.last != seq - 1 or not segment.fits(len(data)):
+            # frames in a segment are consecutive, start another one on a gap or once full
+            if segment is not None:
+                segment.close()
+                segment = _Segment(segment.path, segment.first)
+                log.segments[-1] = segment
+            size = max(self.segment_size, _HEADER.size + len(data))
+            os.makedirs(log.directory, exist_ok=True)
+            segment = _Segment(os.path.join(log.directory, _name(seq, _SEGMENT)), seq, size)
+            log.segments.append(segment)
+        segment.append(seq, data)
+        if self.sync:
+            segment.flush()
+        log.seq = seq
+
+    def snapshot(self, model_id: str, seq: int, frame: Any) -> None:
+        """Keep a full update of the model as of `seq`, then delete whatever is no longer needed
+
+        Args:
+            model_id (str): id of the model
+            seq (int): sequence number of the latest update included in the snapshot
+            frame (Any): the model's full update, as encoded by a `JSONTransport` or `BinaryTransport`
+        """
+        log = self._log(model_id)
+        path = os.path.join(log.directory, _name(seq, _SNAPSHOT))
+        os.makedirs(log.directory, exist_ok=True)
+        with open(path + ".tmp", "wb") as file:
+            file.write(_frame(frame))
+            if self.sync:
+                file.flush()
+                os.fsync(file.fileno())
+        # never half written
+        os.replace(path + ".tmp", path)
+        if seq not in log.snapshots:
+            log.snapshots.append(seq)
+        log.seq = seq if log.seq is None else max(log.seq, seq)
+        self._compact(log)
+
+    def _compact(self, log: _Log) -> None:
+        for seq in log.snapshots[: -self.keep_snapshots]:
+            os.remove(os.path.join(log.directory, _name(seq, _SNAPSHOT)))
+        del log.snapshots[: -self.keep_snapshots]
+
+        # updates up to the oldest snapshot kept are only needed to replay from before it
+        oldest = log.snapshots[0]
+        while len(log.segments) > 1 and log.segments[0].last <= oldest:
+            segment = log.segments.pop(0)
+            segment.close()
+            os.remove(segment.path)
+
+    def latest(self, model_id: str) -> Optional[Tuple[int, bytes]]:
+        """The latest snapshot of a model and its sequence number, None if there is none"""
+        log = self._log(model_id)
+        seq = log.snapshot()
+        if seq is None:
+            return None
+        with open(os.path.join(log.directory, _name(seq, _SNAPSHOT)), "rb") as file, mmap(file.fileno(), 0, access=ACCESS_READ) as view:
+            return seq, view[:]
+
+    def history(self, model_id: str, start: int, end: Optional[int] = None) -> Optional[List[bytes]]:
+        """Encoded updates with sequence numbers from `start` to `end` inclusive, as journaled, without decoding them
+
+        Args:
+            model_id (str): id of the model
+            start (int): sequence number of the first update
+            end (Optional[int], optional): sequence number of the last update, None for the latest. Defaults to None.
+
+        Returns:
+            Optional[List[bytes]]: updates in order, possibly empty, or None if some of them aren't journaled
+        """
+        log = self._log(model_id)
+        if end is None:
+            end = log.seq
+            if end is None:
+                return None
+        if start > end:
+            return []
+
+        frames: List[bytes] = []
+        expected = start
+        for segment in log.segments:
+            if segment.last < expected:
+                continue
+            if segment.first > expected:
+                # a gap, or no longer kept
+                return None
+            last = min(end, segment.last)
+            frames.extend(segment.read(seq) for seq in range(expected, last + 1))
+            expected = last + 1
+            if expected > end:
+                return frames
+        return None
+
+    def since(self, model_id: str, seq: int) -> Optional[List[bytes]]:
+        """Encoded updates after `seq`, see `history`"""
+        latest = self.seq(model_id)
+        if latest is None or seq > latest:
+            # not from this journal
+            return None
+        return self.history(model_id, seq + 1, latest)
+
+    def close(self) -> None:
+        for log in self._logs.values():
+            for segment in log.segments:
+                segment.close()
+        self._logs = {}
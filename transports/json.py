@@ -1,16 +1,77 @@
-from typing import Optional, Type
+from concurrent.futures import Executor
+from time import perf_counter, time
+from typing import Any, Dict, List, Optional, Type
 
 from orjson import loads
 
+from .chunks import encode_chunked
+from .decoder import Decoder, peek_model_type
+from .dispatch import Dispatcher
 from .exceptions import UpdateMalformed
+from .journal import Journal
+from .metrics import Sink, created, model_type
 from .model import BaseModel
+from .queues import Policy
 from .transport import Transport
-from .update import Update
+from .update import Chunk, Subscription, Update
+
+# `Subscription` and `Chunk` lead with their op, which no `Update` does
+_SUBSCRIPTION = '{"op":'
+_SUBSCRIPTION_BYTES = _SUBSCRIPTION.encode()
 
 
 class JSONTransport(Transport):
     type: Type = str
 
+    decoders: Dict[str, Decoder]  # Class name -> Decoder
+    trusted: bool
+
+    def __init__(
+        self,
+        event_loop=None,
+        trusted: bool = False,
+        sink: Optional[Sink] = None,
+        replay_size: int = 0,
+        dispatcher: Optional[Dispatcher] = None,
+        offload: Optional[Executor] = None,
+        offload_threshold: int = 1 << 20,
+        chunk_size: int = 0,
+        snapshot_cache: int = 0,
+        journal: Optional[Journal] = None,
+        replay_idle: int = 64,
+    ):
+        """
+        Args:
+            event_loop (optional): event loop to run on. Defaults to the current event loop.
+            trusted (bool, optional): Whether or not to skip validation of incoming updates.
+                                      Only use between peers known to send well formed updates. Defaults to False.
+            sink (Optional[Sink], optional): where to report metrics, see `metrics.Sink`. Defaults to None, measuring nothing.
+            replay_size (int, optional): updates kept per shared model for clients resuming after a reconnect. Defaults to 0, disabled.
+            dispatcher (Optional[Dispatcher], optional): applies incoming updates to different models concurrently. Defaults to None, one at a time.
+            offload (Optional[Executor], optional): thread pool to encode large models in, see `encodeAsync`. Defaults to None, on the loop.
+            offload_threshold (int, optional): encoded size in bytes past which models are encoded in `offload`. Defaults to 1 MiB.
+            chunk_size (int, optional): items per chunk of large list fields in snapshots, see `initialChunks`. Defaults to 0, sent whole.
+            snapshot_cache (int, optional): bytes of encoded snapshots to keep for clients connecting to unchanged models,
+                                            only tracked ones, see `BaseModel.track`. Defaults to 0, disabled.
+            journal (Optional[Journal], optional): where to persist shared models and their updates, see `restore`. Defaults to None, kept in memory only.
+            replay_idle (int, optional): shared models nobody is subscribed to whose replay buffers are kept, for clients resuming
+                                         after everyone disconnected. Defaults to 64.
+        """
+        super().__init__(
+            event_loop=event_loop,
+            sink=sink,
+            replay_size=replay_size,
+            dispatcher=dispatcher,
+            offload=offload,
+            offload_threshold=offload_threshold,
+            chunk_size=chunk_size,
+            snapshot_cache=snapshot_cache,
+            journal=journal,
+            replay_idle=replay_idle,
+        )
+        self.decoders = {}
+        self.trusted = trusted
+
     ##################
     # Server methods #
     ##################
@@ -18,28 +79,71 @@ class JSONTransport(Transport):
         # defer to parent
         return await super().onConnect(client_id=client_id)
 
-    async def host(self, model: BaseModel, client_id: str, shared: bool = True, readonly: bool = False) -> None:
+    async def host(
+        self,
+        model: BaseModel,
+        client_id: str,
+        shared: bool = True,
+        readonly: bool = False,
+        echo: bool = True,
+        queue_size: int = 0,
+        queue_policy: Policy = "block",
+        max_rate: float = 0.0,
+        min_interval: float = 0.0,
+    ) -> None:
         # defer to parent
-        return await super().host(model=model, client_id=client_id, shared=shared, readonly=readonly)
+        return await super().host(
+            model=model,
+            client_id=client_id,
+            shared=shared,
+            readonly=readonly,
+            echo=echo,
+            queue_size=queue_size,
+            queue_policy=queue_policy,
+            max_rate=max_rate,
+            min_interval=min_interval,
+        )
 
     async def onDisconnect(self, model: BaseModel, client_id: str) -> None:  # type: ignore[override]
         # defer to parent
         return await super().onDisconnect(model=model, client_id=client_id)
 
-    def initial(self, client_id: str) -> str:  # type: ignore[override]
-        # defer to parent
-        return super().initial(client_id=client_id).json()
-
     ##################
     # Client methods #
     ##################
-    async def onInitial(self, update: str) -> BaseModel:  # type: ignore[override]
+    def hosts(self, model_type: Type[BaseModel]) -> None:
+        # defer to parent
+        super().hosts(model_type=model_type)
+
+        # compile a decoder for each newly registered type
+        for name, registered in self.model_map.items():
+            if name not in self.decoders:
+                self.decoders[name] = Decoder(registered)
+
+    async def onInitial(self, update: str, client_id: str = "") -> BaseModel:  # type: ignore[override]
         update_inst: Update = await self._update_to_model(update)
-        return await super().onInitial(update=update_inst)
+        return await super().onInitial(update=update_inst, client_id=client_id)
+
+    async def decode(self, frame: str) -> Update:  # type: ignore[override]
+        return await self._update_to_model(frame)
 
     async def _update_to_model(self, update: str) -> Update:
-        # first, parse out the json into a dict
-        data = loads(update)
+        # use the compiled decoder if we know the type up front
+        decoder = self.decoders.get(peek_model_type(update) or "")
+        if decoder is not None:
+            return decoder.decodeTrusted(update) if self.trusted else decoder.decode(update)
+
+        # otherwise, parse out the json into a dict
+        return self._data_to_update(loads(update))
+
+    def _data_to_update(self, data: Dict[str, Any]) -> Update:
+        if "op" in data:
+            return (Chunk if data["op"] == "chunk" else Subscription)(**data)  # type: ignore[return-value]
+
+        # use the compiled decoder if we know the type, as for whole frames, see `_update_to_model`
+        decoder = self.decoders.get(data.get("model_type") or "")
+        if decoder is not None:
+            return decoder.decodeDataTrusted(data) if self.trusted else decoder.decodeData(data)
 
         # now lookup the model map
         if "model_type" not in data:
@@ -48,6 +152,12 @@ class JSONTransport(Transport):
         if "model_target" not in data:
             raise UpdateMalformed("Update data has no `model_target`")
 
+        if data.get("model") is None:
+            # patch updates carry only the changes, which are applied by the target model
+            if data.get("patch") is None:
+                raise UpdateMalformed("Update data has neither `model` nor `patch`")
+            return Update(**data)
+
         if data["model_type"] not in self.model_map:
             raise UpdateMalformed(f"Class type ({data['model_type']}) not known, did you forget to call `hosts`?")
 
@@ -64,9 +174,50 @@ class JSONTransport(Transport):
     #################
     # Bidirectional #
     #################
+    def encode(self, update: Update) -> str:  # type: ignore[override]
+        return update.json()
+
+    def _encodeLarge(self, update: Update) -> str:  # type: ignore[override]
+        return encode_chunked(update).decode()
+
+    def encodeBatch(self, updates: List[str]) -> str:  # type: ignore[override]
+        # updates are already json, so just join them into an array
+        return "[" + ",".join(updates) + "]"
+
     async def send(self, client_id: str) -> str:  # type: ignore[override]
-        return (await super().send(client_id=client_id)).json()
+        # defer to parent, which encodes
+        return await super().send(client_id=client_id)
 
     async def receive(self, client_id: str, update: str) -> None:  # type: ignore[override]
-        update_inst: Update = await self._update_to_model(update)
+        if update[:6] in (_SUBSCRIPTION, _SUBSCRIPTION_BYTES):
+            # subscribe to or unsubscribe from a model, or part of a snapshot
+            await super().receive(client_id=client_id, update=self._data_to_update(loads(update)))
+            return
+
+        if self.sink is not None:
+            received, start = time(), perf_counter()
+
+        if update[:1] in ("[", b"["):
+            # batch of updates, see `encodeBatch`
+            for batched in loads(update):
+                update_inst = self._data_to_update(batched)
+                if self.sink is not None and isinstance(update_inst, Update):
+                    self._decoded(client_id, update_inst, received, start)
+                    start = perf_counter()
+                await super().receive(client_id=client_id, update=update_inst)
+            return
+
+        update_inst = await self._update_to_model(update)
+        if self.sink is not None:
+            self._decoded(client_id, update_inst, received, start)
         await super().receive(client_id=client_id, update=update_inst)
+
+    def _decoded(self, client_id: str, update: Update, received: float, start: float) -> None:
+        sink: Sink = self.sink  # type: ignore[assignment]
+        sink.observe("decode.seconds", perf_counter() - start, model=model_type(update))
+
+        # the peer's spans aren't available here, so fill in when the update was produced
+        produced = created(update)
+        if produced is not None:
+            sink.span(update.id, "produce", produced, client=client_id)
+        sink.span(update.id, "receive", received, client=client_id)
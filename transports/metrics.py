@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from logging import getLogger
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Lifecycle stages of an update, in order.
+# `produce` is the update's `created` timestamp, the rest are recorded as they happen.
+STAGES = ("produce", "queue", "serialize", "send", "receive", "apply")
+
+
+def model_type(update) -> str:
+    """Name of the model type an update is for"""
+    return update.model.__class__.__name__ if update.model is not None else update.model_type
+
+
+def size(frame: Any) -> int:
+    """Size of a frame in bytes, 0 for frames which aren't serialized"""
+    if isinstance(frame, str):
+        return len(frame.encode())
+    if isinstance(frame, (bytes, bytearray)):
+        return len(frame)
+    return 0
+
+
+def created(update) -> Optional[float]:
+    """Wall clock time an update was created at, None if unknown"""
+    if update.created is None:
+        return None
+    if update.created.tzinfo is None:
+        # `Update.created` defaults to naive utc
+        return update.created.replace(tzinfo=timezone.utc).timestamp()
+    return update.created.timestamp()
+
+
+class Sink:
+    """Receives metrics from transports and connections, to be overloaded by concrete sinks.
+
+    Metrics reported:
+        - counters: `messages.in`, `messages.out`, `bytes.in`, `bytes.out`, labelled by `client`,
+          and `updates.rejected` by a `Dispatcher`, labelled by `error`
+        - gauges: `queue.depth`, labelled by `client`
+        - histograms: `encode.seconds`, `decode.seconds`, `apply.seconds` and `latency.seconds`
+          (from produce to apply), labelled by `model`
+        - spans: a wall clock timestamp for each of `STAGES` an update goes through
+
+    Sinks may be called from any thread which sends updates to a model.
+    When no sink is installed on a transport, none of the above is measured.
+    """
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None: ...
+
+    def gauge(self, name: str, value: float, **labels: str) -> None: ...
+
+    def observe(self, name: str, value: float, **labels: str) -> None: ...
+
+    def span(self, update_id: str, stage: str, timestamp: float, **labels: str) -> None: ...
+
+
+class MemorySink(Sink):
+    """Keep metrics in memory, e.g. for tests or to export periodically"""
+
+    counters: Dict[Tuple[str, Labels], float]
+    gauges: Dict[Tuple[str, Labels], float]
+    histograms: Dict[Tuple[str, Labels], List[float]]
+    spans: "OrderedDict[str, Dict[str, float]]"  # Update ID -> stage -> timestamp
+
+    def __init__(self, max_spans: int = 10000):
+        """
+        Args:
+            max_spans (int, optional): number of updates to keep spans for, oldest are evicted first. Defaults to 10000.
+        """
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.spans = OrderedDict()
+        self._max_spans = max_spans
+        self._lock = Lock()
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels: str) -> None:
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.histograms.setdefault(key, []).append(value)
+
+    def span(self, update_id: str, stage: str, timestamp: float, **labels: str) -> None:
+        with self._lock:
+            stages = self.spans.get(update_id)
+            if stages is None:
+                stages = self.spans[update_id] = {}
+                if len(self.spans) > self._max_spans:
+                    self.spans.popitem(last=False)
+            stages[stage] = timestamp
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Current value of a counter, 0 if never counted"""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def percentile(self, name: str, quantile: float, **labels: str) -> Optional[float]:
+        """Percentile of a histogram, e.g. 0.99 for p99, None if nothing was observed"""
+        values = sorted(self.histograms.get((name, tuple(sorted(labels.items()))), ()))
+        if not values:
+            return None
+        return values[min(int(quantile * len(values)), len(values) - 1)]
+
+
+class LoggingSink(Sink):
+    """Log every metric at debug level, mostly useful when debugging"""
+
+    def __init__(self, name: str = "transports.metrics"):
+        self._log = getLogger(name)
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        self._log.debug("count %s %s %s", name, value, labels)
+
+    def gauge(self, name: str, value: float, **labels: str) -> None:
+        self._log.debug("gauge %s %s %s", name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        self._log.debug("observe %s %s %s", name, value, labels)
+
+    def span(self, update_id: str, stage: str, timestamp: float, **labels: str) -> None:
+        self._log.debug("span %s %s %s %s", update_id, stage, datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), labels)
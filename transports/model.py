@@ -1,12 +1,18 @@
-from asyncio import Queue
-from collections import deque
+from asyncio import get_running_loop
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Optional
+from threading import Lock
+from time import time
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional, Set, Tuple, get_args
 from uuid import uuid4
 
 from pydantic import BaseModel as PydanticBaseModel, Field, PrivateAttr, root_validator  # noqa: F401
 
+from .metrics import created
+from .queues import Policy, UpdateQueue
+from .tracking import Tracker, tracked
+
 if TYPE_CHECKING:
+    from .patch import Patch
     from .transport import Transport
     from .update import Update
 
@@ -23,16 +29,23 @@ class BaseModel(PydanticBaseModel):
 
     # internal fields
     _frozen: bool = PrivateAttr(False)
+    _version: int = PrivateAttr(0)  # bumped on every change to a field, or patch applied below it
+    _owned: Optional[Dict[int, Any]] = PrivateAttr(None)  # containers a view may change in place, see `view`
+    _tracker: Optional[Tuple[Tracker, Any, Any]] = PrivateAttr(None)  # tracker, and the model, list or dict we are in and our key in it, see `track`
 
-    # TODO make threadsafe
-    _out_queue: Queue["Update"] = PrivateAttr(default_factory=Queue)
+    # threadsafe for producers via `send`
+    # NOTE: created on first use, most nested models never send
+    _out_queue: Optional[UpdateQueue] = PrivateAttr(default=None)
 
     @root_validator(pre=True)
     @classmethod
     def apply_validation(cls, values):
-        values["id"] = values.get("id", str(uuid4()))
+        # NOTE: only generate defaults when missing, decoded models always have them
+        if "id" not in values:
+            values["id"] = str(uuid4())
         values["name"] = values.get("name", values["id"])
-        values["created"] = values.get("created", datetime.utcnow())
+        if "created" not in values:
+            values["created"] = datetime.utcnow()
         values["modified"] = values.get("modified", values["created"])
         return values
 
@@ -53,16 +66,40 @@ class BaseModel(PydanticBaseModel):
     def __setattr__(self, name, value):
         if self._frozen:
             raise TypeError(f'"{self.__class__.__name__}" is frozen and does not support item assignment')
-        # attach transport if its a basemodel
-        # TODO
-        # if self._transport and isinstance(value, BaseModel):
-        #     value.onTransport(self._transport)
+        private = self.__pydantic_private__
+        if name in self.__class__.model_fields:
+            private["_version"] += 1
+            if private["_tracker"] is not None:
+                tracker = private["_tracker"][0]
+                value = tracked(value, tracker, self, name)
+                tracker.mark(self, name)
+        if name not in self.__class__._traversal():
+            super().__setattr__(name, value)
+            return
+
+        transport = private["_transport"]
+        if transport is None or private["_owned"] is not None:
+            # NOTE: a view's subtrees are registered as those of the model it was taken from
+            super().__setattr__(name, value)
+            return
+
+        # swap the subtree in the transport's registry
+        previous = self.__dict__.get(name)
         super().__setattr__(name, value)
+        if previous is not None:
+            detach(previous, transport)
+        attach(value, transport, root=transport.roots.get(self.id, self.id))
 
     # overload copy to replace id
     def copy(self, clone=False, freeze=False, *args, **kwargs):
         copied = super().copy(*args, **kwargs)
 
+        # each copy consumes its own updates, and isn't tracked
+        # NOTE: private state, which even a frozen model may change
+        private = copied.__pydantic_private__
+        private["_out_queue"] = None
+        private["_tracker"] = None
+
         if not clone:
             # assign new unique id
             copied.id = str(uuid4())
@@ -77,55 +114,116 @@ class BaseModel(PydanticBaseModel):
 
         return copied
 
+    def view(self) -> "BaseModel":
+        """Copy which shares every nested model and container with self, like `copy`,
+        but only until it is changed by `onUpdate`, which copies just the path down to each change.
+
+        Changing a view's nested models or containers in place some other way changes self too.
+
+        Returns:
+            BaseModel: the view, with a new id
+        """
+        copied = self.copy()
+        copied._owned = {id(copied): copied}
+        return copied
+
     @classmethod
     def _walk_types(cls):
         for field in cls.__fields__.values():
             # TODO is this good enough?
             yield field.annotation
 
+    @classmethod
+    def _traversal(cls) -> Tuple[str, ...]:
+        """names of fields which may hold models, computed once per class from `_walk_types`"""
+        fields = _traversals.get(cls)
+        if fields is None:
+            fields = _traversals[cls] = tuple(name for name, annotation in zip(cls.model_fields, cls._walk_types()) if _may_hold_model(annotation))
+        return fields
+
     # transport layer
     _transport: "Transport" = PrivateAttr(default=None)
 
-    def onTransport(self, transport: "Transport", checked: Optional[set] = None):
-        """recursively attach transport"""
-        # attach transport to self
-        self._transport = transport
-
-        to_check: deque[Any] = deque()
-        checked = set([self] + list(checked or set()))
-        to_check.extend(list(self.__dict__.values()))
-
-        while to_check:
-            # bfs
-            value_to_check = to_check.popleft()
-
-            # recurse if its a basemodel
-            if isinstance(value_to_check, BaseModel):
-                if value_to_check not in checked and value_to_check._transport is None:
-                    value_to_check.onTransport(transport=transport, checked=checked)
-                # add self to checked list
-                checked.add(value_to_check)
-
-            # try to extract if its iterable in some form
-            # check if dict first to check key and value
-            if isinstance(value_to_check, dict):
-                to_check.extend(list(value_to_check.keys()))
-                to_check.extend(list(value_to_check.values()))
-            elif isinstance(value_to_check, (list, set, tuple)):
-                to_check.extend((e for e in value_to_check))
-            else:
-                # TODO: give up?
-                ...
-
-    def onUpdate(self, other: "BaseModel", **kwargs) -> None:
-        # TODO json diff OR
-        # monkeypatch setattr/setitem recursively >:-)
-        ...
+    def onTransport(self, transport: "Transport", checked: Optional[Set[int]] = None):
+        """attach transport to self and every model nested within.
+
+        Args:
+            transport (Transport): transport to attach
+            checked (Optional[Set[int]], optional): `id()` of models already visited, to be skipped. Defaults to None.
+        """
+        # attach transport to self, then everything below, frozen or not
+        self.__pydantic_private__["_transport"] = transport
+        attach(self, transport, checked=checked, root=self.id)
+
+    def onUpdate(self, other: Optional["BaseModel"] = None, patch: Optional[List["Patch"]] = None, **kwargs) -> None:
+        """apply an incoming full model or patch to self, in place"""
+        from .patch import apply, diff
+
+        if patch is None and other is not None:
+            # full model, reduce to the fields that actually changed
+            patch = diff(self, other)
+
+        if patch:
+            tracking = self.__pydantic_private__["_tracker"]
+            if tracking is None:
+                apply(self, patch)
+                return
+
+            # incoming changes aren't sent back out
+            tracking[0].paused += 1
+            try:
+                apply(self, patch)
+            finally:
+                tracking[0].paused -= 1
+
+    def track(self, interval: float = 0.0) -> None:
+        """Send changes to the model automatically. Fields of models and items of lists and dicts are
+        recorded by path as they are set, inserted or removed, anywhere below the model, and sent in a
+        single patch once per tick of the running event loop, or once per `interval`, so changing or
+        appending one row of a large list sends just that row, or just the fields of it set.
+
+        NOTE: lists and dicts are replaced by tracked ones, changes through other references to them aren't seen
+        NOTE: sorting, reversing, clearing or slicing a list, or clearing a dict, sends all of it
+
+        Args:
+            interval (float, optional): seconds to collect changes for before sending them. Defaults to 0.0, until the next tick.
+        """
+        self.untrack()
+        tracker = Tracker(self, loop=get_running_loop(), interval=interval)
+        fields = self.__dict__
+        for name in self.__class__.model_fields:
+            fields[name] = tracked(fields[name], tracker, self, name)
+        self.__pydantic_private__["_tracker"] = (tracker, None, None)
+
+    def untrack(self) -> None:
+        """Stop sending changes automatically, after sending any already made"""
+        tracking = self.__pydantic_private__["_tracker"]
+        if tracking is not None:
+            tracker = tracking[0]
+            tracker.flush()
+            # nested values still point at it
+            tracker.paused += 1
+            self.__pydantic_private__["_tracker"] = None
+
+    def flush(self) -> None:
+        """Send tracked changes now, rather than on the next tick, see `track`"""
+        tracking = self.__pydantic_private__["_tracker"]
+        if tracking is not None:
+            tracking[0].flush()
 
     def update(self, model: "BaseModel", model_target: str = ""):
         from .update import Update
 
-        self.send(Update(model=model, model_target=model_target))
+        self.send(Update(model=model, model_target=model_target or self.id))
+
+    def patch(self, previous: Any, model_target: str = "") -> None:
+        """send only what changed since `previous`, a copy or `dict()` snapshot of self"""
+        from .patch import diff
+        from .update import Update
+
+        patch = diff(previous, self)
+        if patch:
+            self.send(Update(patch=patch, model_type=self.__class__.__name__, model_target=model_target or self.id))
 
     def notifyConnect(self, client_id: str) -> None:
         # TODO disallow?
@@ -135,28 +233,171 @@ class BaseModel(PydanticBaseModel):
         # TODO cleanup?
         ...
 
+    def boundQueue(self, maxsize: int = 0, policy: Policy = "block") -> None:
+        """bound the outgoing queue, applying `policy` once it holds `maxsize` updates.
+        Anything already queued is discarded."""
+        self.__pydantic_private__["_out_queue"] = UpdateQueue(
+            maxsize=maxsize, policy=policy, key=conflation_key, overwrites=overwrites, target=conflation_target
+        )
+
+    def _queue(self) -> UpdateQueue:
+        queue = self._out_queue
+        if queue is None:
+            # producers may race to create it from different threads
+            with _queue_lock:
+                queue = self._out_queue
+                if queue is None:
+                    # NOTE: frozen models still queue updates for their clients
+                    queue = self.__pydantic_private__["_out_queue"] = UpdateQueue(key=conflation_key, overwrites=overwrites, target=conflation_target)
+        return queue
+
     def send(self, update: "Update") -> None:
-        self._out_queue.put_nowait(update)
+        # safe to call from any thread
+        self._queue().put_threadsafe(update)
+        self._queued(update)
 
     async def sendAsync(self, update: "Update") -> None:
-        await self._out_queue.put(update)
+        await self._queue().put(update)
+        self._queued(update)
+
+    def _queued(self, update: "Update") -> None:
+        transport = self.__pydantic_private__["_transport"]
+        if transport is not None and transport.sink is not None:
+            produced = created(update)
+            if produced is not None:
+                transport.sink.span(update.id, "produce", produced)
+            transport.sink.span(update.id, "queue", time())
 
     def get(self) -> "Update":
         # TODO
-        return self._transport.run(self._out_queue.get())
+        return self._transport.run(self._queue().get())
 
     async def getAsync(self) -> "Update":
-        return await self._out_queue.get()
+        return await self._queue().get()
+
+    def getNowait(self) -> "Update":
+        return self._queue().get_nowait()
 
     def receive(self, update: "Update") -> None:
         # TODO
         # to be overloaded
-        self.onUpdate(update.model)
+        self.onUpdate(update.model, patch=update.patch)
 
     async def receiveAsync(self, update: "Update") -> None:
         return self.receive(update=update)
 
 
+_queue_lock = Lock()
+_traversals: Dict[type, Tuple[str, ...]] = {}
+
+
+def _may_hold_model(annotation: Any) -> bool:
+    if isinstance(annotation, type):
+        if issubclass(annotation, BaseModel):
+            return True
+        # unparameterized containers may hold anything
+        return issubclass(annotation, (dict, list, set, frozenset, tuple)) or annotation is object
+    args = get_args(annotation)
+    if not args:
+        # Any, TypeVars, forward references, ...
+        return True
+    return any(_may_hold_model(arg) for arg in args if arg is not Ellipsis and arg is not type(None))
+
+
+def attach(value: Any, transport: "Transport", checked: Optional[Set[int]] = None, root: str = "") -> None:
+    """Attach transport to every model in `value`, visiting each model once,
+    and register them in the transport's `registry` under `root`.
+
+    Models already attached to a different transport are left alone, along with their children.
+
+    Args:
+        value (Any): a model, or a container of models
+        transport (Transport): transport to attach
+        checked (Optional[Set[int]], optional): `id()` of models already visited, to be skipped. Defaults to None.
+        root (str, optional): id of the top level model `value` belongs to. Defaults to `value` itself.
+    """
+    checked = checked if checked is not None else set()
+    to_check: List[Any] = [value]
+    registry, roots = transport.registry, transport.roots
+
+    while to_check:
+        value = to_check.pop()
+
+        if isinstance(value, BaseModel):
+            if id(value) in checked:
+                continue
+            checked.add(id(value))
+
+            # NOTE: go through pydantic's private storage directly,
+            # attribute access is most of the cost on large trees
+            private = value.__pydantic_private__
+            current = private["_transport"]
+            if current is not None and current is not transport:
+                continue
+            private["_transport"] = transport
+
+            fields = value.__dict__
+            model_id = fields["id"]
+            registry[model_id] = value
+            roots[model_id] = root = root or model_id
+
+            # only descend into fields which can hold models
+            to_check.extend(fields[name] for name in value.__class__._traversal())
+        elif isinstance(value, dict):
+            to_check.extend(value.values())
+            to_check.extend(key for key in value if isinstance(key, BaseModel))
+        elif isinstance(value, (list, set, frozenset, tuple)):
+            to_check.extend(value)
+
+
+def detach(value: Any, transport: "Transport") -> None:
+    """Remove every model in `value` from the transport's `registry`, e.g. once it is replaced.
+
+    Args:
+        value (Any): a model, or a container of models
+        transport (Transport): transport the models were attached to
+    """
+    to_check: List[Any] = [value]
+    registry, roots = transport.registry, transport.roots
+
+    while to_check:
+        value = to_check.pop()
+
+        if isinstance(value, BaseModel):
+            fields = value.__dict__
+            if registry.get(fields["id"]) is not value:
+                # not ours, or already detached
+                continue
+            del registry[fields["id"]]
+            roots.pop(fields["id"], None)
+            to_check.extend(fields[name] for name in value.__class__._traversal())
+        elif isinstance(value, dict):
+            to_check.extend(value.values())
+            to_check.extend(key for key in value if isinstance(key, BaseModel))
+        elif isinstance(value, (list, set, frozenset, tuple)):
+            to_check.extend(value)
+
+
+def conflation_key(update: "Update") -> Optional[str]:
+    """full model updates to the same target supersede each other, patches and chunked snapshots do not"""
+    # NOTE: chunks of a snapshot have no patch
+    return update.model_target if getattr(update, "patch", False) is None and not update.chunks else None
+
+
+def conflation_target(update: "Update") -> Optional[str]:
+    """target of a patch, which may have been diffed against a full update to it, and so is superseded along with it"""
+    return update.model_target if getattr(update, "patch", None) is not None else None
+
+
+def overwrites(update: "Update") -> Optional[Tuple[str, FrozenSet[Tuple[Any, ...]]]]:
+    """target and paths of a patch which only sets values, and so is made redundant by the update
+    right behind it if that sets the same paths of the same target, see `UpdateQueue.collapse`"""
+    patch = getattr(update, "patch", None)
+    if not patch or any(change.op != "set" for change in patch):
+        return None
+    return update.model_target, frozenset(tuple(change.path) for change in patch)
+
+
 # class ListModel(PydanticBaseModel):
 #     __root__: List[BaseModel]
 #     class Config:
@@ -0,0 +1,165 @@
+from asyncio import Event, QueueEmpty, TimeoutError, wait_for
+from collections import deque
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .queues import UpdateQueue
+
+# Pulls the next frame from a source, and the id of the update it encodes.
+# Raises `QueueEmpty` if there is nothing to send.
+Getter = Callable[[], Tuple[Any, str]]
+
+
+class Mux:
+    """Fair merge of the queues feeding one connection, which may host many models.
+
+    Sources are polled round robin, starting after whichever one sent last,
+    so a busy model can't starve the others sharing the connection.
+
+    Sending can be paced for slow clients with `rate` and `interval`. A model is then flushed
+    at most that often: updates superseded by a later one are dropped, see `UpdateQueue.collapse`,
+    and whatever is left is handed out back to back. Patches are only dropped when the one right
+    behind sets the same paths, the rest are all sent, but a backlog never builds up behind a flush.
+
+    Pacing is per source, i.e. per top level model, rather than per nested target, as holding back
+    updates to one part of a tree while sending those to another would reorder them.
+    """
+
+    sources: Dict[str, Tuple[UpdateQueue, Getter]]  # Model ID -> (queue, getter)
+    rate: float  # max flushes per second across every model, 0 for unlimited
+    interval: float  # min seconds between flushes of the same model, 0 for unlimited
+
+    _order: List[str]
+    _cursor: int
+    _ready: Event
+    _next: float  # earliest time for the next flush, under `rate`
+    _due: Dict[str, float]  # Model ID -> earliest time for its next flush, under `interval`
+    _flushing: Deque[Tuple[Any, str]]  # rest of the last flush, not yet handed out
+    _replies: Deque[Tuple[Any, str]]  # frames answering the peer, not about any one model, see `reply`
+
+    def __init__(self, rate: float = 0.0, interval: float = 0.0):
+        """
+        Args:
+            rate (float, optional): max flushes per second across every model, 0 for unlimited. Defaults to 0.0.
+            interval (float, optional): min seconds between flushes of the same model, 0 for unlimited. Defaults to 0.0.
+        """
+        self.sources = {}
+        self.rate = rate
+        self.interval = interval
+        self._order = []
+        self._cursor = 0
+        self._ready = Event()
+        self._next = 0.0
+        self._due = {}
+        self._flushing = deque()
+        self._replies = deque()
+
+    def add(self, model_id: str, queue: UpdateQueue, getter: Getter) -> None:
+        """Start pulling from a source
+
+        Args:
+            model_id (str): id of the model the source is for
+            queue (UpdateQueue): queue to be woken up by, exclusive to this mux
+            getter (Getter): pulls the next frame from the queue
+        """
+        if model_id not in self.sources:
+            self._order.append(model_id)
+        self.sources[model_id] = (queue, getter)
+        queue.listen(self._ready.set)
+        self._ready.set()
+
+    def remove(self, model_id: str) -> None:
+        source = self.sources.pop(model_id, None)
+        if source is not None:
+            source[0].listen(None)
+            self._order.remove(model_id)
+            self._due.pop(model_id, None)
+
+    def reply(self, frame: Any) -> None:
+        """Hand out a frame ahead of any model's, e.g. to refuse a subscription
+
+        Args:
+            frame (Any): encoded frame
+        """
+        self._replies.append((frame, ""))
+        self._ready.set()
+
+    def get_nowait(self) -> Tuple[Any, str]:
+        if self._flushing:
+            return self._flushing.popleft()
+        if self._replies:
+            return self._replies.popleft()
+        if self.rate or self.interval:
+            return self._flush(monotonic())
+
+        count = len(self._order)
+        for offset in range(count):
+            index = (self._cursor + offset) % count
+            try:
+                frame = self.sources[self._order[index]][1]()
+            except QueueEmpty:
+                continue
+            self._cursor = index + 1
+            return frame
+        raise QueueEmpty
+
+    def _flush(self, now: float) -> Tuple[Any, str]:
+        """next model due a flush, paced by `rate` and `interval`"""
+        if now < self._next:
+            raise QueueEmpty
+
+        count = len(self._order)
+        for offset in range(count):
+            index = (self._cursor + offset) % count
+            model_id = self._order[index]
+            if self._due.get(model_id, 0.0) > now:
+                continue
+
+            queue, getter = self.sources[model_id]
+            # keep only the latest of updates which supersede each other
+            queue.collapse()
+            try:
+                frame = getter()
+            except QueueEmpty:
+                continue
+            while True:
+                # and send the rest right behind it
+                try:
+                    self._flushing.append(getter())
+                except QueueEmpty:
+                    break
+
+            self._cursor = index + 1
+            if self.interval:
+                self._due[model_id] = now + self.interval
+            if self.rate:
+                self._next = now + 1.0 / self.rate
+            return frame
+        raise QueueEmpty
+
+    def _delay(self) -> Optional[float]:
+        """seconds until a model with updates waiting may be flushed, None if nothing is waiting"""
+        if not (self.rate or self.interval):
+            return None
+        now = monotonic()
+        waiting = [self._due.get(model_id, 0.0) for model_id, (queue, _) in self.sources.items() if queue.backlog()]
+        if not waiting:
+            return None
+        return max(min(waiting) - now, self._next - now, 0.0)
+
+    async def get(self) -> Tuple[Any, str]:
+        while True:
+            try:
+                return self.get_nowait()
+            except QueueEmpty:
+                # everything is on the loop, nothing can arrive between the poll and the wait
+                self._ready.clear()
+                delay = self._delay()
+                if delay is None:
+                    await self._ready.wait()
+                    continue
+                try:
+                    # until paced updates are due, or others arrive
+                    await wait_for(self._ready.wait(), delay)
+                except TimeoutError:
+                    ...
@@ -0,0 +1,338 @@
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union, get_args, get_origin
+
+from pydantic import BaseModel as PydanticBaseModel, TypeAdapter
+
+from .model import BaseModel, attach, detach
+
+PathElement = Union[int, str]
+
+
+class Patch(PydanticBaseModel):
+    """A single change to a model, addressed by its path from the model root.
+
+    - `set`: replace the model field, dict key, or list index at `path` with `value`
+    - `insert`: insert `value` into a list before index `path[-1]`
+    - `remove`: delete the dict key or list index at `path`
+    """
+
+    op: Literal["set", "insert", "remove"]
+    path: List[PathElement]
+    value: Any = None
+
+    # pydantic configuration
+    class Config:
+        arbitrary_types_allowed = True
+        extra = "forbid"
+        frozen = True
+
+
+def _fields(value: Any) -> Dict[str, Any]:
+    if isinstance(value, BaseModel):
+        return {name: getattr(value, name) for name in value.__class__.model_fields}
+    return value
+
+
+def _same(old: Any, new: Any) -> bool:
+    """cheap identity check used to line up list elements"""
+    if old is new:
+        return True
+    if isinstance(new, BaseModel):
+        # rows are identified by id, their contents are diffed separately
+        if isinstance(old, BaseModel):
+            return old.__class__ is new.__class__ and old.id == new.id
+        return isinstance(old, dict) and old.get("id") == new.id
+    return type(old) is type(new) and old == new
+
+
+def _diff(old: Any, new: Any, path: Tuple[PathElement, ...], ops: List[Patch]) -> None:
+    if old is new:
+        return
+
+    if isinstance(new, BaseModel):
+        # models are diffed field by field, unless the class changed underneath us
+        if (isinstance(old, BaseModel) and old.__class__ is new.__class__) or isinstance(old, dict):
+            _diff_dict(_fields(old), _fields(new), path, ops)
+            return
+    elif isinstance(new, dict) and isinstance(old, dict):
+        _diff_dict(old, new, path, ops)
+        return
+    elif isinstance(new, list) and isinstance(old, list):
+        _diff_list(old, new, path, ops)
+        return
+    elif type(old) is type(new) and old == new:
+        return
+
+    ops.append(Patch(op="set", path=list(path), value=new))
+
+
+def _diff_dict(old: Dict[Any, Any], new: Dict[Any, Any], path: Tuple[PathElement, ...], ops: List[Patch]) -> None:
+    for key in old:
+        if key not in new:
+            ops.append(Patch(op="remove", path=list(path + (key,))))
+
+    for key, value in new.items():
+        if key in old:
+            _diff(old[key], value, path + (key,), ops)
+        else:
+            ops.append(Patch(op="set", path=list(path + (key,)), value=value))
+
+
+def _diff_list(old: List[Any], new: List[Any], path: Tuple[PathElement, ...], ops: List[Patch]) -> None:
+    old_len, new_len = len(old), len(new)
+    shortest = min(old_len, new_len)
+
+    # trim common prefix and suffix so that a single insert or
+    # removal in the middle of a large list stays a single op
+    prefix = 0
+    while prefix < shortest and _same(old[prefix], new[prefix]):
+        prefix += 1
+
+    suffix = 0
+    while suffix < shortest - prefix and _same(old[old_len - suffix - 1], new[new_len - suffix - 1]):
+        suffix += 1
+
+    # matched prefix rows may still have changed contents
+    for index in range(prefix):
+        _diff(old[index], new[index], path + (index,), ops)
+
+    # pair up the middle, then grow or shrink the list to fit
+    old_middle, new_middle = old_len - prefix - suffix, new_len - prefix - suffix
+    overlap = min(old_middle, new_middle)
+    for index in range(prefix, prefix + overlap):
+        _diff(old[index], new[index], path + (index,), ops)
+    for _ in range(old_middle - overlap):
+        ops.append(Patch(op="remove", path=list(path + (prefix + overlap,))))
+    for index in range(prefix + overlap, prefix + new_middle):
+        ops.append(Patch(op="insert", path=list(path + (index,)), value=new[index]))
+
+    # matched suffix rows, at their post-resize indices
+    for offset in range(suffix):
+        _diff(old[old_len - suffix + offset], new[new_len - suffix + offset], path + (new_len - suffix + offset,), ops)
+
+
+def diff(old: Any, new: Any) -> List[Patch]:
+    """Compute the list of patches which turns `old` into `new`.
+
+    Args:
+        old (Any): previous state, either a copy of the model or a `dict()` snapshot of it
+        new (Any): current state of the model
+
+    Returns:
+        List[Patch]: patches to be applied in order, empty if nothing changed
+    """
+    ops: List[Patch] = []
+    _diff(old, new, (), ops)
+    return ops
+
+
+def locate(model: BaseModel, model_id: str, index: Optional[Dict[str, List[PathElement]]] = None) -> Optional[Tuple[List[PathElement], BaseModel]]:
+    """Find a model nested within `model` by id, e.g. within a view, whose subtrees aren't registered with the transport.
+
+    Args:
+        model (BaseModel): root model to search
+        model_id (str): id of the nested model
+        index (Optional[Dict[str, List[PathElement]]], optional): paths from `model` by id, see `index`, looked up rather than
+                                                                  searched, and built again if out of date. Defaults to None, searched.
+
+    Returns:
+        Optional[Tuple[List[PathElement], BaseModel]]: path from `model` to the nested model, and the nested model, or None if not found
+    """
+    if index is None:
+        return _locate(model, model_id, ())
+
+    path = index.get(model_id)
+    found = _follow(model, path) if path is not None else None
+    if found is None or found.id != model_id:
+        # moved, or added since the index was built
+        index.clear()
+        _index(model, (), index)
+        path = index.get(model_id)
+        found = _follow(model, path) if path is not None else None
+        if found is None:
+            return None
+    return list(path), found  # type: ignore[arg-type]
+
+
+def index(model: BaseModel) -> Dict[str, List[PathElement]]:
+    """Paths from `model` to every model nested within it by id, for `locate` to look up"""
+    paths: Dict[str, List[PathElement]] = {}
+    _index(model, (), paths)
+    return paths
+
+
+def _locate(value: Any, model_id: str, path: Tuple[PathElement, ...]) -> Optional[Tuple[List[PathElement], BaseModel]]:
+    if isinstance(value, BaseModel):
+        if value.id == model_id:
+            return list(path), value
+        children: Any = ((name, value.__dict__[name]) for name in value.__class__._traversal())
+    elif isinstance(value, list):
+        children = enumerate(value)
+    elif isinstance(value, dict):
+        children = value.items()
+    else:
+        return None
+
+    for key, child in children:
+        found = _locate(child, model_id, path + (key,))
+        if found is not None:
+            return found
+    return None
+
+
+def _index(value: Any, path: Tuple[PathElement, ...], paths: Dict[str, List[PathElement]]) -> None:
+    if isinstance(value, BaseModel):
+        # NOTE: the first found, as `_locate` would
+        paths.setdefault(value.id, list(path))
+        children: Any = ((name, value.__dict__[name]) for name in value.__class__._traversal())
+    elif isinstance(value, list):
+        children = enumerate(value)
+    elif isinstance(value, dict):
+        children = value.items()
+    else:
+        return
+
+    for key, child in children:
+        _index(child, path + (key,), paths)
+
+
+def _follow(model: BaseModel, path: List[PathElement]) -> Optional[BaseModel]:
+    """the model at `path` below `model`, if there still is one"""
+    value: Any = model
+    for key in path:
+        if isinstance(value, BaseModel):
+            value = value.__dict__.get(key)  # type: ignore[call-overload]
+        elif isinstance(value, list):
+            value = value[key] if isinstance(key, int) and 0 <= key < len(value) else None
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value if isinstance(value, BaseModel) else None
+
+
+#########
+# Apply #
+#########
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def _unwrap(annotation: Any) -> Any:
+    # Optional[X] -> X
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _child(annotation: Any, container: Any, key: PathElement) -> Any:
+    """annotation of `container[key]` given the annotation of `container`"""
+    if isinstance(container, BaseModel):
+        field = container.__class__.model_fields.get(key)  # type: ignore[call-overload]
+        return field.annotation if field else Any
+    args = get_args(_unwrap(annotation))
+    if isinstance(container, list):
+        return args[0] if args else Any
+    if isinstance(container, dict):
+        return args[1] if len(args) == 2 else Any
+    return Any
+
+
+def _coerce(annotation: Any, value: Any) -> Any:
+    if annotation is Any:
+        return value
+    try:
+        adapter = _adapters.get(annotation)
+    except TypeError:
+        # unhashable annotation
+        return TypeAdapter(annotation).validate_python(value)
+    if adapter is None:
+        adapter = _adapters[annotation] = TypeAdapter(annotation)
+    return adapter.validate_python(value)
+
+
+def _own(container: Any, key: PathElement, child: Any, owned: Dict[int, Any]) -> Any:
+    """replace `container[key]` with a shallow copy of it, for a view to change in place"""
+    copied = child.copy(clone=True) if isinstance(child, BaseModel) else child.copy()
+    if isinstance(copied, BaseModel):
+        # part of the view from now on, see `BaseModel.__setattr__`
+        copied.__pydantic_private__["_owned"] = owned
+
+    # NOTE: straight to storage, a view's subtrees aren't registered with the transport
+    if isinstance(container, BaseModel):
+        container.__dict__[key] = copied
+    elif isinstance(container, list):
+        container[int(key)] = copied
+    else:
+        container[key] = copied
+    owned[id(copied)] = copied
+    return copied
+
+
+def apply(model: BaseModel, patches: List[Patch]) -> None:
+    """Apply a list of patches to `model` in place.
+
+    Views, see `BaseModel.view`, copy every nested model and container on the way
+    to a change the first time they change it, rather than change what they share.
+
+    Args:
+        model (BaseModel): root model the patch paths are relative to
+        patches (List[Patch]): patches, as produced by `diff`
+    """
+    owned = model.__pydantic_private__["_owned"]
+    for patch in patches:
+        if not patch.path:
+            raise ValueError("Patch path must not be empty")
+
+        # walk down to the container holding the changed value
+        container: Any = model
+        annotation: Any = model.__class__
+        for key in patch.path[:-1]:
+            annotation = _child(annotation, container, key)
+            if isinstance(container, BaseModel):
+                child = getattr(container, key)  # type: ignore[arg-type]
+            elif isinstance(container, list):
+                child = container[int(key)]
+            else:
+                child = container[key]
+            if owned is not None and id(child) not in owned and isinstance(child, (BaseModel, list, dict)):
+                child = _own(container, key, child, owned)
+            container = child
+
+        key = patch.path[-1]
+        annotation = _child(annotation, container, key)
+        value = None if patch.op == "remove" else _coerce(annotation, patch.value)
+
+        if isinstance(container, BaseModel):
+            if patch.op != "set":
+                raise ValueError(f"Cannot {patch.op} a model field")
+            # NOTE: attaches transport to new models itself
+            setattr(container, key, value)  # type: ignore[arg-type]
+            continue
+
+        previous = None
+        if isinstance(container, list):
+            if patch.op == "set":
+                previous, container[int(key)] = container[int(key)], value
+            elif patch.op == "insert":
+                container.insert(int(key), value)
+            else:
+                previous = container.pop(int(key))
+        elif isinstance(container, dict):
+            if patch.op == "remove":
+                previous = container.pop(key, None)
+            else:
+                previous, container[key] = container.get(key), value
+        else:
+            raise ValueError(f"Cannot apply patch to {container.__class__.__name__} at {patch.path}")
+
+        transport = model._transport
+        if transport is not None and owned is None:
+            # keep the transport's registry in step with the tree
+            if previous is not None:
+                detach(previous, transport)
+            if value is not None:
+                attach(value, transport, root=transport.roots.get(model.id, model.id))
+
+    if patches:
+        model.__pydantic_private__["_version"] += 1
@@ -0,0 +1,294 @@
+from asyncio import AbstractEventLoop, Queue, get_running_loop
+from collections import deque
+from threading import Lock, get_ident
+from typing import Any, Callable, Deque, Dict, Literal, Optional
+
+from .exceptions import SlowConsumer
+
+# What to do when a bounded queue is full:
+# - `block`: `put` waits for room, `put_nowait` raises `QueueFull`
+# - `drop`: discard the oldest queued item
+# - `conflate`: discard the oldest. Whether full or not, a new item also supersedes the queued one with the same key,
+#   along with those targeting that key, and the last one queued if it overwrites that, see `collapse`
+# - `disconnect`: discard the item and raise `SlowConsumer` to the consumer
+Policy = Literal["block", "drop", "conflate", "disconnect"]
+
+
+def _no_key(item: Any) -> Any:
+    return None
+
+
+class UpdateQueue(Queue):
+    """An asyncio queue with an optional bound and a policy for when that bound is hit.
+
+    Items can also be put from any thread with `put_threadsafe`, which appends to a
+    pending buffer and wakes the consumer's loop once per batch rather than once per item.
+    """
+
+    policy: Policy
+    drops: int  # items discarded by the policy
+    high_water: int  # largest size the queue has reached
+    overflowed: bool  # set under the `disconnect` policy
+
+    _key: Callable[[Any], Any]
+    _overwrites: Callable[[Any], Any]
+    _target: Callable[[Any], Any]
+    _listener: Optional[Callable[[], None]]  # called as items arrive, see `listen`
+
+    # cross-thread ingestion
+    _pending: Deque[Any]
+    _pending_lock: Lock
+    _drain_scheduled: bool
+    _consumer_loop: Optional[AbstractEventLoop]
+    _consumer_thread: Optional[int]
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        policy: Policy = "block",
+        key: Optional[Callable[[Any], Any]] = None,
+        overwrites: Optional[Callable[[Any], Any]] = None,
+        target: Optional[Callable[[Any], Any]] = None,
+    ):
+        """
+        Args:
+            maxsize (int, optional): bound on the number of queued items, 0 for unbounded. Defaults to 0.
+            policy (Policy, optional): what to do once the queue is full. Defaults to "block".
+            key (Optional[Callable[[Any], Any]], optional): key to conflate items on, or None if an item can't be conflated. Defaults to None.
+            overwrites (Optional[Callable[[Any], Any]], optional): what an item overwrites, or None if nothing, such that of two items
+                                                                   right next to each other which overwrite the same, only the later is needed,
+                                                                   e.g. patches setting the same paths. Defaults to None.
+            target (Optional[Callable[[Any], Any]], optional): key of the item an item depends on, or None if none, such that it is dropped
+                                                               along with that item when a later one supersedes it, e.g. patches diffed
+                                                               against a full update. Defaults to None.
+        """
+        super().__init__(maxsize=maxsize)
+        self.policy = policy
+        self.drops = 0
+        self.high_water = 0
+        self.overflowed = False
+        self._key = key or _no_key
+        self._overwrites = overwrites or _no_key
+        self._target = target or _no_key
+        self._listener = None
+
+        self._pending = deque()
+        self._pending_lock = Lock()
+        self._drain_scheduled = False
+        self._consumer_loop = None
+        self._consumer_thread = None
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "UpdateQueue":
+        # queued items belong to the original, copies get a fresh queue
+        return UpdateQueue(maxsize=self.maxsize, policy=self.policy, key=self._key, overwrites=self._overwrites, target=self._target)
+
+    def _put(self, item: Any) -> None:
+        super()._put(item)  # type: ignore[misc]
+        if self.qsize() > self.high_water:
+            self.high_water = self.qsize()
+        if self._listener is not None:
+            self._listener()
+
+    def listen(self, listener: Optional[Callable[[], None]]) -> None:
+        """Call `listener` on the consumer's loop whenever an item arrives, for consumers
+        which wait on several queues at once. Must be called from the consumer's loop.
+
+        Args:
+            listener (Optional[Callable[[], None]]): callback, or None to stop listening
+        """
+        self._listener = listener
+        if listener is not None and self._consumer_loop is None:
+            # items put from other threads are drained on this loop from now on
+            self._consumer_loop = get_running_loop()
+            self._consumer_thread = get_ident()
+
+    def put_nowait(self, item: Any) -> None:
+        if self.policy == "conflate":
+            self._supersede(self._key(item))
+            self._overwrite(self._overwrites(item))
+
+        if not self.full() or self.policy == "block":
+            return super().put_nowait(item)
+
+        self.drops += 1
+
+        if self.policy == "disconnect":
+            self.overflowed = True
+            if self._listener is not None:
+                # wake the consumer, to find out
+                self._listener()
+            return
+
+        # drop the oldest to make room
+        self._queue.popleft()  # type: ignore[attr-defined]
+        self._discarded(1)
+        super().put_nowait(item)
+
+    def _supersede(self, key: Any) -> None:
+        """drop the queued item with the same key, if any, for a newer one to be put behind everything else,
+        along with every queued item targeting it, which can't be applied without it.
+        NOTE: not in its place, as items queued in between may already be reflected in the newer one"""
+        if key is None:
+            return
+        queue = self._queue  # type: ignore[attr-defined]
+        # every put supersedes, so there's at most one
+        if not any(self._key(queued) == key for queued in queue):
+            return
+        kept = [queued for queued in queue if self._key(queued) != key and self._target(queued) != key]
+        dropped = len(queue) - len(kept)
+        queue.clear()
+        queue.extend(kept)
+        self.drops += dropped
+        self._discarded(dropped)
+
+    def _overwrite(self, overwrites: Any) -> None:
+        """drop the last queued item, if the newer one put behind it overwrites the same"""
+        queue = self._queue  # type: ignore[attr-defined]
+        if overwrites is None or not queue or self._overwrites(queue[-1]) != overwrites:
+            return
+        queue.pop()
+        self.drops += 1
+        self._discarded(1)
+
+    def _discarded(self, count: int) -> None:
+        """account for items dropped from the queue, as if they had been handed out and marked `task_done`"""
+        self._unfinished_tasks -= count  # type: ignore[attr-defined]
+        if self._unfinished_tasks == 0:
+            self._finished.set()  # type: ignore[attr-defined]
+        for _ in range(count):
+            # made room
+            self._wakeup_next(self._putters)  # type: ignore[attr-defined]
+
+    async def put(self, item: Any) -> None:
+        if self.policy == "block":
+            return await super().put(item)
+        # other policies make room instead of waiting
+        self.put_nowait(item)
+
+    def put_threadsafe(self, item: Any) -> None:
+        """Put an item from any thread without blocking.
+
+        Off the consumer's thread, the item is buffered and the consumer's loop is woken
+        at most once until that buffer is drained. Buffered items never block the producer,
+        under the `block` policy they wait in the buffer until there is room.
+        """
+        if self._consumer_thread == get_ident():
+            # already on the loop
+            self.put_nowait(item)
+            return
+
+        with self._pending_lock:
+            self._pending.append(item)
+            if self._drain_scheduled or self._consumer_loop is None:
+                # nobody consuming yet, the first `get` will drain
+                return
+            self._drain_scheduled = True
+        self._consumer_loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, deque()
+            self._drain_scheduled = False
+
+        while pending:
+            if self.policy == "block" and self.full():
+                # wait for room, ahead of anything buffered since
+                with self._pending_lock:
+                    pending.extend(self._pending)
+                    self._pending = pending
+                return
+            self.put_nowait(pending.popleft())
+
+    async def get(self) -> Any:
+        if self._consumer_loop is None:
+            self._consumer_loop = get_running_loop()
+            self._consumer_thread = get_ident()
+        if self._pending:
+            self._drain()
+
+        if self.overflowed:
+            raise SlowConsumer(f"Queue exceeded its bound of {self.maxsize}")
+        item = await super().get()
+
+        if self._pending:
+            # made room for buffered items
+            self._drain()
+        return item
+
+    def get_nowait(self) -> Any:
+        if self._pending:
+            self._drain()
+        if self.overflowed:
+            raise SlowConsumer(f"Queue exceeded its bound of {self.maxsize}")
+        item = super().get_nowait()
+
+        if self._pending:
+            # made room for buffered items
+            self._drain()
+        return item
+
+    def collapse(self) -> int:
+        """Drop queued items superseded by a later one with the same key, along with those ahead of it targeting that key,
+        or overwritten by the one right behind them, keeping the order of the rest.
+
+        Returns:
+            int: number of items dropped
+        """
+        if self._pending:
+            self._drain()
+
+        queue = self._queue  # type: ignore[attr-defined]
+        keys, superseded = set(), set()
+        for item in queue:
+            key = self._key(item)
+            if key is not None:
+                (superseded if key in keys else keys).add(key)
+
+        seen = set()
+        kept: Deque[Any] = deque()
+        behind = None  # what the item right behind overwrites
+        for item in reversed(queue):
+            key, overwrites, target = self._key(item), self._overwrites(item), self._target(item)
+            if target in seen and target in superseded:
+                # e.g. a patch diffed against a superseded full update
+                continue
+            if overwrites is not None and overwrites == behind:
+                continue
+            behind = overwrites
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.appendleft(item)
+
+        dropped = len(queue) - len(kept)
+        if dropped:
+            queue.clear()
+            queue.extend(kept)
+            self.drops += dropped
+            self._discarded(dropped)
+        return dropped
+
+    def clear(self) -> int:
+        """Drop everything queued, including items put from other threads, e.g. once a snapshot supersedes them.
+
+        Returns:
+            int: number of items dropped
+        """
+        with self._pending_lock:
+            dropped = len(self._pending)
+            self._pending.clear()
+
+        queue = self._queue  # type: ignore[attr-defined]
+        if queue:
+            dropped += len(queue)
+            self._discarded(len(queue))
+            queue.clear()
+        return dropped
+
+    def backlog(self) -> int:
+        """Number of items waiting, including those put from other threads and not yet drained"""
+        return self.qsize() + len(self._pending)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": self.qsize(), "maxsize": self.maxsize, "drops": self.drops, "high_water": self.high_water}
@@ -0,0 +1,43 @@
+from collections import deque
+from itertools import islice
+from time import time_ns
+from typing import Any, Deque, List, Optional, Tuple
+
+
+class ReplayBuffer:
+    """Ring buffer of the most recent encoded updates to a model, by sequence number.
+
+    Sequence numbers start from the current time in microseconds rather than 0,
+    so a client resuming against a restarted server always falls back to a snapshot,
+    unless they carry on from where a `Journal` left off.
+    """
+
+    seq: int  # sequence number of the latest update
+    frames: Deque[Tuple[Any, Optional[str]]]  # (frame, id of the client it came from, if any)
+
+    def __init__(self, size: int, seq: Optional[int] = None):
+        self.seq = time_ns() // 1000 if seq is None else seq
+        self.frames = deque(maxlen=size)
+
+    def append(self, frame: Any, origin: Optional[str] = None) -> None:
+        """Append the frame for the update with sequence number `seq + 1`, see `next`, sent by client `origin` if any"""
+        self.frames.append((frame, origin))
+
+    def next(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def since(self, seq: int, exclude: Optional[str] = None) -> Optional[List[Any]]:
+        """Frames for every update after `seq`, None if some of them are no longer buffered
+
+        Args:
+            seq (int): last sequence number seen by the client
+            exclude (Optional[str], optional): client id whose own updates to leave out, e.g. without echo. Defaults to None.
+
+        Returns:
+            Optional[List[Any]]: missed frames in order, possibly empty
+        """
+        missed = self.seq - seq
+        if missed < 0 or missed > len(self.frames):
+            return None
+        return [frame for frame, origin in islice(self.frames, len(self.frames) - missed, None) if exclude is None or origin != exclude]
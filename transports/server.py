@@ -1,8 +1,8 @@
-from asyncio import gather
-from typing import Type
+from typing import Optional, Sequence, Type
 
 from .connection import Connection
 from .model import BaseModel
+from .queues import Policy
 from .transport import Transport
 
 
@@ -13,6 +13,13 @@ class Server(Connection):
     _client_id: str
     _shared: bool
     _readonly: bool
+    _echo: bool
+    _queue_size: int
+    _queue_policy: Policy
+    _max_rate: float
+    _min_interval: float
+    _models: Sequence[BaseModel]  # served to the client for as long as it is connected
+    _last_seq: Optional[int] = None  # last update seen by a resuming client, set on `connect`
 
     def __init__(
         self,
@@ -20,14 +27,30 @@ class Server(Connection):
         model: BaseModel,
         shared: bool = True,
         readonly: bool = False,
+        echo: bool = True,
+        batch_size: int = 1,
+        batch_time: float = 0.0,
+        queue_size: int = 0,
+        queue_policy: Policy = "block",
+        max_rate: float = 0.0,
+        min_interval: float = 0.0,
+        models: Sequence[BaseModel] = (),
         **kwargs,
     ):
         self._transport = transport
         self._transport_type = transport.type
         self._model = model
         self._client_id = ""
+        self._models = models
         self._shared = shared
         self._readonly = readonly
+        self._echo = echo
+        self._batch_size = batch_size
+        self._batch_time = batch_time
+        self._queue_size = queue_size
+        self._queue_policy = queue_policy
+        self._max_rate = max_rate
+        self._min_interval = min_interval
 
     async def onOpen(self):
         # wait for client connection
@@ -36,11 +59,38 @@ class Server(Connection):
         # Notify transport of connection
         self._client_id = await self._transport.onConnect(client_id=self._client_id)
 
+        # the client may subscribe to these too
+        for served in self._models:
+            self._transport.serve(served, client_id=self._client_id)
+
         # Host model
-        await self._transport.host(model=self._model, client_id=self._client_id, shared=self._shared, readonly=self._readonly)
+        await self._transport.host(
+            model=self._model,
+            client_id=self._client_id,
+            shared=self._shared,
+            readonly=self._readonly,
+            echo=self._echo,
+            queue_size=self._queue_size,
+            queue_policy=self._queue_policy,
+            max_rate=self._max_rate,
+            min_interval=self._min_interval,
+        )
+
+        # send only what a resuming client missed, if still available
+        missed = await self._transport.resume(client_id=self._client_id, seq=self._last_seq) if self._last_seq is not None else None
+        if missed is not None:
+            if missed:
+                await self.send(missed[0] if len(missed) == 1 else self._transport.encodeBatch(missed))
+            return
+
+        if self._transport.chunk_size:
+            # stream large models a chunk at a time, rather than encode them all at once
+            for frame in await self._transport.initialChunksAsync(client_id=self._client_id):
+                await self.send(frame)
+            return
 
-        # send initial
-        initial = self._transport.initial(client_id=self._client_id)
+        # send initial, large models are encoded off the loop if the transport is set up to
+        initial = await self._transport.initialAsync(client_id=self._client_id)
 
         # send to client
         await self.send(initial)
@@ -56,7 +106,7 @@ class Server(Connection):
             await self.onOpen()
 
             # Now enter an infinite loop listening for updates from client/server forever
-            await gather(self.sender(), self.receiver(), return_exceptions=True)
+            await self.run()
         except:
             raise
         finally:
@@ -0,0 +1,85 @@
+"""Shared harness for the benchmark suites"""
+
+from time import perf_counter
+from tracemalloc import get_traced_memory, is_tracing, reset_peak, start, stop
+from typing import Any, Awaitable, Callable, Iterable, List, NamedTuple
+
+
+class Result(NamedTuple):
+    name: str
+    iterations: int
+    throughput: float  # operations per second
+    p50: float  # seconds
+    p99: float  # seconds
+    peak: int  # peak traced memory, in bytes
+
+
+def _percentile(latencies: List[float], quantile: float) -> float:
+    return latencies[min(int(quantile * len(latencies)), len(latencies) - 1)]
+
+
+def _result(name: str, latencies: List[float], elapsed: float, peak: int) -> Result:
+    latencies.sort()
+    return Result(name, len(latencies), len(latencies) / elapsed, _percentile(latencies, 0.5), _percentile(latencies, 0.99), peak)
+
+
+def bench(name: str, fn: Callable[[], Any], iterations: int, memory_iterations: int = 10) -> Result:
+    """Time `fn` over `iterations` calls, then measure peak memory over a few more.
+
+    Memory is traced separately, as tracing skews the timings.
+    """
+    fn()
+
+    latencies = []
+    start_time = perf_counter()
+    for _ in range(iterations):
+        before = perf_counter()
+        fn()
+        latencies.append(perf_counter() - before)
+    elapsed = perf_counter() - start_time
+
+    tracing = is_tracing()
+    if not tracing:
+        start()
+    reset_peak()
+    for _ in range(min(memory_iterations, iterations)):
+        fn()
+    peak = get_traced_memory()[1]
+    if not tracing:
+        stop()
+
+    return _result(name, latencies, elapsed, peak)
+
+
+async def benchAsync(name: str, fn: Callable[[], Awaitable[Any]], iterations: int, memory_iterations: int = 10) -> Result:
+    """Like `bench`, for coroutine functions"""
+    await fn()
+
+    latencies = []
+    start_time = perf_counter()
+    for _ in range(iterations):
+        before = perf_counter()
+        await fn()
+        latencies.append(perf_counter() - before)
+    elapsed = perf_counter() - start_time
+
+    tracing = is_tracing()
+    if not tracing:
+        start()
+    reset_peak()
+    for _ in range(min(memory_iterations, iterations)):
+        await fn()
+    peak = get_traced_memory()[1]
+    if not tracing:
+        stop()
+
+    return _result(name, latencies, elapsed, peak)
+
+
+def report(results: Iterable[Result]) -> None:
+    print(f"{'benchmark':<40} {'iterations':>10} {'ops/s':>12} {'p50 (us)':>10} {'p99 (us)':>10} {'peak (KiB)':>11}")
+    for result in results:
+        print(
+            f"{result.name:<40} {result.iterations:>10} {result.throughput:>12,.0f} "
+            f"{result.p50 * 1e6:>10,.1f} {result.p99 * 1e6:>10,.1f} {result.peak / 1024:>11,.1f}"
+        )
@@ -0,0 +1,64 @@
+"""Decode throughput of incoming updates by decoder mode.
+
+- `python`: `orjson.loads`, then `parse_obj` and `Update(**data)`
+- `native`: compiled decoder, validated by pydantic-core straight from the wire
+- `trusted`: compiled decoder, constructed without validation
+
+    python -m transports.tests.benchmarks.decode --rows 1000 --iterations 200
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Dict, List
+
+from orjson import loads
+
+from transports import BaseModel, JSONTransport, Update
+
+
+class Row(BaseModel):
+    price: float = 0.0
+    size: int = 0
+    symbol: str = ""
+
+
+class Table(BaseModel):
+    rows: List[Row] = []
+    index: Dict[str, Row] = {}
+
+
+def _table(rows: int) -> Table:
+    data = [Row(price=i * 1.5, size=i, symbol=f"S{i}") for i in range(rows)]
+    return Table(rows=data, index={row.symbol: row for row in data[: rows // 10]})
+
+
+async def _bench(mode: str, frame: str, iterations: int) -> float:
+    transport = JSONTransport(trusted=mode == "trusted")
+    transport.hosts(Table)
+
+    start = perf_counter()
+    for _ in range(iterations):
+        if mode == "python":
+            transport._data_to_update(loads(frame))
+        else:
+            await transport._update_to_model(frame)
+    return iterations / (perf_counter() - start)
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--iterations", type=int, default=200)
+    parsed = parser.parse_args(args)
+
+    print(f"{'rows':>6} {'mode':>8} {'updates/s':>12}")
+    for rows in parsed.rows:
+        frame = Update(model=_table(rows)).json()
+        for mode in ("python", "native", "trusted"):
+            rate = asyncio.run(_bench(mode, frame, parsed.iterations))
+            print(f"{rows:>6} {mode:>8} {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
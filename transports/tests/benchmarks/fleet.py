@@ -0,0 +1,87 @@
+"""A fleet of aiohttp clients sharing one session pool, against a Starlette server.
+
+Measures how long the fleet takes to connect, then the fan out latency of each
+server update, from the change on the server until every client has applied it.
+Run with a large fleet and many updates to soak test the server.
+
+    python -m transports.tests.benchmarks.fleet --clients 200 --updates 100
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import List
+
+from transports import AioHttpWebSocketClient, BaseModel, Fleet, JSONTransport, SessionPool, StarletteWebSocketServer
+
+from .common import Result, benchAsync, report
+from .roundtrip import _free_port
+
+
+class Counter(BaseModel):
+    value: int = 0
+
+
+async def _bench(clients: int, updates: int) -> List[Result]:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.routing import WebSocketRoute
+
+    model = Counter()
+    server_transport = JSONTransport()
+    server_transport.hosts(Counter)
+
+    async def endpoint(websocket):
+        await StarletteWebSocketServer(websocket, server_transport, model).handle()
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(Starlette(routes=[WebSocketRoute("/", endpoint)]), port=port, log_level="error"))
+    serving = asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    def client(pool: SessionPool) -> AioHttpWebSocketClient:
+        transport = JSONTransport()
+        transport.hosts(Counter)
+        return AioHttpWebSocketClient(f"ws://127.0.0.1:{port}/", transport, pool=pool)
+
+    pool = SessionPool()
+    fleet = Fleet([client(pool) for _ in range(clients)])
+    try:
+        start = perf_counter()
+        await fleet.open()
+        connected = perf_counter() - start
+        if any(fleet.errors):
+            raise next(error for error in fleet.errors if error is not None)
+        fleet.start()
+
+        async def fanout():
+            model.value += 1
+            model.update(model)
+            while any(local.value != model.value for local in fleet.models):  # type: ignore[union-attr]
+                await asyncio.sleep(0)
+
+        # clients connected per second, and the time to connect them all
+        connect = Result(f"fleet: connect {clients}", clients, clients / connected, connected, connected, 0)
+        return [connect, await benchAsync(f"fleet: fan out to {clients}", fanout, updates)]
+    finally:
+        await fleet.close()
+        await pool.close()
+        server.should_exit = True
+        await serving
+
+
+def run(clients: int = 50, updates: int = 100) -> List[Result]:
+    return asyncio.run(_bench(clients, updates))
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50, help="number of clients in the fleet")
+    parser.add_argument("--updates", type=int, default=100, help="number of server updates to fan out")
+    options = parser.parse_args(args)
+    report(run(options.clients, options.updates))
+
+
+if __name__ == "__main__":
+    main()
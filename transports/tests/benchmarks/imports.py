@@ -0,0 +1,57 @@
+"""Time taken by `import transports` in a fresh interpreter, and the optional frameworks it pulls in.
+
+Short lived jobs pay for the import on every run, so it is held to `BUDGET`,
+and web frameworks are only imported along with the handlers which need them.
+
+    python -m transports.tests.benchmarks.imports --runs 10
+"""
+
+import subprocess
+import sys
+from argparse import ArgumentParser
+from typing import List
+
+from .common import Result, _result, report
+
+BUDGET = 1.0  # seconds, for `import transports` on its own
+
+# imported by handlers only
+FRAMEWORKS = ("aiohttp", "starlette", "uvicorn", "websockets")
+
+_SCRIPT = """
+import sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+print(perf_counter() - start)
+print(" ".join(name for name in {frameworks!r} if name in sys.modules))
+"""
+
+
+def _import(module: str) -> List[str]:
+    script = _SCRIPT.format(module=module, frameworks=FRAMEWORKS)
+    return subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout.splitlines()
+
+
+def frameworks(module: str = "transports") -> List[str]:
+    """Optional frameworks imported along with `module`"""
+    return _import(module)[1].split()
+
+
+def run(scale: float = 1.0, module: str = "transports") -> List[Result]:
+    runs = max(int(10 * scale), 1)
+    latencies = [float(_import(module)[0]) for _ in range(runs)]
+    return [_result(f"import {module}", latencies, sum(latencies), 0)]
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreters to import in")
+    parser.add_argument("--module", default="transports", help="module to import")
+    options = parser.parse_args(args)
+    report(run(options.runs / 10, options.module))
+    print(f"frameworks imported: {', '.join(frameworks(options.module)) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
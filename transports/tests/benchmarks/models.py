@@ -0,0 +1,102 @@
+"""Throughput, latency and peak memory of the model hot paths.
+
+Covers construction, encoding and decoding of small, wide and deep models,
+attaching a transport to a large tree, and registering a wide type graph.
+
+    python -m transports.tests.benchmarks.models --scale 1
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from typing import Dict, List, Optional
+
+from pydantic import create_model
+
+from transports import BaseModel, JSONTransport, Transport, Update
+
+from .common import Result, bench, report
+
+
+class Small(BaseModel):
+    value: int = 0
+
+
+class Wide(BaseModel):
+    rows: List[Small] = []
+    index: Dict[str, Small] = {}
+
+
+class Deep(BaseModel):
+    value: int = 0
+    child: Optional["Deep"] = None
+
+
+def _wide(size: int) -> Wide:
+    rows = [Small(value=i) for i in range(size)]
+    return Wide(rows=rows, index={row.id: row for row in rows[: size // 10]})
+
+
+def _deep(depth: int) -> Deep:
+    model = Deep()
+    for i in range(depth):
+        model = Deep(value=i, child=model)
+    return model
+
+
+def _tree(branches: int, leaves: int) -> Wide:
+    return Wide(rows=[Small() for _ in range(branches * leaves)], index={str(i): Small() for i in range(branches)})
+
+
+def _type_graph(width: int) -> type:
+    # a model with `width` fields, each of a distinct model type
+    leaves = {f"f{i}": (create_model(f"Leaf{i}", __base__=BaseModel, value=(int, 0)), None) for i in range(width)}
+    return create_model("WideGraph", __base__=BaseModel, **{name: (Optional[leaf], default) for name, (leaf, default) in leaves.items()})
+
+
+def run(scale: float = 1.0) -> List[Result]:
+    def n(count: int) -> int:
+        return max(int(count * scale), 1)
+
+    results = []
+
+    # construction
+    existing = Small().model_dump()
+    results.append(bench("construct: defaults", Small, n(20000)))
+    results.append(bench("construct: from existing", lambda: Small(**existing), n(20000)))
+
+    # encoding and decoding
+    loop = asyncio.new_event_loop()
+    transport = JSONTransport(loop)
+    transport.hosts(Wide)
+    transport.hosts(Deep)
+    models = {"small": Small(value=1), "wide": _wide(n(1000)), "deep": _deep(min(n(100), 200))}
+    transport.hosts(Small)
+
+    for kind, model in models.items():
+        update = Update(model=model)
+        frame = update.json()
+        iterations = n(5000) if kind == "small" else n(100)
+        results.append(bench(f"Update.json: {kind}", update.json, iterations))
+        results.append(bench(f"_update_to_model: {kind}", lambda frame=frame: loop.run_until_complete(transport._update_to_model(frame)), iterations))
+    loop.close()
+
+    # transport attachment, on a fresh tree each time
+    def attach():
+        _tree(n(50), 100).onTransport(Transport(None))
+
+    results.append(bench(f"onTransport: {n(50) * 100 + n(50)} models (incl. build)", attach, n(10), memory_iterations=2))
+
+    # type registration
+    graph = _type_graph(n(500))
+    results.append(bench(f"Transport.hosts: {n(500)} types", lambda: Transport(None).hosts(graph), n(50)))
+    return results
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on model sizes and iteration counts")
+    report(run(parser.parse_args(args).scale))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Loopback round trips from an aiohttp client through a Starlette server and back.
+
+Each round trip is a patch sent by the client, applied by the server,
+and echoed back to the client by the server's broadcast. The same round trip
+through an in-process `Loopback` between plain transports is the baseline,
+without any network or serialization, or copies: updates are passed by reference.
+
+    python -m transports.tests.benchmarks.roundtrip --scale 1
+"""
+
+import asyncio
+import socket
+from argparse import ArgumentParser
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Type
+
+from transports import (
+    AioHttpWebSocketClient,
+    BaseModel,
+    BinaryTransport,
+    JSONTransport,
+    Loopback,
+    LoopbackClient,
+    StarletteWebSocketServer,
+    Transport,
+)
+
+from .common import Result, benchAsync, report
+
+
+class Counter(BaseModel):
+    value: int = 0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def _uvicorn(app: Any) -> AsyncIterator[int]:
+    """Serve an ASGI app on a free port for the duration, yielding the port"""
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="error"))
+    serving = asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield port
+    finally:
+        server.should_exit = True
+        await serving
+
+
+async def _bench(transport_type: Type[JSONTransport], iterations: int) -> Result:
+    from starlette.applications import Starlette
+    from starlette.routing import WebSocketRoute
+
+    model = Counter()
+    server_transport = transport_type()
+    server_transport.hosts(Counter)
+
+    async def endpoint(websocket):
+        await StarletteWebSocketServer(websocket, server_transport, model).handle()
+
+    async with _uvicorn(Starlette(routes=[WebSocketRoute("/", endpoint)])) as port:
+        return await _roundtrips(f"roundtrip: {transport_type.__name__}", f"ws://127.0.0.1:{port}/", transport_type, iterations)
+
+
+async def _roundtrips(name: str, url: str, transport_type: Type[JSONTransport], iterations: int) -> Result:
+    """Time round trips from an aiohttp client to the server at `url`, serving a `Counter`"""
+    client_transport = transport_type()
+    client_transport.hosts(Counter)
+    client = AioHttpWebSocketClient(url, client_transport)
+    local = await client.open()
+
+    async def roundtrip():
+        previous = local.copy(clone=True)
+        local.value += 1
+        local.patch(previous)
+        await client.send(await client_transport.send(client_id=""))
+        # wait for the server's echo, and apply it like `Client.handle` would
+        await client_transport.receive(client_id="", update=await client.receive())
+
+    try:
+        return await benchAsync(name, roundtrip, iterations)
+    finally:
+        await client.close()
+
+
+async def _benchLoopback(iterations: int) -> Result:
+    model = Counter()
+    server_transport = Transport()
+    server_transport.hosts(Counter)
+    loopback = Loopback(server_transport, model)
+
+    client_transport = Transport()
+    client_transport.hosts(Counter)
+    client = LoopbackClient(loopback, client_transport)
+    local = await client.open()
+
+    async def roundtrip():
+        previous = local.copy(clone=True)
+        local.value += 1
+        local.patch(previous)
+        await client.send(await client_transport.send(client_id=""))
+        await client_transport.receive(client_id="", update=await client.receive())
+
+    try:
+        return await benchAsync("roundtrip: loopback", roundtrip, iterations)
+    finally:
+        await client.close()
+        await loopback.close()
+
+
+def run(scale: float = 1.0) -> List[Result]:
+    iterations = max(int(2000 * scale), 1)
+    results = [asyncio.run(_bench(transport_type, iterations)) for transport_type in (JSONTransport, BinaryTransport)]
+    return results + [asyncio.run(_benchLoopback(iterations))]
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the number of round trips")
+    report(run(parser.parse_args(args).scale))
+
+
+if __name__ == "__main__":
+    main()
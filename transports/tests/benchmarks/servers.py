@@ -0,0 +1,69 @@
+"""Round trips from an aiohttp client through each server handler and back.
+
+Compares Starlette's `WebSocket` wrapper against working on raw ASGI messages
+under the same uvicorn server, and against the `websockets` library's own server.
+
+    python -m transports.tests.benchmarks.servers --scale 1 --transport json
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from typing import List, Type
+
+from transports import BinaryTransport, JSONTransport, StarletteWebSocketServer
+
+from .common import Result, report
+from .roundtrip import Counter, _free_port, _roundtrips, _uvicorn
+
+
+async def _starlette(transport_type: Type[JSONTransport], iterations: int) -> Result:
+    from starlette.applications import Starlette
+    from starlette.routing import WebSocketRoute
+
+    model = Counter()
+    server_transport = transport_type()
+    server_transport.hosts(Counter)
+
+    async def endpoint(websocket):
+        await StarletteWebSocketServer(websocket, server_transport, model).handle()
+
+    async with _uvicorn(Starlette(routes=[WebSocketRoute("/", endpoint)])) as port:
+        return await _roundtrips("server: starlette", f"ws://127.0.0.1:{port}/", transport_type, iterations)
+
+
+async def _asgi(transport_type: Type[JSONTransport], iterations: int) -> Result:
+    from transports.handlers.asgi import asgi_app
+
+    server_transport = transport_type()
+    server_transport.hosts(Counter)
+
+    async with _uvicorn(asgi_app(server_transport, Counter())) as port:
+        return await _roundtrips("server: asgi", f"ws://127.0.0.1:{port}/", transport_type, iterations)
+
+
+async def _websockets(transport_type: Type[JSONTransport], iterations: int) -> Result:
+    from transports.handlers.websockets_server import serve
+
+    server_transport = transport_type()
+    server_transport.hosts(Counter)
+
+    port = _free_port()
+    async with serve(server_transport, Counter(), "127.0.0.1", port):
+        return await _roundtrips("server: websockets", f"ws://127.0.0.1:{port}/", transport_type, iterations)
+
+
+def run(scale: float = 1.0, transport_type: Type[JSONTransport] = JSONTransport) -> List[Result]:
+    iterations = max(int(2000 * scale), 1)
+    return [asyncio.run(bench(transport_type, iterations)) for bench in (_starlette, _asgi, _websockets)]
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the number of round trips")
+    parser.add_argument("--transport", choices=("json", "binary"), default="json", help="transport on both ends")
+    options = parser.parse_args(args)
+    report(run(options.scale, BinaryTransport if options.transport == "binary" else JSONTransport))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Updates per second from N producer threads into a model's out queue.
+
+Compares the buffered `BaseModel.send` path against a coroutine
+round trip per update with `ThreadedMixin.run`.
+
+    python -m transports.tests.benchmarks.threads --threads 1 2 4 8 --updates 20000
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from threading import Thread
+from time import perf_counter
+from typing import Callable, List
+
+from transports import BaseModel, Transport, Update
+
+
+class Tick(BaseModel):
+    price: float = 0.0
+
+
+def _producers(threads: int, updates: int, produce: Callable[[], None]) -> List[Thread]:
+    def run():
+        for _ in range(updates):
+            produce()
+
+    return [Thread(target=run, daemon=True) for _ in range(threads)]
+
+
+async def _bench(mode: str, threads: int, updates: int) -> float:
+    model = Tick()
+    transport = Transport(asyncio.get_running_loop())
+    model.onTransport(transport)
+    update = Update(model=model)
+
+    if mode == "send":
+
+        def produce():
+            model.send(update)
+    else:
+
+        def produce():
+            transport.run(model.sendAsync(update))
+
+    # make sure the consumer is registered on the loop first
+    waiting = asyncio.ensure_future(model.getAsync())
+    await asyncio.sleep(0)
+
+    start = perf_counter()
+    producers = _producers(threads, updates, produce)
+    for producer in producers:
+        producer.start()
+
+    total = threads * updates
+    await waiting
+    for _ in range(total - 1):
+        await model.getAsync()
+    elapsed = perf_counter() - start
+
+    # join off the loop, `run` producers need it to finish their last round trip
+    for producer in producers:
+        await asyncio.get_running_loop().run_in_executor(None, producer.join)
+    return total / elapsed
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--updates", type=int, default=20000, help="updates per thread")
+    parsed = parser.parse_args(args)
+
+    print(f"{'mode':>6} {'threads':>8} {'updates/s':>12}")
+    for mode in ("send", "run"):
+        for threads in parsed.threads:
+            # the round trip path is much slower, keep its runtime reasonable
+            updates = parsed.updates if mode == "send" else max(parsed.updates // 10, 1)
+            rate = asyncio.run(_bench(mode, threads, updates))
+            print(f"{mode:>6} {threads:>8} {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
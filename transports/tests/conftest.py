@@ -0,0 +1,57 @@
+import asyncio
+import inspect
+from typing import List, Optional
+
+import pytest
+
+from transports.server import Server
+
+
+class RecordingServer(Server):
+    """Server which keeps what it sends, and never receives anything"""
+
+    frames: List[str]
+
+    def __init__(self, *args, client_id: str = "client", last_seq: Optional[int] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frames = []
+        self._connect_as = client_id
+        self._connect_seq = last_seq
+
+    async def connect(self):
+        self._last_seq = self._connect_seq
+        return self._connect_as
+
+    async def disconnect(self) -> None: ...
+
+    async def receive(self):  # type: ignore[override]
+        await asyncio.Event().wait()
+
+    async def send(self, update):  # type: ignore[override]
+        self.frames.append(update)
+
+
+@pytest.fixture
+def recording_server():
+    return RecordingServer
+
+
+@pytest.fixture(autouse=True)
+def current_loop():
+    # transports created outside of a running loop, e.g. `Transport(None)`, pick up the current one,
+    # which `asyncio.run` leaves unset once it is done
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    # coroutine tests each run on a loop of their own, which cancels anything they leave running
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
@@ -0,0 +1,23 @@
+from transports.tests.benchmarks import fleet, models, roundtrip, servers
+
+
+class TestBenchmarks:
+    def test_models(self):
+        results = models.run(scale=0.001)
+        assert results
+        for result in results:
+            assert result.iterations >= 1
+            assert result.throughput > 0
+            assert result.p50 <= result.p99
+
+    def test_roundtrip(self):
+        results = roundtrip.run(scale=0.001)
+        assert [result.name for result in results] == ["roundtrip: JSONTransport", "roundtrip: BinaryTransport", "roundtrip: loopback"]
+
+    def test_fleet(self):
+        results = fleet.run(clients=5, updates=3)
+        assert [result.name for result in results] == ["fleet: connect 5", "fleet: fan out to 5"]
+
+    def test_servers(self):
+        results = servers.run(scale=0.001)
+        assert [result.name for result in results] == ["server: starlette", "server: asgi", "server: websockets"]
@@ -0,0 +1,797 @@
+import asyncio
+import time
+from asyncio import QueueFull
+from threading import Thread
+from typing import List
+from unittest.mock import AsyncMock
+
+import pytest
+from aiohttp import ClientSession
+from orjson import loads
+
+from transports import (
+    AioHttpWebSocketClient,
+    ASGIWebSocketServer,
+    BaseModel,
+    BinaryTransport,
+    Fleet,
+    JSONTransport,
+    Loopback,
+    LoopbackClient,
+    Patch,
+    SessionPool,
+    Transport,
+    Update,
+)
+from transports.client import Client
+from transports.exceptions import UpdateMalformed
+from transports.queues import UpdateQueue
+from transports.replay import ReplayBuffer
+from transports.server import Server
+from transports.update import Subscription
+
+
+class MyModel(BaseModel):
+    x: int = 0
+
+
+class Row(BaseModel):
+    value: int = 0
+
+
+class Table(BaseModel):
+    rows: List[Row] = []
+
+
+async def _drain(server: Server, count: int) -> None:
+    task = asyncio.ensure_future(server.sender())
+    while len(server.frames) < count:
+        await asyncio.sleep(0)
+    task.cancel()
+
+
+class TestConnection:
+    async def test_batching(self, recording_server):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        server = recording_server(transport=transport, model=model, batch_size=4)
+        await server.onOpen()
+
+        for i in range(6):
+            model.x = i
+            model.update(model.copy(clone=True))
+
+        # initial, then one batch of 4, then the remaining 2
+        await _drain(server, 3)
+        assert [len(loads(frame)) for frame in server.frames[1:]] == [4, 2]
+
+        # the receiving side unpacks batches
+        remote = JSONTransport()
+        remote.hosts(MyModel)
+        initial = await remote.onInitial(server.frames[0])
+        for frame in server.frames[1:]:
+            await remote.receive(client_id="", update=frame)
+        assert initial.x == 5
+        await server.onClose()
+
+    async def test_batch_time(self, recording_server):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        server = recording_server(transport=transport, model=model, batch_size=3, batch_time=0.2)
+        await server.onOpen()
+
+        async def publish(count, delay=0.0):
+            for _ in range(count):
+                await asyncio.sleep(delay)
+                model.x += 1
+                model.update(model.copy(clone=True))
+
+        # a full batch goes out without waiting
+        await publish(3)
+        start = time.perf_counter()
+        await _drain(server, 2)
+        assert time.perf_counter() - start < 0.1
+        assert len(loads(server.frames[1])) == 3
+
+        # a short one waits for more, up to the batch time in total
+        task = asyncio.ensure_future(server.sender())
+        await publish(2, delay=0.02)
+        while len(server.frames) < 3:
+            await asyncio.sleep(0.01)
+        assert len(loads(server.frames[2])) == 2
+        assert time.perf_counter() - start > 0.15
+        task.cancel()
+        await server.onClose()
+
+    async def test_slow_consumer_disconnect(self, recording_server):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        server = recording_server(transport=transport, model=model, queue_size=2, queue_policy="disconnect")
+        server.disconnect = AsyncMock()  # type: ignore[method-assign]
+        await server.onOpen()
+
+        # overflow the client's queue before the sender gets to run
+        for _ in range(3):
+            await transport.broadcasts[model.id].publish(Update(model=model))
+        assert transport.queueStats("client")["drops"] == 1
+
+        await server.sender()
+        server.disconnect.assert_awaited_once()
+        await server.onClose()
+
+    async def test_resume(self, recording_server):
+        transport = JSONTransport(replay_size=3)
+        transport.hosts(MyModel)
+        model = MyModel()
+        first = recording_server(transport=transport, model=model, client_id="first")
+        await first.onOpen()
+        seq = loads(first.frames[0])["seq"]
+
+        for i in range(4):
+            model.x = i
+            model.update(model.copy(clone=True))
+        await _drain(first, 5)
+        assert [loads(frame)["seq"] for frame in first.frames[1:]] == [seq + 1, seq + 2, seq + 3, seq + 4]
+
+        # only the missed updates, batched
+        resumed = recording_server(transport=transport, model=model, client_id="resumed", last_seq=seq + 2)
+        await resumed.onOpen()
+        assert [update["seq"] for update in loads(resumed.frames[0])] == [seq + 3, seq + 4]
+
+        # nothing missed, nothing sent
+        current = recording_server(transport=transport, model=model, client_id="current", last_seq=seq + 4)
+        await current.onOpen()
+        assert current.frames == []
+
+        # too far behind, full snapshot
+        behind = recording_server(transport=transport, model=model, client_id="behind", last_seq=seq)
+        await behind.onOpen()
+        assert loads(behind.frames[0])["model"]["x"] == 3
+        assert loads(behind.frames[0])["seq"] == seq + 4
+
+        # the client keeps track of where it is
+        remote = JSONTransport()
+        remote.hosts(MyModel)
+        initial = await remote.onInitial(first.frames[0])
+        for frame in first.frames[1:3]:
+            await remote.receive(client_id="", update=frame)
+        await remote.receive(client_id="", update=resumed.frames[0])
+        assert initial.x == 3
+        assert remote.seqs[model.id] == seq + 4
+
+        for server in (first, resumed, current, behind):
+            await server.onClose()
+
+    async def test_snapshot_while_queued(self, recording_server):
+        transport = JSONTransport(replay_size=3)
+        transport.hosts(MyModel)
+        model = MyModel()
+        first = recording_server(transport=transport, model=model, client_id="first")
+        await first.onOpen()
+        seq = loads(first.frames[0])["seq"]
+
+        # still queued as the next client connects
+        for i in range(2):
+            model.x = i + 1
+            model.update(model.copy(clone=True))
+        second = recording_server(transport=transport, model=model, client_id="second")
+        await second.onOpen()
+
+        # the snapshot reflects them, and is stamped as such
+        snapshot = loads(second.frames[0])
+        assert snapshot["model"]["x"] == 2 and snapshot["seq"] == seq + 2
+        assert transport.sendNowait("second") is None
+
+        # while everyone else still gets them, and what follows
+        model.x = 3
+        model.update(model.copy(clone=True))
+        await _drain(first, 4)
+        await _drain(second, 2)
+        assert [loads(frame)["seq"] for frame in first.frames[1:]] == [seq + 1, seq + 2, seq + 3]
+        assert loads(second.frames[1])["seq"] == seq + 3
+
+        for server in (first, second):
+            await server.onClose()
+
+    async def test_resume_without_echo(self, recording_server):
+        transport = JSONTransport(replay_size=3)
+        transport.hosts(MyModel)
+        model = MyModel()
+        first = recording_server(transport=transport, model=model, client_id="first")
+        await first.onOpen()
+        seq = loads(first.frames[0])["seq"]
+
+        writer = recording_server(transport=transport, model=model, client_id="writer", echo=False)
+        await writer.onOpen()
+        await transport.receive(client_id="writer", update=transport.encode(Update(model=MyModel(id=model.id, x=1), model_target=model.id)))
+        model.x = 2
+        model.update(model.copy(clone=True))
+        await _drain(first, 3)
+        await writer.onClose()
+
+        # the writer isn't sent back its own update on resuming either
+        resumed = recording_server(transport=transport, model=model, client_id="writer", echo=False, last_seq=seq)
+        await resumed.onOpen()
+        assert loads(resumed.frames[0])["seq"] == seq + 2
+
+        for server in (first, resumed):
+            await server.onClose()
+
+    async def test_resume_idle(self, recording_server):
+        transport = JSONTransport(replay_size=3, replay_idle=2)
+        transport.hosts(MyModel)
+        models = [MyModel() for _ in range(5)]
+        seqs = []
+        for model in models:
+            server = recording_server(transport=transport, model=model)
+            await server.onOpen()
+            seqs.append(loads(server.frames[0])["seq"])
+            model.x = 1
+            model.update(model.copy(clone=True))
+            await _drain(server, 2)
+            await server.onClose()
+
+        # only the most recently left are kept
+        assert transport.replays == {}
+        assert list(transport._idle) == [model.id for model in models[-2:]]
+
+        # which can still be resumed after everyone disconnected
+        resumed = recording_server(transport=transport, model=models[-1], last_seq=seqs[-1])
+        await resumed.onOpen()
+        assert loads(resumed.frames[0])["seq"] == seqs[-1] + 1
+        assert list(transport.replays) == [models[-1].id]
+        await resumed.onClose()
+
+        # while the others start over from a snapshot
+        behind = recording_server(transport=transport, model=models[0], last_seq=seqs[0])
+        await behind.onOpen()
+        assert loads(behind.frames[0])["model"]["x"] == 1
+        await behind.onClose()
+
+    async def test_reconnect(self):
+        class FlakyClient(Client):
+            attempts = 0
+
+            async def connect(self, client_id=None):
+                self.attempts += 1
+                if self.attempts < 4:
+                    raise ConnectionRefusedError
+
+            async def disconnect(self) -> None: ...
+
+            async def receive(self): ...
+
+            async def send(self, update): ...
+
+        client = FlakyClient(JSONTransport(), reconnect=True, backoff=0.001)
+        await client.reconnect()
+        assert client.attempts == 4
+        assert client.lastSeq() is None
+
+    async def test_fleet(self):
+        class FailingClient(Client):
+            def __init__(self, error):
+                super().__init__(JSONTransport())
+                self.error = error
+
+            async def connect(self, client_id=None):
+                raise self.error
+
+            async def disconnect(self) -> None: ...
+
+            async def receive(self): ...
+
+            async def send(self, update): ...
+
+        # clients which can't connect are kept aside
+        refused = ConnectionRefusedError()
+        fleet = Fleet([FailingClient(refused)])
+        assert await fleet.open() == [None]
+        assert fleet.errors == [refused]
+
+        # but bugs aren't
+        with pytest.raises(RuntimeError):
+            await Fleet([FailingClient(RuntimeError())]).open()
+
+    async def test_multiplex(self, recording_server):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        a, b = MyModel(), MyModel()
+        server = recording_server(transport=transport, model=a, models=[b])
+        await server.onOpen()
+
+        remote = JSONTransport()
+        remote.hosts(MyModel)
+        remote_a = await remote.onInitial(server.frames[0])
+        subscribed = remote.expect(b.id)
+        await transport.receive(client_id="client", update=Subscription(op="subscribe", model_target=b.id).json())
+
+        for i in range(1, 6):
+            a.x = i
+            a.update(a.copy(clone=True))
+        for i in range(1, 3):
+            b.x = i * 10
+            b.update(b.copy(clone=True))
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+        # round robin, b's snapshot first then its updates
+        await _drain(server, 9)
+        targets = [loads(frame)["model_target"] for frame in server.frames[1:]]
+        assert targets == [a.id, b.id, a.id, b.id, a.id, b.id, a.id, a.id]
+
+        for frame in server.frames[1:]:
+            await remote.receive(client_id="", update=frame)
+        remote_b = await subscribed
+        assert (remote_a.x, remote_b.x) == (5, 20)
+
+        # and back to the server, routed by target
+        remote_b.x = 30
+        remote_b.update(remote_b.copy(clone=True))
+        await transport.receive(client_id="client", update=await remote.send(client_id=""))
+        assert (a.x, b.x) == (5, 30)
+
+        # no more updates to b once unsubscribed
+        await transport.receive(client_id="client", update=Subscription(op="unsubscribe", model_target=b.id).json())
+        assert list(transport.subscriptions["client"]) == [a.id]
+        assert b.id not in transport.broadcasts
+
+        # only what is served explicitly, not what other clients are hosted
+        other = MyModel()
+        await transport.host(model=other, client_id="other")
+        assert list(transport.serving) == [b.id]
+        await transport.onDisconnect(model=other, client_id="other")
+
+        # for as long as the client is connected
+        await server.onClose()
+        assert transport.muxes == {}
+        assert transport.serving == {}
+
+    async def test_subscribe_unknown(self, recording_server):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        server = recording_server(transport=transport, model=model)
+        await server.onOpen()
+
+        remote = JSONTransport()
+        remote.hosts(MyModel)
+        remote_model = await remote.onInitial(server.frames[0])
+        subscribed = remote.expect("missing")
+        await transport.receive(client_id="client", update=Subscription(op="subscribe", model_target="missing").json())
+
+        # refused, without dropping the connection
+        model.x = 1
+        model.update(model.copy(clone=True))
+        await _drain(server, 3)
+        for frame in server.frames[1:]:
+            await remote.receive(client_id="", update=frame)
+        with pytest.raises(UpdateMalformed):
+            await subscribed
+        assert remote_model.x == 1
+        await server.onClose()
+
+    async def test_readonly(self, recording_server):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel(x=1)
+        server = recording_server(transport=transport, model=model, readonly=True)
+        await server.onOpen()
+        assert loads(server.frames[0])["model"]["x"] == 1
+
+        # sent the server's updates, like any other client
+        model.x = 2
+        model.update(model.copy(clone=True))
+        await _drain(server, 2)
+        assert loads(server.frames[1])["model"]["x"] == 2
+
+        # frozen models can be hosted, and copied, too
+        frozen = model.copy(freeze=True)
+        await transport.host(model=frozen, client_id="frozen")
+        assert frozen._transport is transport
+        assert frozen.copy(clone=True).x == 2
+        assert await transport.initialAsync(client_id="frozen")
+
+        await server.onClose()
+        await transport.onDisconnect(model=frozen, client_id="frozen")
+
+    async def test_chunked_snapshot(self, recording_server):
+        class ReplayClient(Client):
+            def __init__(self, *args, frames, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.frames = list(frames)
+
+            async def connect(self, client_id=None): ...
+
+            async def disconnect(self) -> None: ...
+
+            async def receive(self):
+                return self.frames.pop(0)
+
+            async def send(self, update): ...
+
+        transport = JSONTransport(chunk_size=10)
+        transport.hosts(Table)
+        table = Table(rows=[Row(value=i) for i in range(25)])
+        server = recording_server(transport=transport, model=table)
+        await server.onOpen()
+
+        # rows follow the head in order, 10 at a time
+        head, *chunks = [loads(frame) for frame in server.frames]
+        assert (head["chunks"], head["model"]["rows"]) == (3, [])
+        assert [len(chunk["items"]) for chunk in chunks] == [10, 10, 5]
+
+        # filled in as chunks arrive
+        remote = JSONTransport()
+        remote.hosts(Table)
+        initial = await remote.onInitial(server.frames[0])
+        loaded = remote.loaded(initial.id)
+        for frame in server.frames[1:]:
+            assert not loaded.done()
+            await remote.receive(client_id="", update=frame)
+        assert await loaded is initial
+        assert [row.value for row in initial.rows] == list(range(25))
+        assert remote.registry[table.rows[24].id] is initial.rows[24]
+
+        # clients wait for the whole snapshot unless asked not to
+        client = ReplayClient(JSONTransport(), frames=server.frames)
+        client._transport.hosts(Table)
+        assert len((await client.open()).rows) == 25
+        partial = ReplayClient(JSONTransport(), frames=server.frames, partial=True)
+        partial._transport.hosts(Table)
+        assert (await partial.open()).rows == []
+        await server.onClose()
+
+    async def test_loopback(self):
+        table = Table(rows=[Row(value=1)])
+        server_transport, client_transport = Transport(), Transport()
+        server_transport.hosts(Table)
+        client_transport.hosts(Table)
+
+        # both ends may ask for copies, so that nothing is shared between them
+        copied = Loopback(server_transport, table, copy=True)
+        client = LoopbackClient(copied, client_transport, copy=True)
+        local = await client.open()
+        assert local is not table and local.rows[0] is not table.rows[0]
+        assert local.rows[0].value == 1
+        copying = asyncio.ensure_future(client.handle())
+
+        # server changes reach the client
+        table.rows[0].value = 2
+        table.update(table)
+        await asyncio.sleep(0.01)
+        assert local.rows[0].value == 2
+
+        # and client changes reach the server
+        previous = local.copy(deep=True)
+        local.rows.append(Row(value=3))
+        local.patch(previous)
+        await client.send(await client_transport.send(client_id=""))
+
+        # as they were when sent
+        local.rows[1].value = 4
+        await asyncio.sleep(0.01)
+        assert [row.value for row in table.rows] == [2, 3]
+        assert table.rows[1] is not local.rows[1]
+
+        await client.close()
+        copying.cancel()
+        await copied.close()
+
+        # everything is passed by reference by default, for ends which never change what they send or receive in place
+        loopback = Loopback(server_transport, table)
+        shared = LoopbackClient(loopback, Transport())
+        shared._transport.hosts(Table)
+        assert (await shared.open()).rows[0] is table.rows[0]
+        handling = asyncio.ensure_future(shared.handle())
+
+        # clients are hung up on once the endpoint stops
+        await loopback.close()
+        await asyncio.wait_for(handling, 1)
+
+    async def test_loopback_client_id(self):
+        model = MyModel()
+        server_transport, client_transport = Transport(), Transport()
+        loopback = Loopback(server_transport, model)
+
+        # routed under the client's own id on both ends
+        client = LoopbackClient(loopback, client_transport, client_id="abc")
+        local = await client.open()
+        assert list(client_transport.subscriptions) == ["abc"]
+        handling = asyncio.ensure_future(client.handle())
+
+        model.x = 1
+        model.update(model.copy(clone=True))
+        await asyncio.sleep(0.01)
+        assert local.x == 1
+
+        local.x = 2
+        local.update(local.copy(clone=True))
+        await asyncio.sleep(0.01)
+        assert model.x == 2
+        assert not handling.done()
+
+        await client.close()
+        handling.cancel()
+        await loopback.close()
+
+    async def test_reconnect_own_copy(self):
+        model = MyModel()
+        server_transport, client_transport = Transport(), Transport()
+        loopback = Loopback(server_transport, model, shared=False)
+
+        client = LoopbackClient(loopback, client_transport, reconnect=True, backoff=0.001)
+        local = await client.open()
+        handling = asyncio.ensure_future(client.handle())
+        (view,) = server_transport.models.values()
+        view.x = 1
+        view.update(view.copy(clone=True))
+        await asyncio.sleep(0.01)
+        assert local.x == 1
+
+        # dropped, and hosted again as a fresh copy with a new id
+        await loopback.close()
+        await asyncio.sleep(0.05)
+        (view,) = server_transport.models.values()
+        assert local.id == view.id and local.x == 0
+
+        # the client's model carries on in both directions
+        local.x = 7
+        local.update(local.copy(clone=True))
+        await asyncio.sleep(0.01)
+        assert view.x == 7
+        view.x = 8
+        view.update(view.copy(clone=True))
+        await asyncio.sleep(0.01)
+        assert local.x == 8
+
+        await client.close()
+        handling.cancel()
+        await loopback.close()
+
+
+class TestServers:
+    async def test_asgi(self):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        scope = {"type": "websocket", "subprotocols": ["transports.binary"], "headers": [(b"client-id", b"abc")]}
+        incoming = [
+            {"type": "websocket.connect"},
+            # either frame type is taken, whatever was negotiated
+            {
+                "type": "websocket.receive",
+                "text": Update(model_type="MyModel", model_target=model.id, patch=[{"op": "set", "path": ["x"], "value": 1}]).json(),
+            },
+            {
+                "type": "websocket.receive",
+                "bytes": Update(model_type="MyModel", model_target=model.id, patch=[{"op": "set", "path": ["x"], "value": 2}]).binary(),
+            },
+            {"type": "websocket.disconnect", "code": 1000},
+        ]
+        outgoing = []
+
+        async def receive():
+            # let the sender catch up between frames
+            await asyncio.sleep(0.01)
+            return incoming.pop(0)
+
+        async def send(message):
+            outgoing.append(message)
+
+        server = ASGIWebSocketServer(scope, receive, send, transport, model)
+        await server.handle()
+
+        accept, initial, *_ = outgoing
+        assert accept == {"type": "websocket.accept", "subprotocol": "transports.binary"}
+        assert loads(initial["bytes"])["model"]["x"] == 0
+        assert server._client_id == "abc" and model.x == 2
+        # the client is gone, nothing to close
+        await server.disconnect()
+        assert outgoing[-1]["type"] != "websocket.close"
+
+    async def test_websockets(self):
+        from transports.handlers.websockets_server import serve
+        from transports.tests.benchmarks.roundtrip import _free_port
+
+        async def run(transport_type):
+            transport = transport_type()
+            transport.hosts(MyModel)
+            model = MyModel()
+            port = _free_port()
+            async with serve(transport, model, "127.0.0.1", port):
+                client_transport = transport_type()
+                client_transport.hosts(MyModel)
+                client = AioHttpWebSocketClient(f"ws://127.0.0.1:{port}/", client_transport)
+                local = await client.open()
+                assert client._binary == (transport_type is BinaryTransport)
+                handling = asyncio.ensure_future(client.handle())
+
+                model.x = 3
+                model.update(model)
+                await asyncio.sleep(0.05)
+                assert local.x == 3
+
+                await client.close()
+                await asyncio.sleep(0.05)
+                assert not transport.broadcasts
+                await handling
+
+        for transport_type in (JSONTransport, BinaryTransport):
+            await run(transport_type)
+
+
+class TestSessionPool:
+    async def test_sessions(self):
+        # clients close their own session on disconnect
+        client = AioHttpWebSocketClient("ws://localhost/", JSONTransport())
+        client._session = session = ClientSession()
+        await client.disconnect()
+        assert session.closed and client._session is None
+
+        # but leave a shared one open for the rest
+        async with SessionPool(limit=10) as pool:
+            clients = [AioHttpWebSocketClient("ws://localhost/", JSONTransport(), pool=pool) for _ in range(2)]
+            shared = pool.session()
+            assert pool.session() is shared and shared.connector.limit == 10
+            for client in clients:
+                client._session = pool.session()
+                await client.disconnect()
+            assert not shared.closed
+        assert shared.closed
+
+
+class TestReplayBuffer:
+    def test_since(self):
+        replay = ReplayBuffer(size=2)
+        start = replay.seq
+        for frame in "abc":
+            replay.next()
+            replay.append(frame)
+        assert replay.since(start + 3) == []
+        assert replay.since(start + 1) == ["b", "c"]
+        assert replay.since(start) is None
+        # from some other server
+        assert replay.since(start + 4) is None
+        assert replay.since(0) is None
+
+        # without a client's own updates
+        replay.next()
+        replay.append("d", origin="client")
+        assert replay.since(start + 2, exclude="client") == ["c"]
+
+
+class TestUpdateQueue:
+    def test_drop(self):
+        queue = UpdateQueue(maxsize=2, policy="drop")
+        for i in range(5):
+            queue.put_nowait(i)
+        assert [queue.get_nowait(), queue.get_nowait()] == [3, 4]
+        assert queue.stats() == {"size": 0, "maxsize": 2, "drops": 3, "high_water": 2}
+
+    async def test_block(self):
+        queue = UpdateQueue(maxsize=1)
+        queue.put_nowait(0)
+        with pytest.raises(QueueFull):
+            queue.put_nowait(1)
+
+        # async producers wait for room
+        put = asyncio.ensure_future(queue.put(1))
+        await asyncio.sleep(0)
+        assert not put.done()
+        assert queue.get_nowait() == 0
+        await put
+        assert queue.get_nowait() == 1
+
+    async def test_threadsafe(self):
+        model = MyModel()
+        update = Update(model=model)
+
+        # consumer registered on the loop before producers start
+        first = asyncio.ensure_future(model.getAsync())
+        await asyncio.sleep(0)
+
+        producers = [Thread(target=lambda: [model.send(update) for _ in range(1000)]) for _ in range(4)]
+        for producer in producers:
+            producer.start()
+
+        received = [await first]
+        while len(received) < 4000:
+            received.append(await model.getAsync())
+        for producer in producers:
+            producer.join()
+        assert model._queue().qsize() == 0
+
+    def test_conflate(self):
+        model, other = MyModel(), MyModel()
+        model.boundQueue(maxsize=3, policy="conflate")
+
+        first, second = Update(model=model), Update(model=other)
+        model.send(first)
+        model.send(second)
+
+        # supersedes the queued full update for the same target, before the queue is full
+        latest = Update(model=model)
+        model.send(latest)
+        assert model.getNowait() is second
+        assert model.getNowait() is latest
+        assert model._queue().empty()
+        assert model._queue().drops == 1
+
+    async def test_join(self):
+        queue = UpdateQueue(maxsize=2, policy="conflate", key=lambda item: item % 2)
+
+        for i in range(5):
+            queue.put_nowait(i)
+        assert queue.stats()["drops"] == 3
+
+        # superseded items don't count as unfinished
+        while not queue.empty():
+            queue.get_nowait()
+            queue.task_done()
+        await asyncio.wait_for(queue.join(), 1)
+
+    def test_collapse(self):
+        model, other = MyModel(), MyModel()
+        first, patch, second, latest = Update(model=model), Update(model_target=model.id, patch=[]), Update(model=other), Update(model=model)
+        for update in (first, patch, second, latest):
+            model.send(update)
+
+        # superseded full updates are dropped along with patches to them, the rest keep their order
+        assert model._queue().collapse() == 2
+        assert [model.getNowait() for _ in range(2)] == [second, latest]
+        assert model._queue().drops == 2
+
+    def test_collapse_stale_patches(self):
+        model = Table(rows=[Row(value=1)])
+
+        def updates():
+            # a patch diffed against the first full update, which is stale without it
+            full = Update(model=Table(id=model.id, rows=[Row(value=1), Row(value=2)]))
+            stale = Update(model_target=model.id, patch=[Patch(op="remove", path=["rows", 1])])
+            after = Update(model_target=model.id, patch=[Patch(op="insert", path=["rows", 1], value=Row(value=4))])
+            return full, stale, Update(model=Table(id=model.id, rows=[Row(value=3)])), after
+
+        # patches behind the latest full update are diffed against it, and kept
+        first, stale, latest, after = updates()
+        for update in (first, stale, latest, after):
+            model.send(update)
+        assert model._queue().collapse() == 2
+        assert [model.getNowait() for _ in range(2)] == [latest, after]
+
+        # likewise as they are put, when conflating
+        model.boundQueue(maxsize=4, policy="conflate")
+        first, stale, latest, after = updates()
+        for update in (first, stale, latest, after):
+            model.send(update)
+        assert [model.getNowait() for _ in range(2)] == [latest, after]
+        assert model._queue().drops == 2
+
+    def test_collapse_patches(self):
+        model = MyModel()
+
+        def patch(op, path, value=None):
+            return Update(model_target=model.id, patch=[Patch(op=op, path=path, value=value)])
+
+        # only the last of a run of patches setting the same paths is needed
+        first, second, insert, third, fourth = (
+            patch("set", ["x"], 1),
+            patch("set", ["x"], 2),
+            patch("insert", ["y", 0]),
+            patch("set", ["x"], 3),
+            patch("set", ["x"], 4),
+        )
+        for update in (first, second, insert, third, fourth):
+            model.send(update)
+        assert model._queue().collapse() == 2
+        assert [model.getNowait() for _ in range(3)] == [second, insert, fourth]
+
+        # and no more are kept as they are put, when conflating
+        model.boundQueue(maxsize=3, policy="conflate")
+        for update in (first, second, insert, third, fourth):
+            model.send(update)
+        assert [model.getNowait() for _ in range(3)] == [second, insert, fourth]
+        assert model._queue().drops == 2
@@ -0,0 +1,156 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from transports import BaseModel, Dispatcher, JSONTransport, MemorySink, Patch, Update
+from transports.connection import Connection
+
+
+class Slow(BaseModel):
+    value: int = 0
+
+    def receive(self, update):
+        threading.Event().wait(0.05)
+        super().receive(update)
+
+
+class TestDispatcher:
+    async def test_ordered_per_key(self):
+        dispatcher = Dispatcher(max_inflight=2)
+        handled = []
+
+        async def handle(key, value, delay):
+            await asyncio.sleep(delay)
+            handled.append((key, value))
+
+        # b overtakes a's slow first update, a stays in order
+        await dispatcher.dispatch("a", handle, "a", 1, 0.02)
+        await dispatcher.dispatch("a", handle, "a", 2, 0)
+        assert dispatcher.inflight == 2
+
+        # full, waits for room
+        waiting = asyncio.ensure_future(dispatcher.dispatch("b", handle, "b", 1, 0))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        await waiting
+        await dispatcher.join()
+        assert handled == [("a", 1), ("a", 2), ("b", 1)]
+
+        await dispatcher.dispatch("a", handle, "a", 3, 0.02)
+        await dispatcher.dispatch("b", handle, "b", 2, 0)
+        await dispatcher.join()
+        assert handled[-2:] == [("b", 2), ("a", 3)]
+        assert dispatcher.inflight == 0
+
+    async def test_transport_executor(self):
+        with ThreadPoolExecutor(4) as executor:
+            transport = JSONTransport(dispatcher=Dispatcher(executor=executor))
+            transport.hosts(Slow)
+            models = [Slow() for _ in range(4)]
+            for i, model in enumerate(models):
+                await transport.host(model, str(i))
+
+            # slow handlers for different models run side by side, off the loop
+            start = asyncio.get_running_loop().time()
+            for i, model in enumerate(models):
+                for value in (1, 2):
+                    await transport.receive(str(i), Update(model=Slow(id=model.id, value=value)).json())
+            await transport.dispatcher.join()
+            assert asyncio.get_running_loop().time() - start < 0.3
+            assert [model.value for model in models] == [2, 2, 2, 2]
+
+            for i, model in enumerate(models):
+                await transport.onDisconnect(model, str(i))
+
+    async def test_rejected(self):
+        sink = MemorySink()
+        transport = JSONTransport(dispatcher=Dispatcher(), sink=sink)
+        transport.hosts(Slow)
+        model = Slow()
+        await transport.host(model, "a")
+
+        # counted and skipped, the lane carries on
+        await transport.receive("a", Update(patch=[Patch(op="set", path=["value"], value="nope")], model_target=model.id).json())
+        await transport.receive("a", Update(patch=[Patch(op="set", path=["value"], value=1)], model_target=model.id).json())
+        await transport.dispatcher.join()
+        assert model.value == 1
+        assert sink.counter("updates.rejected", error="ValidationError") == 1
+        await transport.onDisconnect(model, "a")
+
+    async def test_error(self):
+        dispatcher = Dispatcher(max_inflight=2)
+        handled = []
+
+        async def fail():
+            raise RuntimeError("bug")
+
+        async def handle(value):
+            handled.append(value)
+
+        # stops the lane, dropping what was queued behind it, and is raised once
+        await dispatcher.dispatch("a", fail)
+        await dispatcher.dispatch("a", handle, 1)
+        with pytest.raises(RuntimeError):
+            await dispatcher.join()
+        assert handled == [] and dispatcher.inflight == 0
+
+        # without holding up anything dispatched later
+        await dispatcher.dispatch("a", handle, 2)
+        await dispatcher.join()
+        assert handled == [2]
+
+        # or by the next dispatch, e.g. ending the connection reading updates
+        await dispatcher.dispatch("a", fail)
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            await dispatcher.dispatch("a", handle, 3)
+        await dispatcher.join()
+        assert handled == [2]
+
+    async def test_connection_error(self):
+        class Broken(BaseModel):
+            value: int = 0
+
+            def receive(self, update):
+                raise RuntimeError("bug")
+
+        class Feed(Connection):
+            """Connection reading updates from a queue, and sending nothing"""
+
+            def __init__(self, transport, updates):
+                self._transport = transport
+                self._client_id = "feed"
+                self._updates = updates
+
+            async def connect(self, client_id=None):
+                return self._client_id
+
+            async def disconnect(self) -> None: ...
+
+            async def receive(self):
+                return await self._updates.get()
+
+            async def send(self, update):
+                await asyncio.Event().wait()
+
+        transport = JSONTransport(dispatcher=Dispatcher())
+        transport.hosts(Broken)
+        model = Broken()
+        await transport.host(model, "feed")
+        updates = asyncio.Queue()
+        running = asyncio.ensure_future(Feed(transport, updates).run())
+
+        # ends the connection, rather than drop every update after it
+        for value in (1, 2):
+            updates.put_nowait(Update(model=Broken(id=model.id, value=value)).json())
+            await asyncio.sleep(0.01)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(running, 1)
+        await transport.onDisconnect(model, "feed")
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(1) as executor, pytest.raises(TypeError):
+            Dispatcher(executor=executor)
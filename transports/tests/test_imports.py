@@ -0,0 +1,18 @@
+import transports
+from transports.tests.benchmarks import imports
+
+
+class TestImports:
+    def test_budget(self):
+        (result,) = imports.run(scale=0.3)
+        assert result.p50 < imports.BUDGET
+
+    def test_no_frameworks(self):
+        assert imports.frameworks() == []
+        assert imports.frameworks("transports.handlers") == []
+        assert imports.frameworks("transports.handlers.aiohttp_client") == ["aiohttp"]
+
+    def test_lazy_exports(self):
+        for name in transports.__all__:
+            assert getattr(transports, name) is not None
+        assert set(transports.__all__) <= set(dir(transports))
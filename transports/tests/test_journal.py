@@ -0,0 +1,97 @@
+import asyncio
+import os
+from typing import List
+
+import pytest
+
+from transports import BaseModel, JSONTransport, Patch, Transport, Update
+from transports.journal import Journal
+
+
+class Row(BaseModel):
+    value: int = 0
+
+
+class Table(BaseModel):
+    rows: List[Row] = []
+
+
+class TestJournal:
+    def test_segments(self, tmp_path):
+        journal = Journal(str(tmp_path), segment_size=128, snapshot_every=5)
+        for seq in range(1, 21):
+            journal.append("a/b", seq, f'{{"value":{seq}}}')
+        assert len(os.listdir(tmp_path / "a%2Fb")) > 1
+        assert journal.history("a/b", 3, 5) == [b'{"value":3}', b'{"value":4}', b'{"value":5}']
+        assert journal.since("a/b", 18) == [b'{"value":19}', b'{"value":20}']
+        assert journal.since("a/b", 20) == []
+        # not from this journal
+        assert journal.since("a/b", 21) is None
+
+        # only what's needed to replay from the oldest snapshot kept
+        journal.snapshot("a/b", 10, b"{}")
+        journal.snapshot("a/b", 20, b"{}")
+        assert journal.history("a/b", 1, 10) is None
+        assert len(journal.since("a/b", 10)) == 10
+        journal.close()
+
+        # picked up again as left, torn frames and all
+        last = sorted(name for name in os.listdir(tmp_path / "a%2Fb") if name.endswith(".log"))[-1]
+        with open(tmp_path / "a%2Fb" / last, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b"!")
+        journal = Journal(str(tmp_path))
+        assert journal.models() == ["a/b"]
+        assert journal.latest("a/b") == (20, b"{}")
+        assert journal.seq("a/b") == 20
+        assert journal.history("a/b", 11, 19)[-1] == b'{"value":19}'
+        assert journal.since("a/b", 10) is None
+        journal.close()
+
+    def test_not_encoded(self, tmp_path):
+        journal = Journal(str(tmp_path))
+        with pytest.raises(TypeError):
+            Transport(journal=journal)
+        journal.close()
+
+    async def test_restore(self, tmp_path):
+        journal = Journal(str(tmp_path), snapshot_every=3)
+        transport = JSONTransport(journal=journal)
+        transport.hosts(Table)
+        table = Table(rows=[Row()])
+        await transport.host(model=table, client_id="a")
+        start = journal.seq(table.id)
+        assert journal.snapshotted(table.id)
+
+        # from the server, and from clients
+        for value in range(1, 4):
+            table.rows[0].value = value
+            table.update(table)
+            await asyncio.sleep(0.01)
+        patch = [Patch(op="insert", path=["rows", 1], value={"value": 10})]
+        await transport.receive("a", Update(model_type="Table", model_target=table.id, patch=patch).json())
+        await transport.receive(
+            "a", Update(model_type="Table", model_target=table.rows[0].id, patch=[Patch(op="set", path=["value"], value=4)]).json()
+        )
+        assert journal.seq(table.id) == start + 5
+        await transport.onDisconnect(model=table, client_id="a")
+        journal.close()
+
+        # restarted
+        journal = Journal(str(tmp_path), snapshot_every=3)
+        transport = JSONTransport(journal=journal)
+        transport.hosts(Table)
+        restored = await transport.restore(table.id)
+        assert restored.model_dump() == table.model_dump()
+        assert await transport.restore("missing") is None
+
+        # clients resume from the journal, and updates carry on in sequence
+        await transport.host(model=restored, client_id="b")
+        missed = await transport.resume("b", start + 2)
+        assert len(missed) == 3 and all(isinstance(frame, str) for frame in missed)
+        assert await transport.resume("b", start + 5) == []
+        restored.update(restored)
+        await asyncio.sleep(0.01)
+        assert journal.seq(table.id) == start + 6
+        await transport.onDisconnect(model=restored, client_id="b")
+        journal.close()
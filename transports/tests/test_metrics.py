@@ -0,0 +1,73 @@
+import asyncio
+
+from transports import BaseModel, JSONTransport, MemorySink
+from transports.metrics import STAGES
+
+
+class MyModel(BaseModel):
+    x: int = 0
+
+
+class TestMetrics:
+    async def test_lifecycle(self, recording_server):
+        sink, remote_sink = MemorySink(), MemorySink()
+        transport = JSONTransport(sink=sink)
+        transport.hosts(MyModel)
+        model = MyModel()
+        server = recording_server(transport=transport, model=model, shared=False)
+        await server.onOpen()
+
+        remote = JSONTransport(sink=remote_sink)
+        remote.hosts(MyModel)
+        await remote.onInitial(server.frames[0])
+
+        copy = transport.models["client"]
+        copy.x = 1
+        copy.update(copy.copy(clone=True))
+
+        task = asyncio.ensure_future(server.sender())
+        while len(server.frames) < 2:
+            await asyncio.sleep(0)
+        task.cancel()
+
+        await remote.receive(client_id="", update=server.frames[1])
+
+        # sending side
+        assert sink.counter("messages.out", client="client") == 1
+        assert sink.counter("bytes.out", client="client") == len(server.frames[1].encode())
+        assert sink.gauges[("queue.depth", (("client", "client"),))] == 0
+        assert sink.percentile("encode.seconds", 0.5, model="MyModel") is not None
+        (sent,) = sink.spans.values()
+        assert list(sent) == ["produce", "queue", "serialize", "send"]
+
+        # receiving side, joined up by update id
+        (update_id,) = sink.spans
+        received = remote_sink.spans[update_id]
+        assert list(received) == ["produce", "receive", "apply"]
+        stages = {**sent, **received}
+        assert [stages[stage] for stage in STAGES] == sorted(stages[stage] for stage in STAGES)
+        assert remote_sink.percentile("decode.seconds", 0.5, model="MyModel") is not None
+        assert remote_sink.percentile("latency.seconds", 0.99, model="MyModel") >= 0
+
+        await server.onClose()
+
+    async def test_no_sink(self, recording_server):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        server = recording_server(transport=transport, model=model, shared=False)
+        await server.onOpen()
+
+        copy = transport.models["client"]
+        copy.update(copy.copy(clone=True))
+        await transport.send(client_id="client")
+
+        # nothing is tracked without a sink
+        assert transport._unsent == {}
+        await server.onClose()
+
+    def test_span_eviction(self):
+        sink = MemorySink(max_spans=2)
+        for update_id in "abc":
+            sink.span(update_id, "queue", 0.0)
+        assert list(sink.spans) == ["b", "c"]
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from orjson import loads
+
+from transports import BaseModel, JSONTransport, MemorySink, Update
+from transports.chunks import encode_chunked
+
+
+class Row(BaseModel):
+    value: int = 0
+
+
+class Table(BaseModel):
+    name: str = "table"
+    rows: List[Row] = []
+    tags: List[str] = []
+
+
+class TestChunks:
+    def test_same_as_binary(self):
+        table = Table(rows=[Row(value=i) for i in range(25)], tags=["a", "b"])
+        update = Update(model=table)
+        assert loads(encode_chunked(update, chunk_size=10)) == loads(update.binary())
+
+    def test_small(self):
+        update = Update(model=Table(rows=[Row()]))
+        assert encode_chunked(update) == update.binary()
+
+
+class TestOffload:
+    async def test_large_models_offloaded(self):
+        sink = MemorySink()
+        transport = JSONTransport(sink=sink, offload=ThreadPoolExecutor(1), offload_threshold=512)
+        transport.hosts(Table)
+
+        small, large = Table(id="small"), Table(id="large", rows=[Row(value=i) for i in range(2000)])
+        for model in (small, large):
+            await transport.host(model=model, client_id=model.id)
+
+            # not seen before, so encoded inline
+            update = Update(model=model)
+            assert loads(await transport.encodeAsync(update)) == loads(update.json())
+        assert sink.counter("encode.offloaded", model="Table") == 0
+
+        # learned sizes, only the large one goes off the loop
+        await transport.encodeAsync(Update(model=small))
+        await transport.encodeAsync(Update(model=large))
+        assert sink.counter("encode.offloaded", model="Table") == 1
+        assert sink.counter("encode.offloaded.bytes", model="Table") == transport._sizes["large"]
+        assert not transport._encoding
+
+        # patches are never offloaded
+        await transport.encodeAsync(Update(model_type="Table", model_target="large", patch=[]))
+        assert sink.counter("encode.offloaded", model="Table") == 1
+
+        # and sizes are forgotten once no longer hosted
+        for model in (small, large):
+            await transport.onDisconnect(model, model.id)
+        assert transport._sizes == {}
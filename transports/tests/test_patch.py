@@ -0,0 +1,98 @@
+from typing import Dict, List, Optional
+
+from transports import BaseModel, JSONTransport, Update
+from transports.patch import apply, diff
+
+
+class Row(BaseModel):
+    value: int = 0
+
+
+class Table(BaseModel):
+    rows: List[Row] = []
+    tags: Dict[str, str] = {}
+    title: Optional[str] = None
+
+
+class TestPatch:
+    def test_diff_scalar(self):
+        table = Table(title="a")
+        previous = table.copy(clone=True, deep=True)
+        table.title = "b"
+
+        patch = diff(previous, table)
+        assert len(patch) == 1
+        assert patch[0].op == "set"
+        assert patch[0].path == ["title"]
+        assert patch[0].value == "b"
+
+    def test_diff_unchanged(self):
+        table = Table(rows=[Row(), Row()])
+        assert diff(table.copy(clone=True, deep=True), table) == []
+        assert diff(table.dict(), table) == []
+
+    def test_diff_list_middle(self):
+        rows = [Row(value=i) for i in range(100)]
+        table = Table(rows=rows)
+        previous = table.copy(clone=True, deep=True)
+
+        # single insert and single removal in the middle stay single ops
+        table.rows.insert(50, Row(value=-1))
+        assert [p.op for p in diff(previous, table)] == ["insert"]
+        previous = table.copy(clone=True, deep=True)
+        del table.rows[10]
+        assert [p.op for p in diff(previous, table)] == ["remove"]
+
+    def test_diff_nested(self):
+        table = Table(rows=[Row(), Row()], tags={"a": "1", "b": "2"})
+        previous = table.dict()
+        table.rows[1].value = 5
+        table.tags["c"] = "3"
+        del table.tags["a"]
+
+        patch = diff(previous, table)
+        assert {(p.op, tuple(p.path)) for p in patch} == {("set", ("rows", 1, "value")), ("set", ("tags", "c")), ("remove", ("tags", "a"))}
+
+    def test_apply_roundtrip(self):
+        table = Table(rows=[Row(value=i) for i in range(10)], tags={"a": "1"})
+        remote = table.copy(clone=True, deep=True)
+        previous = table.copy(clone=True, deep=True)
+
+        table.rows[3].value = 33
+        table.rows.insert(5, Row(value=55))
+        table.rows.pop(0)
+        table.tags = {"b": "2"}
+        table.title = "t"
+
+        patch = diff(previous, table)
+        apply(remote, patch)
+        assert remote.dict() == table.dict()
+
+    def test_patch_over_json(self, current_loop):
+        transport = JSONTransport(current_loop)
+        transport.hosts(Table)
+
+        table = Table(rows=[Row(value=1)])
+        remote = table.copy(clone=True, deep=True)
+        previous = table.copy(clone=True, deep=True)
+        table.rows.append(Row(value=2))
+        table.patch(previous)
+
+        update: Update = table._queue().get_nowait()
+        assert update.model is None
+        assert update.model_target == table.id
+
+        received = transport.loop.run_until_complete(transport._update_to_model(update.json()))
+        remote.receive(received)
+        assert isinstance(remote.rows[1], Row)
+        assert remote.dict() == table.dict()
+
+    def test_full_update_applied_in_place(self):
+        table = Table(rows=[Row(value=1)])
+        remote = table.copy(clone=True, deep=True)
+        rows = remote.rows
+
+        table.rows[0].value = 2
+        remote.receive(Update(model=table.copy(clone=True, deep=True)))
+        assert remote.rows is rows
+        assert remote.rows[0].value == 2
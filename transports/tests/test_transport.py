@@ -1,9 +1,16 @@
+import asyncio
 import time
 from typing import Dict, List
+from unittest import mock
 
 import pytest
+from orjson import loads
+from pydantic import PrivateAttr
 
-from transports import BaseModel, Transport
+from transports import BaseModel, BinaryTransport, JSONTransport, MemorySink, Patch, Transport, Update
+from transports.cache import SnapshotCache
+from transports.exceptions import UpdateMalformed
+from transports.patch import index, locate
 
 
 class MyModel(BaseModel): ...
@@ -17,6 +24,14 @@ class MyParentModel(BaseModel):
     y: Dict[str, MyOtherModel]
 
 
+class MyInitModel(BaseModel):
+    _initialized: bool = PrivateAttr(False)
+
+    def model_post_init(self, context):
+        super().model_post_init(context)
+        self._initialized = True
+
+
 class TestTransport:
     def test_instantiation(self):
         x = MyModel()
@@ -82,3 +97,569 @@ class TestTransport:
         assert ts.model_map["MyModel"] == MyModel
         assert "MyOtherModel" in ts.model_map
         assert ts.model_map["MyOtherModel"] == MyOtherModel
+
+    async def test_broadcast_shared(self):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        await transport.host(model=model, client_id="a")
+        await transport.host(model=model, client_id="b", echo=False)
+        assert list(transport.broadcasts[model.id].channels) == ["a", "b"]
+
+        # each update is encoded once and fanned out to every client
+        model.update(model)
+        a, b = await transport.send("a"), await transport.send("b")
+        assert isinstance(a, str)
+        assert a is b
+
+        # client changes are forwarded to the others, and not echoed back if disabled
+        await transport.receive("b", Update(model=model).json())
+        assert transport.broadcasts[model.id].channels["a"].qsize() == 1
+        assert transport.broadcasts[model.id].channels["b"].qsize() == 0
+
+        await transport.onDisconnect(model=model, client_id="a")
+        await transport.onDisconnect(model=model, client_id="b")
+        assert model.id not in transport.broadcasts
+
+    async def test_paced(self):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        await transport.host(model=model, client_id="fast")
+        await transport.host(model=model, client_id="slow", min_interval=0.05)
+
+        async def publish(label):
+            model.label = label
+            model.update(model)
+            await asyncio.sleep(0.001)
+
+        for label in "abc":
+            await publish(label)
+        fast = [loads(transport.sendNowait("fast"))["model"]["label"] for _ in range(3)]
+        assert fast == ["a", "b", "c"]
+
+        # only the latest of the updates queued up is sent
+        assert loads(await transport.send("slow"))["model"]["label"] == "c"
+        assert transport.sendNowait("slow") is None
+        assert transport.queueStats("slow")["drops"] == 2
+
+        # and nothing more until the interval is up
+        await publish("d")
+        await publish("e")
+        assert transport.sendNowait("slow") is None
+        start = time.perf_counter()
+        assert loads(await transport.send("slow"))["model"]["label"] == "e"
+        assert time.perf_counter() - start > 0.03
+
+        # patches setting the same paths back to back are merged into the last one
+        await asyncio.sleep(0.05)
+        for label in "fgh":
+            model.send(Update(model_type="MyModel", model_target=model.id, patch=[Patch(op="set", path=["label"], value=label)]))
+        model.send(Update(model_type="MyModel", model_target=model.id, patch=[Patch(op="set", path=["name"], value="i")]))
+        model.send(Update(model_type="MyModel", model_target=model.id, patch=[Patch(op="set", path=["label"], value="j")]))
+        await asyncio.sleep(0.01)
+        patches = [loads(transport.sendNowait("slow"))["patch"][0]["value"] for _ in range(3)]
+        assert patches == ["h", "i", "j"]
+        assert transport.sendNowait("slow") is None
+
+    def test_view(self):
+        model = MyParentModel(x=[MyModel(), MyModel()], y={"a": MyOtherModel()})
+        view = model.view()
+        assert view.id != model.id
+        assert view.x is model.x and view.y is model.y
+
+        # only the path down to the change is copied
+        view.onUpdate(patch=[Patch(op="set", path=["x", 1, "label"], value="changed")])
+        assert (model.x[1].label, view.x[1].label) == ("", "changed")
+        assert view.x is not model.x and view.x[1] is not model.x[1]
+        assert view.x[0] is model.x[0] and view.y is model.y
+
+        # and only once
+        x = view.x
+        view.onUpdate(patch=[Patch(op="insert", path=["x", 0], value=MyModel()), Patch(op="remove", path=["y", "a"])])
+        assert view.x is x and len(view.x) == 3 and len(model.x) == 2
+        assert view.y == {} and list(model.y) == ["a"]
+
+    def test_view_index(self):
+        model = MyParentModel(x=[MyModel(), MyModel()], y={"a": MyOtherModel()})
+        view = model.view()
+        paths = index(view)
+        assert paths[model.x[1].id] == ["x", 1] and paths[model.y["a"].id] == ["y", "a"]
+
+        # looked up, not searched
+        with mock.patch("transports.patch._index") as rebuilt:
+            assert locate(view, model.x[1].id, paths) == (["x", 1], model.x[1])
+            rebuilt.assert_not_called()
+
+        # and built again once out of date
+        moved = view.x[1]
+        view.onUpdate(patch=[Patch(op="insert", path=["x", 0], value=MyModel())])
+        assert locate(view, moved.id, paths) == (["x", 2], moved)
+        assert paths[view.x[0].id] == ["x", 0]
+        assert locate(view, "missing", paths) is None
+
+    async def test_readonly(self):
+        transport = JSONTransport()
+        transport.hosts(MyModel)
+        model = MyModel()
+        await transport.host(model=model, client_id="a", readonly=True)
+        await transport.host(model=model, client_id="b", readonly=True)
+
+        # readonly clients share the model and its broadcast
+        assert transport.models["a"] is model and transport.models["b"] is model
+        assert set(transport.broadcasts[model.id].channels) == {"a", "b"}
+
+        # and are sent its updates, but can't change it
+        model.label = "changed"
+        model.update(model.copy(clone=True))
+        assert loads(await transport.send("a"))["model"]["label"] == "changed"
+        await transport.receive("b", Update(model=MyModel(id=model.id, label="refused")).json())
+        assert model.label == "changed"
+
+        # writable copies are views
+        await transport.host(model=model, client_id="c", shared=False)
+        assert transport.models["c"]._owned is not None
+
+        for client_id in "abc":
+            await transport.onDisconnect(model, client_id)
+
+    async def test_snapshot_cache(self):
+        sink = MemorySink()
+        transport = JSONTransport(sink=sink, snapshot_cache=1 << 20)
+        transport.hosts(MyModel)
+        model = MyModel()
+        model.track()
+        for client_id in ("a", "b"):
+            await transport.host(model=model, client_id=client_id)
+
+        # encoded once while unchanged
+        first = await transport.initialAsync("a")
+        assert await transport.initialAsync("b") is first
+        assert sink.counter("snapshot.cache.hits", model="MyModel") == 1
+
+        # changed in place, or by a published update
+        model.label = "changed"
+        assert loads(await transport.initialAsync("a"))["model"]["label"] == "changed"
+        await transport.broadcasts[model.id].publish(Update(model=model))
+        second = await transport.initialAsync("a")
+        assert second is not first and await transport.initialAsync("b") is second
+        assert transport.snapshots.stats() == {"entries": 1, "bytes": len(second), "hits": 2, "misses": 3, "evictions": 0}
+
+        for client_id in ("a", "b"):
+            await transport.onDisconnect(model, client_id)
+
+    async def test_snapshot_cache_nested(self):
+        transport = JSONTransport(snapshot_cache=1 << 20)
+        transport.hosts(MyParentModel)
+        tracked, untracked = MyParentModel(x=[MyModel()], y={}), MyParentModel(x=[MyModel()], y={})
+        tracked.track()
+        for model in (tracked, untracked):
+            await transport.host(model=model, client_id=model.id)
+            await transport.initialAsync(model.id)
+
+            # changed in place well below the root
+            model.x[0].label = "changed"
+            assert loads(await transport.initialAsync(model.id))["model"]["x"][0]["label"] == "changed"
+            await transport.onDisconnect(model, model.id)
+
+        # only tracked models are cached, the version of others doesn't move on with nested changes
+        assert transport.snapshots.stats()["entries"] == 1
+
+    async def test_initial_overloaded(self):
+        class Labelled(JSONTransport):
+            def initial(self, client_id, model_id=""):
+                model = self.models[client_id].copy(clone=True)
+                model.label = "labelled"
+                return Update(model=model)
+
+        class Wrapped(JSONTransport):
+            def initial(self, client_id, model_id=""):
+                return "[" + super().initial(client_id, model_id) + "]"
+
+        model = MyModel()
+        labelled, wrapped = Labelled(snapshot_cache=1 << 20), Wrapped(snapshot_cache=1 << 20)
+        for transport in (labelled, wrapped):
+            await transport.host(model=model, client_id="a")
+
+        # updates are encoded, frames sent as they are
+        assert loads(await labelled.initialAsync("a"))["model"]["label"] == "labelled"
+        assert loads(await wrapped.initialAsync("a"))[0]["model"]["id"] == model.id
+
+        for transport in (labelled, wrapped):
+            await transport.onDisconnect(model, "a")
+
+    def test_snapshot_cache_budget(self):
+        cache = SnapshotCache(max_bytes=10, max_entries=2)
+        cache.put(("a", "a"), 0, "aaaa")
+        cache.put(("b", "b"), 0, "bbbb")
+        assert cache.get(("a", "a"), 0) == "aaaa"
+
+        # least recently used first, by size and by count
+        cache.put(("c", "c"), 0, "cccc")
+        assert cache.get(("b", "b"), 0) is None
+        cache.put(("d", "d"), 0, "d")
+        assert cache.get(("a", "a"), 0) is None
+        assert cache.get(("c", "c"), 1) is None
+        cache.put(("e", "e"), 0, "e" * 11)
+        assert cache.stats() == {"entries": 2, "bytes": 5, "hits": 1, "misses": 3, "evictions": 2}
+
+    async def test_binary_transport(self):
+        transport = BinaryTransport()
+        transport.hosts(MyParentModel)
+        model = MyParentModel(x=[MyModel()], y={"a": MyOtherModel()})
+
+        frame = transport.encode(Update(model=model))
+        assert isinstance(frame, bytes)
+
+        received = await transport._update_to_model(frame)
+        assert isinstance(received.model, MyParentModel)
+        assert received.model.x[0].id == model.x[0].id
+        assert received.model.y["a"].id == model.y["a"].id
+
+    async def test_decoders(self):
+        model = MyParentModel(x=[MyModel()], y={"a": MyOtherModel()})
+        frame = Update(model=model).json()
+
+        for trusted in (False, True):
+            transport = JSONTransport(trusted=trusted)
+            transport.hosts(MyParentModel)
+            assert set(transport.decoders) == {"MyParentModel", "MyModel", "MyOtherModel"}
+
+            received = await transport._update_to_model(frame)
+            assert isinstance(received.model, MyParentModel)
+            assert isinstance(received.model.x[0], MyModel)
+            assert isinstance(received.model.y["a"], MyOtherModel)
+            assert received.model.created == model.created
+            assert received.model.dict() == model.dict()
+
+        with pytest.raises(UpdateMalformed):
+            await JSONTransport().onInitial(frame)
+
+        # models with a `model_post_init` of their own are built by pydantic, which runs it
+        transport = JSONTransport(trusted=True)
+        transport.hosts(MyInitModel)
+        received = await transport._update_to_model(Update(model=MyInitModel()).json())
+        assert received.model._initialized
+
+    async def test_decoders_batched(self):
+        model = MyParentModel(x=[], y={})
+        for trusted in (False, True):
+            transport = JSONTransport(trusted=trusted)
+            transport.hosts(MyParentModel)
+            await transport.host(model, "a")
+
+            # each update in a batch goes through the compiled decoder, as whole frames do
+            decoder = transport.decoders["MyParentModel"]
+            method = "decodeDataTrusted" if trusted else "decodeData"
+            frames = [Update(model=MyParentModel(id=model.id, x=[MyModel()] * i, y={})).json() for i in (1, 2)]
+            with (
+                mock.patch.object(decoder, method, wraps=getattr(decoder, method)) as decode,
+                mock.patch.object(MyParentModel, "parse_obj") as parse,
+            ):
+                await transport.receive("a", transport.encodeBatch(frames))
+            assert (decode.call_count, parse.call_count) == (2, 0)
+            assert len(model.x) == 2 and isinstance(model.x[0], MyModel)
+
+            await transport.onDisconnect(model, "a")
+            model.x = []
+
+    def test_attach_transport_incremental(self):
+        transport = Transport(None)
+        pm = MyParentModel(x=[], y={})
+        pm.onTransport(transport)
+
+        # assigning a field attaches the new subtree
+        mm = MyModel()
+        pm.x = [mm]
+        assert mm._transport == transport
+
+        # as do patches which add models
+        mom = MyOtherModel()
+        pm.receive(Update(patch=[Patch(op="set", path=["y", "a"], value=mom)], model_target=pm.id))
+        assert pm.y["a"] is mom
+        assert mom._transport == transport
+
+    def test_attach_transport_deep(self):
+        class Node(BaseModel):
+            children: List["Node"] = []
+            value: int = 0
+
+        # wide and deep, with a shared node visited once
+        shared = Node()
+        root = Node(children=[Node(children=[Node(children=[shared]) for _ in range(100)]) for _ in range(100)])
+        root.children[0].children.append(root)
+
+        transport = Transport(None)
+        root.onTransport(transport)
+        assert Node._traversal() == ("children",)
+        assert shared._transport == transport
+        assert all(grandchild._transport == transport for child in root.children for grandchild in child.children)
+
+    def test_registry(self):
+        transport = Transport(None)
+        mm, mom = MyModel(), MyOtherModel()
+        pm = MyParentModel(x=[mm], y={"a": mom})
+        pm.onTransport(transport)
+        assert transport.registry == {pm.id: pm, mm.id: mm, mom.id: mom}
+        assert transport.roots == {pm.id: pm.id, mm.id: pm.id, mom.id: pm.id}
+
+        # replaced subtrees leave the registry
+        replacement = MyModel()
+        pm.x = [replacement]
+        assert mm.id not in transport.registry
+        assert transport.roots[replacement.id] == pm.id
+
+        # as do models removed by patches
+        pm.receive(Update(patch=[Patch(op="remove", path=["y", "a"])], model_target=pm.id))
+        assert mom.id not in transport.registry
+
+    async def test_route_nested(self):
+        class Leaf(BaseModel):
+            value: int = 0
+
+        class Tree(BaseModel):
+            leaves: List[Leaf] = []
+
+        transport = JSONTransport()
+        transport.hosts(Tree)
+        leaf = Leaf()
+        tree = Tree(leaves=[leaf])
+        await transport.host(tree, "a")
+        await transport.host(tree, "b", echo=False)
+
+        # delivered straight to the leaf, and on to the other clients of the tree
+        await transport.receive("b", Update(model=Leaf(id=leaf.id, value=1)).json())
+        assert leaf.value == 1
+        assert loads(await transport.send("a"))["model_target"] == leaf.id
+        assert transport.broadcasts[tree.id].channels["b"].qsize() == 0
+
+        # but not to models the client isn't subscribed to
+        other = Leaf()
+        Tree(leaves=[other]).onTransport(transport)
+        await transport.receive("b", Update(model=Leaf(id=other.id, value=1)).json())
+        assert other.value == 0
+
+        # below a client's own copy, which copies the path down to the leaf
+        await transport.host(tree, "c", shared=False)
+        view = transport.models["c"]
+        await transport.receive("c", Update(model=Leaf(id=leaf.id, value=2)).json())
+        await transport.receive("c", Update(patch=[Patch(op="set", path=["value"], value=3)], model_target=leaf.id).json())
+        assert view.leaves[0].value == 3 and view.leaves[0] is not leaf
+        assert leaf.value == 1
+
+        # nothing from readonly clients, nested or not
+        await transport.host(tree, "d", readonly=True)
+        await transport.receive("d", Update(model=Leaf(id=leaf.id, value=4)).json())
+        await transport.receive("d", Update(model=Tree(id=tree.id), model_target="").json())
+        assert leaf.value == 1 and tree.leaves == [leaf]
+
+        for client_id in "abcd":
+            await transport.onDisconnect(tree, client_id)
+
+    async def test_release(self):
+        class Leaf(BaseModel):
+            value: int = 0
+
+        class Tree(BaseModel):
+            leaves: List[Leaf] = []
+
+        transport = JSONTransport()
+        transport.hosts(Tree)
+        trees = [Tree(leaves=[Leaf() for _ in range(10)]) for _ in range(100)]
+        for i, tree in enumerate(trees):
+            await transport.host(tree, f"shared-{i}")
+            await transport.host(tree, f"copy-{i}", shared=False)
+        assert len(transport.registry) == len(transport.roots) == 1100
+
+        # kept while anyone still hosts them
+        for i, tree in enumerate(trees):
+            await transport.onDisconnect(tree, f"shared-{i}")
+        assert len(transport.registry) == len(transport.roots) == 1100
+
+        # and not a moment longer
+        for i, tree in enumerate(trees):
+            await transport.onDisconnect(tree, f"copy-{i}")
+        assert transport.registry == {} and transport.roots == {}
+
+        # attached again if hosted again
+        await transport.host(trees[0], "again")
+        assert transport.roots[trees[0].leaves[0].id] == trees[0].id
+        await transport.onDisconnect(trees[0], "again")
+
+    async def test_registry_in_place(self):
+        class Leaf(BaseModel):
+            value: int = 0
+
+        class Tree(BaseModel):
+            leaves: List[Leaf] = []
+            named: Dict[str, Leaf] = {}
+
+        transport = JSONTransport()
+        transport.hosts(Tree)
+        tree = Tree(leaves=[Leaf()])
+        await transport.host(tree, "a")
+
+        # appended to a plain list, found and registered when first routed to
+        leaf = Leaf()
+        tree.leaves.append(leaf)
+        assert leaf.id not in transport.registry
+        await transport.receive("a", Update(patch=[Patch(op="set", path=["value"], value=1)], model_target=leaf.id).json())
+        assert leaf.value == 1
+        assert transport.roots[leaf.id] == tree.id
+
+        # tracked lists and dicts register and unregister models as they are changed
+        tree.track()
+        appended, named = Leaf(), Leaf()
+        tree.leaves.append(appended)
+        tree.named["a"] = named
+        assert transport.registry[appended.id] is appended and transport.roots[named.id] == tree.id
+        await transport.receive("a", Update(patch=[Patch(op="set", path=["value"], value=2)], model_target=appended.id).json())
+        assert appended.value == 2
+
+        popped = tree.leaves.pop(0)
+        del tree.named["a"]
+        for removed in (popped, named):
+            assert removed.id not in transport.registry and removed.id not in transport.roots
+        await transport.receive("a", Update(patch=[Patch(op="set", path=["value"], value=3)], model_target=popped.id).json())
+        assert popped.value == 0
+
+        tree.untrack()
+        await transport.onDisconnect(tree, "a")
+        assert transport.registry == {}
+
+
+class Tracked(BaseModel):
+    value: int = 0
+    children: List[MyModel] = []
+    tags: Dict[str, str] = {}
+
+
+class TestTracking:
+    async def test_coalesced(self):
+        model = Tracked(children=[MyModel()])
+        model.track()
+
+        # one update for a whole tick's worth of changes
+        for i in range(100):
+            model.value = i
+        model.children[0].label = "changed"
+        model.tags["a"] = "b"
+        await asyncio.sleep(0)
+        update = model.getNowait()
+        assert model._queue().qsize() == 0
+        assert [(patch.path, patch.value) for patch in update.patch] == [
+            (["value"], 99),
+            (["children", 0, "label"], "changed"),
+            (["tags", "a"], "b"),
+        ]
+
+        # which can be applied elsewhere
+        transport = JSONTransport()
+        transport.hosts(Tracked)
+        received = await transport._update_to_model(transport.encode(update))
+        remote = Tracked(id=model.id, children=[MyModel()])
+        remote.onUpdate(patch=received.patch)
+        assert (remote.value, remote.children[0].label, remote.tags) == (99, "changed", {"a": "b"})
+
+        # incoming changes aren't sent back out
+        model.onUpdate(patch=[Patch(op="set", path=["value"], value=1)])
+        model.children.append(MyModel())
+        await asyncio.sleep(0)
+        assert [(patch.op, patch.path) for patch in model.getNowait().patch] == [("insert", ["children", 1])]
+
+        # nothing sent once untracked
+        model.untrack()
+        model.value = 2
+        await asyncio.sleep(0)
+        assert model._queue().qsize() == 0
+
+    async def test_rows(self):
+        model = Tracked(children=[MyModel(label=str(i)) for i in range(10000)], tags={str(i): "" for i in range(10000)})
+        model.track()
+        transport = JSONTransport()
+
+        # one row of a large list, or one key of a large dict, sends just that
+        model.children[5000].label = "changed"
+        model.tags["5000"] = "changed"
+        await asyncio.sleep(0)
+        update = model.getNowait()
+        assert [(patch.path, patch.value) for patch in update.patch] == [
+            (["children", 5000, "label"], "changed"),
+            (["tags", "5000"], "changed"),
+        ]
+        assert len(transport.encode(update)) < 1000
+
+        # as does replacing a row, wherever it is counted from
+        model.children[-1] = MyModel(label="replaced")
+        await asyncio.sleep(0)
+        assert [patch.path for patch in model.getNowait().patch] == [["children", 9999]]
+
+        # rows moved along are found again
+        row = model.children[1]
+        model.children.pop(0)
+        await asyncio.sleep(0)
+        model.getNowait()
+        row.label = "moved"
+        await asyncio.sleep(0)
+        assert [(patch.path, patch.value) for patch in model.getNowait().patch] == [(["children", 0, "label"], "moved")]
+
+        # while changes below a whole field are sent along with it, and removed rows aren't sent
+        model.children[0].label = "gone"
+        model.children.clear()
+        row.label = "removed"
+        await asyncio.sleep(0)
+        assert [(patch.path, patch.value) for patch in model.getNowait().patch] == [(["children"], [])]
+
+    async def test_structure(self):
+        model = Tracked(children=[MyModel(label=str(i)) for i in range(1000)], tags={"a": "a"})
+        remote = model.copy(clone=True, deep=True)
+        model.track()
+        transport = JSONTransport()
+
+        # appending to a large list sends just the row appended
+        model.children.append(MyModel(label="appended"))
+        await asyncio.sleep(0)
+        update = model.getNowait()
+        assert [(patch.op, patch.path) for patch in update.patch] == [("insert", ["children", 1000])]
+        assert len(transport.encode(update)) < 1000
+        remote.onUpdate(patch=update.patch)
+
+        # inserts and removals are sent in order, with values set around them at their paths by the end
+        moved = model.children[10]
+        moved.label = "before"
+        model.children.insert(0, MyModel(label="inserted"))
+        model.children.pop(5)
+        del model.children[-1]
+        model.children.extend([MyModel(label="extended")])
+        model.children[-1].label = "changed after"
+        model.tags.pop("a")
+        model.tags["b"] = "b"
+        model.value = 1
+        await asyncio.sleep(0)
+        update = model.getNowait()
+        assert [(patch.op, patch.path) for patch in update.patch] == [
+            ("insert", ["children", 0]),
+            ("remove", ["children", 5]),
+            ("remove", ["children", 1000]),
+            ("insert", ["children", 1000]),
+            ("remove", ["tags", "a"]),
+            ("set", ["value"]),
+            ("set", ["children", 10, "label"]),
+            ("set", ["tags", "b"]),
+        ]
+        remote.onUpdate(patch=update.patch)
+        assert remote.model_dump() == model.model_dump()
+
+    async def test_interval(self):
+        model = Tracked()
+        model.track(interval=0.01)
+        model.value = 1
+        await asyncio.sleep(0)
+        assert model._queue().qsize() == 0
+        await asyncio.sleep(0.02)
+        assert model.getNowait().patch[0].value == 1
+
+        # or straight away
+        model.value = 2
+        model.flush()
+        assert model.getNowait().patch[0].value == 2
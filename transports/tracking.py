@@ -0,0 +1,419 @@
+import operator
+from asyncio import AbstractEventLoop, Handle, TimerHandle
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from .model import BaseModel
+
+
+class Tracker:
+    """Collects the changes made in place to a model, and sends them as a single patch
+    once per event loop tick, or per `interval`, see `BaseModel.track`.
+
+    Changes are tracked by path. Values set anywhere below the model are sent on their own, the latest
+    value per path, and items inserted into or removed from lists and dicts as `insert` and `remove` patches,
+    in the order they were made. Only sorting, reversing, clearing or slicing a list, or clearing a dict, sends all of it.
+    """
+
+    model: "BaseModel"
+    interval: float  # seconds to collect changes for, 0 for the rest of the tick
+    loop: AbstractEventLoop
+    dirty: Dict[Tuple[int, Any], Tuple[Any, Any]]  # (id of model or dict, key) -> model or dict and key of a plain value set in it, in order
+    changes: List[Tuple[str, Tuple[Any, ...], Any]]  # op, path and value of every other change, in order, with paths as they were made
+    paused: int  # changes aren't tracked while positive, e.g. while applying incoming updates
+
+    _inserted: Dict[int, Any]  # id -> models, lists and dicts put in place by `changes`, which are sent along with everything below them
+    _handle: Optional[Union[Handle, TimerHandle]]
+    _lock: Lock
+
+    def __init__(self, model: "BaseModel", loop: AbstractEventLoop, interval: float = 0.0):
+        self.model = model
+        self.interval = interval
+        self.loop = loop
+        self.dirty = {}
+        self.changes = []
+        self.paused = 0
+        self._inserted = {}
+        self._handle = None
+        self._lock = Lock()
+
+    def mark(self, node: Any, key: Any = None) -> None:
+        """Mark `key` of a tracked model, list or dict as set, or all of it if None, safe to call from any thread"""
+        self.model.__pydantic_private__["_version"] += 1
+        if self.paused:
+            return
+        from .model import BaseModel
+
+        if key is not None and not isinstance(node, list):
+            value = node.__dict__[key] if isinstance(node, BaseModel) else node[key]
+            if not isinstance(value, (BaseModel, list, dict)):
+                # plain values are sent as they are at the flush, wherever their model or dict has moved to by then
+                with self._lock:
+                    scheduled = bool(self.dirty or self.changes)
+                    self.dirty[(id(node), key)] = (node, key)
+                if not scheduled:
+                    self.loop.call_soon_threadsafe(self._schedule)
+                return
+        self._change("set", node, key)
+
+    def insert(self, node: Any, index: int, value: Any) -> None:
+        """Record `value` inserted into a tracked list before `index`, safe to call from any thread"""
+        self.model.__pydantic_private__["_version"] += 1
+        if not self.paused:
+            self._change("insert", node, index, value)
+
+    def remove(self, node: Any, key: Any) -> None:
+        """Record `key` removed from a tracked list or dict, safe to call from any thread"""
+        self.model.__pydantic_private__["_version"] += 1
+        if not self.paused:
+            self._change("remove", node, key)
+
+    def _change(self, op: str, node: Any, key: Any, value: Any = None) -> None:
+        from .model import BaseModel
+
+        with self._lock:
+            found = self._path(node, [] if key is None else [key], self._inserted)
+            if found is None:
+                # no longer below the model, or below something already being sent whole
+                return
+            path, exact = found
+            if not exact or op == "set":
+                # NOTE: sent as it is at the flush, along with anything changed below it until then
+                op, value = "set", self._resolve(path)
+            if isinstance(value, (BaseModel, list, dict)):
+                self._inserted[id(value)] = value
+            scheduled = bool(self.dirty or self.changes)
+            self.changes.append((op, path, value))
+        if not scheduled:
+            self.loop.call_soon_threadsafe(self._schedule)
+
+    def _path(self, node: Any, path: List[Any], inserted: Dict[int, Any]) -> Optional[Tuple[Tuple[Any, ...], bool]]:
+        """path of `node` from the model, followed by the reversed keys in `path`, and whether it is exact or stops at a
+        dict whose keys a patch can't address. None if it is no longer below the model, or below a value in `inserted`"""
+        exact = True
+        while node is not self.model:
+            if id(node) in inserted:
+                return None
+            parent, key = _link(node)
+            if isinstance(parent, list):
+                if not (isinstance(key, int) and key < len(parent) and parent[key] is node):
+                    # moved since it was linked, the index is only a hint
+                    key = next((index for index, item in enumerate(parent) if item is node), None)
+                    if key is None:
+                        return None
+                    _relink(node, parent, key)
+            elif isinstance(parent, dict):
+                if parent.get(key) is not node:
+                    return None
+                if not isinstance(key, (str, int)):
+                    # not addressable by a patch, so the dict is sent whole
+                    path.clear()
+                    exact = False
+                    node = parent
+                    continue
+            elif parent is None or parent.__dict__.get(key) is not node:
+                return None
+            path.append(key)
+            node = parent
+        path.reverse()
+        return tuple(path), exact
+
+    def _resolve(self, path: Tuple[Any, ...]) -> Any:
+        from .model import BaseModel
+
+        value: Any = self.model
+        for key in path:
+            value = value.__dict__[key] if isinstance(value, BaseModel) else value[key]
+        return value
+
+    def attach(self, value: Any) -> None:
+        """register models added below the model in place with its transport, see `attach`"""
+        from .model import attach
+
+        model = self.model
+        private = model.__pydantic_private__
+        transport = private["_transport"]
+        if transport is not None and private["_owned"] is None and transport.registry.get(model.id) is model:
+            attach(value, transport, root=transport.roots.get(model.id, model.id))
+
+    def detach(self, value: Any) -> None:
+        """unregister models removed from below the model in place, see `detach`"""
+        from .model import detach
+
+        transport = self.model.__pydantic_private__["_transport"]
+        if transport is not None:
+            detach(value, transport)
+
+    def _schedule(self) -> None:
+        if self.interval:
+            self._handle = self.loop.call_later(self.interval, self.flush)
+        else:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send whatever changed since the last flush, if anything"""
+        from .patch import Patch
+        from .update import Update
+
+        with self._lock:
+            dirty, changes, inserted = self.dirty, self.changes, self._inserted
+            self.dirty, self.changes, self._inserted = {}, [], {}
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not dirty and not changes:
+            return
+
+        # inserts and removals first, in order, as their paths are only right once those before them are applied
+        patch = [Patch(op=op, path=list(path), value=value) for op, path, value in changes]
+
+        # then plain values at their paths by now, in field order
+        paths: Dict[Tuple[Any, ...], None] = {}
+        for node, key in dirty.values():
+            found = self._path(node, [key], inserted)
+            if found is not None:
+                # NOTE: up to a dict a patch can't address, if there is one on the way, which is sent whole
+                paths[found[0]] = None
+        model = self.model
+        order = {name: index for index, name in enumerate(model.__class__.model_fields)}
+        patch.extend(Patch(op="set", path=list(path), value=self._resolve(path)) for path in sorted(paths, key=lambda path: order[path[0]]))
+        if patch:
+            model.send(Update(patch=patch, model_type=model.__class__.__name__, model_target=model.id))
+
+
+def _position(index: Any, count: int) -> int:
+    """index into a list of `count` items, counted from the start"""
+    index = operator.index(index)
+    return index + count if index < 0 else index
+
+
+def _link(node: Any) -> Tuple[Any, Any]:
+    """what a tracked value is in, and under which field, key or index"""
+    if isinstance(node, (TrackedList, TrackedDict)):
+        return node._parent, node._key
+    _, parent, key = node.__pydantic_private__["_tracker"]
+    return parent, key
+
+
+def _relink(node: Any, parent: Any, key: Any) -> None:
+    if isinstance(node, (TrackedList, TrackedDict)):
+        node._parent, node._key = parent, key
+    else:
+        node.__pydantic_private__["_tracker"] = (node.__pydantic_private__["_tracker"][0], parent, key)
+
+
+def tracked(value: Any, tracker: Tracker, parent: Any, key: Any) -> Any:
+    """Link `value` and everything below it to `key` of `parent`, a model, list or dict tracked by `tracker`,
+    so that changes to it are marked by path. Returns `value`, with lists and dicts replaced by tracked ones."""
+    from .model import BaseModel
+
+    if isinstance(value, BaseModel):
+        private = value.__pydantic_private__
+        link = private["_tracker"]
+        private["_tracker"] = (tracker, parent, key)
+        if link is not None and link[0] is tracker:
+            # already linked, along with everything below it
+            return value
+        fields = value.__dict__
+        for name in value.__class__._traversal():
+            fields[name] = tracked(fields[name], tracker, value, name)
+        return value
+    if isinstance(value, (TrackedList, TrackedDict)) and value._tracker is tracker:
+        _relink(value, parent, key)
+        return value
+    if isinstance(value, list):
+        items = TrackedList((), tracker, parent, key)
+        list.extend(items, (tracked(item, tracker, items, index) for index, item in enumerate(value)))
+        return items
+    if isinstance(value, dict):
+        entries = TrackedDict((), tracker, parent, key)
+        dict.update(entries, {name: tracked(item, tracker, entries, name) for name, item in value.items()})
+        return entries
+    return value
+
+
+class TrackedList(list):
+    """A list which records the items set in, inserted into or removed from it, or all of it when it is
+    sorted, reversed, cleared or sliced, and keeps the transport's registry in step with the models in it"""
+
+    __slots__ = ("_tracker", "_parent", "_key")
+
+    def __init__(self, items: Any, tracker: Tracker, parent: Any, key: Any):
+        super().__init__(items)
+        self._tracker = tracker
+        self._parent = parent
+        self._key = key
+
+    def __reduce_ex__(self, protocol: Any) -> Any:
+        # copies and pickles are plain lists
+        return (list, (list(self),))
+
+    def _changed(self) -> None:
+        self._tracker.mark(self)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        tracker = self._tracker
+        if isinstance(index, slice):
+            previous, value = self[index], [tracked(item, tracker, self, None) for item in value]
+            super().__setitem__(index, value)
+            tracker.detach(previous)
+            tracker.attach(value)
+            self._changed()
+            return
+        # marked by position, whichever end it is counted from
+        index = range(len(self))[index]
+        previous, value = self[index], tracked(value, tracker, self, index)
+        super().__setitem__(index, value)
+        tracker.detach(previous)
+        tracker.attach(value)
+        tracker.mark(self, index)
+
+    def __delitem__(self, index: Any) -> None:
+        count, previous = len(self), self[index]
+        super().__delitem__(index)
+        self._tracker.detach(previous)
+        if isinstance(index, slice):
+            self._changed()
+        else:
+            self._tracker.remove(self, _position(index, count))
+
+    def __iadd__(self, values: Any) -> "TrackedList":  # type: ignore[override]
+        self.extend(values)
+        return self
+
+    def __imul__(self, count: Any) -> "TrackedList":  # type: ignore[override]
+        previous = list(self) if count < 1 else None
+        super().__imul__(count)
+        if previous:
+            self._tracker.detach(previous)
+        self._changed()
+        return self
+
+    def append(self, value: Any) -> None:
+        count = len(self)
+        value = tracked(value, self._tracker, self, count)
+        super().append(value)
+        self._tracker.attach(value)
+        self._tracker.insert(self, count, value)
+
+    def extend(self, values: Any) -> None:
+        count = len(self)
+        values = [tracked(value, self._tracker, self, count + offset) for offset, value in enumerate(values)]
+        super().extend(values)
+        self._tracker.attach(values)
+        for offset, value in enumerate(values):
+            self._tracker.insert(self, count + offset, value)
+
+    def insert(self, index: Any, value: Any) -> None:
+        # clamped to the ends, like `list.insert`
+        index = min(max(_position(index, len(self)), 0), len(self))
+        value = tracked(value, self._tracker, self, index)
+        super().insert(index, value)
+        self._tracker.attach(value)
+        self._tracker.insert(self, index, value)
+
+    def pop(self, index: Any = -1) -> Any:
+        count = len(self)
+        value = super().pop(index)
+        self._tracker.detach(value)
+        self._tracker.remove(self, _position(index, count))
+        return value
+
+    def remove(self, value: Any) -> None:
+        del self[self.index(value)]
+
+    def clear(self) -> None:
+        previous = list(self)
+        super().clear()
+        self._tracker.detach(previous)
+        self._changed()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._changed()
+
+
+class TrackedDict(dict):
+    """A dict which records the keys set in or removed from it, or all of it when it is cleared,
+    and keeps the transport's registry in step with the models in it"""
+
+    __slots__ = ("_tracker", "_parent", "_key")
+
+    def __init__(self, items: Any, tracker: Tracker, parent: Any, key: Any):
+        super().__init__(items)
+        self._tracker = tracker
+        self._parent = parent
+        self._key = key
+
+    def __reduce_ex__(self, protocol: Any) -> Any:
+        # copies and pickles are plain dicts
+        return (dict, (dict(self),))
+
+    def _changed(self) -> None:
+        self._tracker.mark(self)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        tracker = self._tracker
+        previous, value = self.get(key), tracked(value, tracker, self, key)
+        super().__setitem__(key, value)
+        tracker.detach(previous)
+        tracker.attach(value)
+        # keys a patch can't address send the whole dict
+        tracker.mark(self, key if isinstance(key, (str, int)) else None)
+
+    def __delitem__(self, key: Any) -> None:
+        previous = self[key]
+        super().__delitem__(key)
+        self._tracker.detach(previous)
+        self._removed(key)
+
+    def _removed(self, key: Any) -> None:
+        if isinstance(key, (str, int)):
+            self._tracker.remove(self, key)
+        else:
+            # keys a patch can't address send the whole dict
+            self._changed()
+
+    def __ior__(self, other: Any) -> "TrackedDict":  # type: ignore[override]
+        self.update(other)
+        return self
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        if key not in self:
+            return super().pop(key, *default)
+        value = super().pop(key)
+        self._tracker.detach(value)
+        self._removed(key)
+        return value
+
+    def popitem(self) -> Any:
+        item = super().popitem()
+        self._tracker.detach(item[1])
+        self._removed(item[0])
+        return item
+
+    def clear(self) -> None:
+        previous = list(self.values())
+        super().clear()
+        self._tracker.detach(previous)
+        self._changed()
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        values = {key: tracked(value, self._tracker, self, key) for key, value in dict(*args, **kwargs).items()}
+        previous = [self[key] for key in values if key in self]
+        super().update(values)
+        self._tracker.detach(previous)
+        self._tracker.attach(list(values.values()))
+        for key in values:
+            self._tracker.mark(self, key if isinstance(key, (str, int)) else None)
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key in self:
+            return self[key]
+        self[key] = default
+        return self[key]
@@ -1,10 +1,28 @@
 from abc import ABCMeta
-from asyncio import AbstractEventLoop, get_event_loop, run_coroutine_threadsafe
-from typing import Dict, Optional, Type, get_args, get_origin
+from asyncio import AbstractEventLoop, Future, QueueEmpty, get_event_loop, get_running_loop, run_coroutine_threadsafe
+from collections import OrderedDict
+from concurrent.futures import Executor
+from functools import partial
+from itertools import chain
+from time import perf_counter, time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type, TypeVar, get_args, get_origin
 from uuid import uuid4
 
-from .model import BaseModel
-from .update import Update
+from .broadcast import Broadcast
+from .cache import SnapshotCache
+from .chunks import extend, split
+from .dispatch import Dispatcher
+from .exceptions import UpdateMalformed
+from .journal import Journal
+from .metrics import Sink, created, model_type, size
+from .model import BaseModel, attach, detach
+from .mux import Getter, Mux
+from .patch import PathElement, diff, index, locate
+from .queues import Policy, UpdateQueue
+from .replay import ReplayBuffer
+from .update import Chunk, Subscription, Update
+
+T = TypeVar("T")
 
 
 class ThreadedMixin:
@@ -26,8 +44,14 @@ class ThreadedMixin:
 class Transport(ThreadedMixin, metaclass=ABCMeta):
     # Server attributes
     readonly: Dict[str, bool]  # Client -> T/F
-    models: Dict[str, BaseModel]  # Client -> Model
+    models: Dict[str, BaseModel]  # Client -> Model, the first one hosted
     clients: Dict[str, str]  # Model ID -> Client
+    serving: Dict[str, BaseModel]  # Model ID -> Model, which clients may subscribe to, see `serve`
+    broadcasts: Dict[str, Broadcast]  # Model ID -> Broadcast
+    replays: Dict[str, ReplayBuffer]  # Model ID -> recent updates, for resuming clients
+    replay_size: int  # updates kept per shared model, 0 disables resuming
+    replay_idle: int  # replay buffers kept for shared models nobody is subscribed to, least recently left dropped first
+    journal: Optional[Journal]  # persists shared models and their updates, for restarts and resuming clients
     type: Type = BaseModel
 
     # Client attributes
@@ -35,22 +59,99 @@ class Transport(ThreadedMixin, metaclass=ABCMeta):
     # Model ID -> Model
     # NOTE this is reused for both client and server
     model_map: Dict[str, Type[BaseModel]]  # Class name -> BaseModel type
+    seqs: Dict[str, int]  # Model ID -> sequence number of the last update received
+    subscribing: Dict[str, Future]  # Model ID -> subscription waiting for its snapshot
+    loading: Dict[str, Future]  # Model ID -> chunked snapshot waiting for the rest of its chunks
+    rebinding: Dict[str, str]  # Client -> ID of the model the client's next snapshot may come back as a copy of, see `rebind`
+    _chunks: Dict[str, int]  # Model ID -> number of chunks still to come
 
     # General attributes
+    registry: Dict[str, BaseModel]  # Model ID -> Model, for every model attached to the transport however deeply nested
+    roots: Dict[str, str]  # Model ID -> ID of the top level model it is nested in
+    subscriptions: Dict[str, Dict[str, BaseModel]]  # Client -> Model ID -> Model, as seen by the client
+    muxes: Dict[str, Mux]  # Client -> outgoing updates of every subscribed model
     loop: AbstractEventLoop
+    sink: Optional[Sink]  # metrics sink, nothing is measured if None
+    dispatcher: Optional[Dispatcher]  # applies incoming updates concurrently, in order if None
+    offload: Optional[Executor]  # thread pool to encode large models in, inline if None
+    offload_threshold: int  # encoded size in bytes past which a model is encoded in `offload`
+    chunk_size: int  # items per chunk of large list fields in snapshots, 0 sends snapshots whole
+    # encoded snapshots of tracked models, see `BaseModel.track`, for clients connecting while a model is unchanged
+    snapshots: Optional[SnapshotCache]
+    _unsent: Dict[str, List[str]]  # Client -> ids of updates handed out but not yet sent, only when instrumented
+    _options: Dict[str, Dict[str, Any]]  # Client -> `host` options, reused for its subscriptions
+    _idle: "OrderedDict[str, ReplayBuffer]"  # Model ID -> replay buffer of a shared model nobody is subscribed to, see `replay_idle`
+    _servers: Dict[str, Set[str]]  # Model ID -> clients it is served for the connection of, "" for until `unserve`d
+    _hosting: Dict[str, int]  # Model ID -> number of clients it is hosted for, directly or through a view
+    _origins: Dict[str, str]  # Model ID of a client's view -> ID of the model it was taken from
+    _indexes: Dict[str, Dict[str, List[PathElement]]]  # Model ID of a client's view -> Model ID -> path to it within the view, see `locate`
+    _sizes: Dict[str, int]  # Model ID -> encoded size of its last full update, only when offloading and while hosted
+    _encoding: Dict[str, Future]  # Model ID -> offloaded encode in progress
+
+    def __init__(
+        self,
+        event_loop=None,
+        sink: Optional[Sink] = None,
+        replay_size: int = 0,
+        dispatcher: Optional[Dispatcher] = None,
+        offload: Optional[Executor] = None,
+        offload_threshold: int = 1 << 20,
+        chunk_size: int = 0,
+        snapshot_cache: int = 0,
+        journal: Optional[Journal] = None,
+        replay_idle: int = 64,
+    ):
+        if journal is not None and self.type not in (str, bytes):
+            # see `Journal.append`
+            raise TypeError(f"{self.__class__.__name__} doesn't encode updates, so can't journal them")
 
-    def __init__(self, event_loop=None):
         # Server attributes
         self.readonly = {}
         self.models = {}
         self.clients = {}
+        self.serving = {}
+        self.broadcasts = {}
+        self.replays = {}
+        self.replay_size = replay_size
+        self.replay_idle = replay_idle
+        self.journal = journal
 
         # Client attributes
         self.server_models = {}
         self.model_map = {}
+        self.seqs = {}
+        self.subscribing = {}
+        self.loading = {}
+        self.rebinding = {}
+        self._chunks = {}
 
         # General attributes
+        self.registry = {}
+        self.roots = {}
+        self.subscriptions = {}
+        self.muxes = {}
         self.loop = event_loop or get_event_loop()
+        self.sink = sink
+        self.dispatcher = dispatcher
+        if dispatcher is not None and dispatcher.sink is None:
+            dispatcher.sink = sink
+        self.offload = offload
+        self.offload_threshold = offload_threshold
+        self.chunk_size = chunk_size
+        self.snapshots = SnapshotCache(max_bytes=snapshot_cache) if snapshot_cache else None
+        self._unsent = {}
+        self._options = {}
+        self._idle = OrderedDict()
+        self._servers = {}
+        self._hosting = {}
+        self._origins = {}
+        self._indexes = {}
+        self._sizes = {}
+        self._encoding = {}
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "Transport":
+        # deep copies of attached models share the transport
+        return self
 
     ##################
     # Server methods #
@@ -70,7 +171,18 @@ class Transport(ThreadedMixin, metaclass=ABCMeta):
         # and return the (possibly generated) client id
         return client_id
 
-    async def host(self, model: BaseModel, client_id: str, shared: bool = True, readonly: bool = False) -> None:
+    async def host(
+        self,
+        model: BaseModel,
+        client_id: str,
+        shared: bool = True,
+        readonly: bool = False,
+        echo: bool = True,
+        queue_size: int = 0,
+        queue_policy: Policy = "block",
+        max_rate: float = 0.0,
+        min_interval: float = 0.0,
+    ) -> None:
         """Host a model for a given client.
 
         Args:
@@ -78,30 +190,204 @@ class Transport(ThreadedMixin, metaclass=ABCMeta):
             client_id (Optional[str], optional): A unique string to represent the client, should be generated if not provided. Defaults to None.
             shared (bool, optional): Whether or not the model should be shared amonst multiple clients.
                                      If False, the model will be copied. Defaults to True.
-            readonly (bool, optional): Whether or not the client should be able to modify the model. Defaults to False.
+            readonly (bool, optional): Whether or not the client should be able to modify the model.
+                                       If True, the model is shared regardless and the client's updates are ignored. Defaults to False.
+            echo (bool, optional): Whether or not changes sent by the client to a shared model should be broadcast back to it. Defaults to True.
+            queue_size (int, optional): bound on the updates queued for the client, 0 for unbounded. Defaults to 0.
+            queue_policy (Policy, optional): what to do once the client's queue is full, see `UpdateQueue`. Defaults to "block".
+            max_rate (float, optional): bound on how often the client is sent updates, in flushes per second across all of its models,
+                                        with superseded updates dropped in between, see `Mux`. 0 for unlimited. Defaults to 0.0.
+            min_interval (float, optional): min seconds between flushes of each of the client's models, see `Mux`. 0 for unlimited. Defaults to 0.0.
 
         Returns:
             str: client id, either the provided value or the newly generated client id
         """
-        if not shared or readonly:
-            # copy the model
-            model = model.copy()
+        # pace what the client is sent, across every model it is subscribed to
+        mux = self.muxes.setdefault(client_id, Mux())
+        mux.rate, mux.interval = max_rate, min_interval
 
-        if readonly:
-            # mark model as readonly
-            model.freeze()
+        # remember how to host models for this client, for when it subscribes to more
+        options = self._options[client_id] = dict(shared=shared, readonly=readonly, echo=echo, queue_size=queue_size, queue_policy=queue_policy)
 
         # maintain map of client id -> model id
-        self.models[client_id] = model
+        self.models[client_id] = self._host(model, client_id, **options)
+        if self.journal is not None:
+            await self._checkpoint(self.models[client_id])
+
+        # maintain map of if client's view is readonly
+        self.readonly[client_id] = readonly
+
+    def _host(self, model: BaseModel, client_id: str, shared: bool, readonly: bool, echo: bool, queue_size: int, queue_policy: Policy) -> BaseModel:
+        """host one more model for a client, returning the model as seen by the client"""
+        if model._transport is None or (model._transport is self and model.id not in self.registry):
+            # attach so the model and its children can reach us, e.g. for metrics,
+            # before any copies which share its children, again if released since, see `_release`
+            model.onTransport(self)
+        self._hosting[model.id] = self._hosting.get(model.id, 0) + 1
+
+        if not shared and not readonly:
+            # copy the model, lazily, see `BaseModel.view`
+            origin = model
+            model = model.view()
+            self._origins[model.id] = origin.id
+            # nested updates are routed through the view, see `_nested`
+            self._indexes[model.id] = index(model)
+
+            if queue_size:
+                # the copy's queue is the client's queue
+                model.boundQueue(maxsize=queue_size, policy=queue_policy)
 
         # maintain reverse map of model id -> client id
         self.clients[model.id] = client_id
 
-        # maintain map of if client's view is readonly
-        self.readonly[client_id] = readonly
+        if shared or readonly:
+            # fan out to every client through a single broadcast, readonly clients are only refused writes, see `receive`
+            if model.id not in self.broadcasts:
+                journal = partial(self._journal, model) if self.journal is not None else None
+                self.broadcasts[model.id] = Broadcast(model=model, encode=self.encodeAsync, replay=self._replay(model), journal=journal)
+            self.broadcasts[model.id].subscribe(client_id=client_id, echo=echo, queue_size=queue_size, queue_policy=queue_policy)
+
+        self._subscribe(client_id, model)
 
         # notify model of connection
         model.notifyConnect(client_id=client_id)
+        return model
+
+    def _subscribe(self, client_id: str, model: BaseModel) -> None:
+        # route updates to and from the client through the model
+        self.subscriptions.setdefault(client_id, {})[model.id] = model
+        if client_id not in self.muxes:
+            self.muxes[client_id] = Mux()
+        self.muxes[client_id].add(model.id, *self._source(client_id, model))
+
+    def _source(self, client_id: str, model: BaseModel) -> Tuple[UpdateQueue, Getter]:
+        """the queue feeding a client with a model's updates, and how to pull from it"""
+        broadcast = self.broadcasts.get(model.id)
+        if broadcast is not None and client_id in broadcast.channels:
+            # shared model, already encoded once for all clients
+            return broadcast.channels[client_id], partial(broadcast.getNowait, client_id)
+
+        def getter() -> Tuple[Any, str]:
+            update = model.getNowait()
+            if isinstance(update, Chunk):
+                # part of a snapshot, which aren't measured
+                return self.encode(update), update.id
+            return self._encode(update), update.id
+
+        return model._queue(), getter
+
+    def serve(self, model: BaseModel, client_id: str = "") -> None:
+        """Allow clients to subscribe to a model by its id, see `subscribe`
+
+        Args:
+            model (BaseModel): model to serve
+            client_id (str, optional): serve only until this client disconnects, e.g. for a `Server`'s `models`.
+                                       Defaults to "", until `unserve`d.
+        """
+        self.serving[model.id] = model
+        self._servers.setdefault(model.id, set()).add(client_id)
+
+    def unserve(self, model_id: str, client_id: str = "") -> None:
+        """Stop serving a model for `client_id`, and so to new subscribers once nobody else serves it, see `serve`
+
+        Args:
+            model_id (str): id of the model
+            client_id (str, optional): as passed to `serve`. Defaults to "".
+        """
+        servers = self._servers.get(model_id)
+        if servers is None:
+            return
+        servers.discard(client_id)
+        if not servers:
+            del self._servers[model_id]
+            del self.serving[model_id]
+
+    async def subscribe(self, client_id: str, model_id: str) -> BaseModel:
+        """Host a served model for an already connected client, with the same options as its first.
+        The model's snapshot is queued ahead of its updates, addressed to `model_id`,
+        in chunks if `chunk_size` is set so that it doesn't hold up the client's other models.
+
+        Args:
+            client_id (str): client id
+            model_id (str): id of the served model
+
+        Returns:
+            BaseModel: the model as seen by the client
+        """
+        if model_id not in self.serving:
+            raise UpdateMalformed(f"Model ({model_id}) not served, did you forget to call `serve`?")
+        model = self._host(self.serving[model_id], client_id, **self._options[client_id])
+        if self.journal is not None:
+            await self._checkpoint(model)
+
+        return await self._settle(client_id, model, partial(self._queueSnapshot, client_id, model, model_id))
+
+    async def _queueSnapshot(self, client_id: str, model: BaseModel, model_id: str) -> BaseModel:
+        snapshot = self._snapshot(model, model_target=model_id)
+        queue, _ = self.muxes[client_id].sources[model.id]
+        if queue is model._queue():
+            for part in split(snapshot, self.chunk_size):
+                queue.put_nowait(part)
+        elif self.chunk_size:
+            for part in split(snapshot, self.chunk_size):
+                queue.put_nowait((None, self.encode(part), snapshot.id, None, None))
+        else:
+            queue.put_nowait((None, await self._encodeSnapshot(model, model_target=model_id), snapshot.id, None, None))
+        return model
+
+    def unsubscribe(self, client_id: str, model_id: str) -> None:
+        """Stop sending a model to a client, or receiving it from the server
+
+        Args:
+            client_id (str): client id
+            model_id (str): id of the model, as seen by the client
+        """
+        model = self.subscriptions.get(client_id, {}).pop(model_id, None)
+        if model is None:
+            return
+
+        mux = self.muxes.get(client_id)
+        if mux is not None:
+            mux.remove(model.id)
+        if self.clients.get(model.id) == client_id:
+            self.clients.pop(model.id)
+
+        broadcast = self.broadcasts.get(model.id)
+        if broadcast is not None:
+            broadcast.unsubscribe(client_id=client_id)
+            if not broadcast.channels:
+                self.broadcasts.pop(model.id, None)
+                self._retire(model.id)
+
+        origin = self._origins.pop(model.id, None)
+        if origin is not None:
+            # the client's own view, see `_host`
+            self._indexes.pop(model.id, None)
+            self._sizes.pop(model.id, None)
+        self._release(origin or model.id)
+        if self.server_models.get(model.id) is model:
+            # received from the server, see `_onSnapshot`
+            del self.server_models[model.id]
+            self._sizes.pop(model.id, None)
+            detach(model, self)
+
+        # notify model of disconnect
+        model.notifyDisconnect(client_id=client_id)
+
+    def _release(self, model_id: str) -> None:
+        """one less client hosting a model, which is detached once none are left"""
+        hosting = self._hosting.get(model_id)
+        if hosting is None:
+            # not hosted, e.g. on the client side
+            return
+        if hosting > 1:
+            self._hosting[model_id] = hosting - 1
+            return
+        del self._hosting[model_id]
+        self._sizes.pop(model_id, None)
+        model = self.registry.get(model_id)
+        if model is not None:
+            detach(model, self)
 
     async def onDisconnect(self, model: BaseModel, client_id: str) -> None:
         """Disconnect and cleanup client-specific assets.
@@ -111,23 +397,227 @@ class Transport(ThreadedMixin, metaclass=ABCMeta):
         Args:
             client_id (str): _description_
         """
-        model = self.models.pop(client_id, None) or model  # type: ignore[arg-type]
+        self.models.pop(client_id, None)
         self.readonly.pop(client_id, None)
-        self.clients.pop(model.id, None)
+        self._options.pop(client_id, None)
+        self._unsent.pop(client_id, None)
 
-        # notify model of disconnect
-        model.notifyDisconnect(client_id=client_id)
+        subscribed = list(self.subscriptions.get(client_id, ()))
+        for model_id in subscribed:
+            self.unsubscribe(client_id=client_id, model_id=model_id)
+        self.subscriptions.pop(client_id, None)
+        self.muxes.pop(client_id, None)
+
+        for model_id in [model_id for model_id, servers in self._servers.items() if client_id in servers]:
+            self.unserve(model_id=model_id, client_id=client_id)
+
+        if not subscribed:
+            # notify model of disconnect
+            model.notifyDisconnect(client_id=client_id)
+
+    def initial(self, client_id: str, model_id: str = "") -> Any:
+        """Create an initial update to be sent to the client, encoded for the wire, see `encode`
+
+        Args:
+            client_id (str): client id for looking up model to send
+            model_id (str, optional): id of one of the client's subscribed models. Defaults to the first one hosted.
+
+        Returns:
+            Any: the initial model to send to the client
+        """
+        return self.encode(self._snapshot(self._hosted(client_id, model_id)))
+
+    async def initialAsync(self, client_id: str, model_id: str = "") -> Any:
+        """Like `initial`, encoded off the loop if large, see `encodeAsync`, and cached while the model is unchanged, see `snapshots`.
+        Taken in between the updates the client is sent, so that it is sent none of those the snapshot reflects.
+
+        Transports which overload `initial` have it called instead, and only an `Update` it returns is encoded here."""
+        model = self._hosted(client_id, model_id)
+        if type(self).initial is not Transport.initial:
+            return await self._settle(client_id, model, partial(self._initialOverloaded, client_id, model_id))
+        return await self._settle(client_id, model, partial(self._encodeSnapshot, model))
 
-    def initial(self, client_id: str) -> Update:
-        """Create an initial update to be sent to the client
+    async def _initialOverloaded(self, client_id: str, model_id: str) -> Any:
+        initial = self.initial(client_id=client_id, model_id=model_id)
+        if isinstance(initial, Update):
+            return await self.encodeAsync(initial, traced=False)
+        return initial
+
+    def _hosted(self, client_id: str, model_id: str = "") -> BaseModel:
+        """a client's model as seen by the client, the first one hosted if no `model_id`"""
+        return self.subscriptions[client_id][model_id] if model_id else self.models[client_id]
+
+    async def _settle(self, client_id: str, model: BaseModel, take: Callable[[], Awaitable[T]]) -> T:
+        """snapshot a model for a client with `take`, dropping whatever the snapshot reflects from the client's queue"""
+        broadcast = self.broadcasts.get(model.id)
+        if broadcast is not None and client_id in broadcast.channels:
+            return await broadcast.settle(client_id, take)
+
+        # the client's own copy, whatever it queued so far is in the snapshot
+        model._queue().clear()
+        return await take()
+
+    async def _encodeSnapshot(self, model: BaseModel, model_target: str = "") -> Any:
+        if self.snapshots is None or model._tracker is None:
+            # untracked models may be changed in place anywhere below, without their version moving on
+            return await self.encodeAsync(self._snapshot(model, model_target=model_target), traced=False)
+
+        # changed if either the model was changed, however deep, or an update to it published, e.g. by `patch`
+        broadcast = self.broadcasts.get(model.id)
+        version = (model._version, broadcast.published if broadcast is not None else 0)
+        key = (model.id, model_target or model.id)
+
+        frame = self.snapshots.get(key, version)
+        if self.sink is not None:
+            self.sink.count("snapshot.cache.hits" if frame is not None else "snapshot.cache.misses", model=model.__class__.__name__)
+        if frame is None:
+            frame = await self.encodeAsync(self._snapshot(model, model_target=model_target), traced=False)
+            self.snapshots.put(key, version, frame)
+        return frame
+
+    def initialChunks(self, client_id: str, model_id: str = "") -> Iterator[Any]:
+        """Like `initial`, encoded as a sequence of frames with the items of large list fields
+        split off into chunks of `chunk_size`, which are only encoded as they are iterated over.
 
         Args:
             client_id (str): client id for looking up model to send
+            model_id (str, optional): id of one of the client's subscribed models. Defaults to the first one hosted.
+
+        Returns:
+            Iterator[Any]: the encoded snapshot, then its chunks
+        """
+        parts = split(self._snapshot(self._hosted(client_id, model_id)), self.chunk_size)
+        # the head copies the model's large lists, so the snapshot is taken here, see `initialChunksAsync`
+        head = self.encode(next(parts))  # type: ignore[arg-type]
+        return chain((head,), map(self.encode, parts))  # type: ignore[arg-type]
+
+    async def initialChunksAsync(self, client_id: str, model_id: str = "") -> Iterator[Any]:
+        """Like `initialChunks`, taken in between the updates the client is sent, see `initialAsync`"""
+        model = self._hosted(client_id, model_id)
+        return await self._settle(client_id, model, partial(self._initialChunks, client_id, model_id))
+
+    async def _initialChunks(self, client_id: str, model_id: str) -> Iterator[Any]:
+        return self.initialChunks(client_id=client_id, model_id=model_id)
+
+    def _snapshot(self, model: BaseModel, model_target: str = "") -> Update:
+        broadcast = self.broadcasts.get(model.id)
+        seq = broadcast.replay.seq if broadcast is not None and broadcast.replay is not None else 0
+
+        # the snapshot includes every update sequenced so far
+        return Update(model=model, model_target=model_target or model.id, seq=seq)
+
+    async def resume(self, client_id: str, seq: int) -> Optional[List[Any]]:
+        """Encoded updates a reconnecting client missed, to be sent instead of `initial`.
+        Its own updates are left out if it was hosted without `echo`.
+
+        Args:
+            client_id (str): client id, already hosted
+            seq (int): sequence number of the last update the client saw
+
+        Returns:
+            Optional[List[Any]]: missed updates in order, or None if the client needs a full snapshot
+        """
+        model_id = self.models[client_id].id
+        broadcast = self.broadcasts.get(model_id)
+        if broadcast is None or broadcast.replay is None:
+            return None
+        # published from here on are sent as usual, as for a snapshot
+        return await broadcast.settle(client_id, partial(self._missed, broadcast, client_id, seq))
+
+    async def _missed(self, broadcast: Broadcast, client_id: str, seq: int) -> Optional[List[Any]]:
+        replay: ReplayBuffer = broadcast.replay  # type: ignore[assignment]
+        echo = broadcast.echo[client_id]
+        missed = replay.since(seq, exclude=None if echo else client_id)
+        if missed is None and self.journal is not None and echo:
+            # further back than is buffered, though the journal doesn't know who sent what
+            missed = self.history(broadcast.model.id, seq + 1, replay.seq) if seq <= replay.seq else None
+        return missed
+
+    def _replay(self, model: BaseModel) -> Optional[ReplayBuffer]:
+        # kept across broadcasts, so clients can resume after everyone disconnected, see `_retire`
+        if not self.replay_size and self.journal is None:
+            return None
+        idle = self._idle.pop(model.id, None)
+        if idle is not None:
+            self.replays[model.id] = idle
+        elif model.id not in self.replays:
+            # journaled updates are sequenced even if none are buffered, carrying on from before a restart
+            seq = self.journal.seq(model.id) if self.journal is not None else None
+            self.replays[model.id] = ReplayBuffer(self.replay_size, seq=seq)
+        return self.replays[model.id]
+
+    def _retire(self, model_id: str) -> None:
+        """keep a shared model's replay buffer once nobody is subscribed to it, for up to `replay_idle` models"""
+        replay = self.replays.pop(model_id, None)
+        if replay is None:
+            return
+        self._idle[model_id] = replay
+        while len(self._idle) > self.replay_idle:
+            self._idle.popitem(last=False)
+
+    async def _journal(self, model: BaseModel, update: Optional[Update], frame: Any) -> None:
+        """journal an update to a shared model as it is published, see `Broadcast.checkpoint`"""
+        journal: Journal = self.journal  # type: ignore[assignment]
+        if update is not None and journal.snapshotted(model.id):
+            # nothing to replay it onto otherwise
+            journal.append(model.id, update.seq, frame)
+
+        seq = self.replays[model.id].seq
+        if not journal.due(model.id, seq):
+            return
+        tracking = model._tracker
+        if model._queue().backlog() or (tracking is not None and (tracking[0].dirty or tracking[0].changes)):
+            # the model is ahead of the updates sequenced so far, try again after the next one
+            return
+        # NOTE: straight from the model, a cached snapshot may not be the version sequenced so far
+        journal.snapshot(model.id, seq, await self.encodeAsync(self._snapshot(model), traced=False))
+
+    async def _checkpoint(self, model: BaseModel) -> None:
+        broadcast = self.broadcasts.get(model.id)
+        if broadcast is not None:
+            await broadcast.checkpoint()
+
+    def history(self, model_id: str, start: int, end: Optional[int] = None) -> Optional[List[Any]]:
+        """Updates to a shared model with sequence numbers from `start` to `end` inclusive, read from the journal
+        already encoded, e.g. to replay to a client
+
+        Args:
+            model_id (str): id of the model
+            start (int): sequence number of the first update
+            end (Optional[int], optional): sequence number of the last update, None for the latest. Defaults to None.
+
+        Returns:
+            Optional[List[Any]]: encoded updates in order, or None if some of them aren't journaled
+        """
+        frames = self.journal.history(model_id, start, end) if self.journal is not None else None
+        if frames is None or self.type is not str:
+            return frames
+        return [frame.decode() for frame in frames]
+
+    async def restore(self, model_id: str) -> Optional[BaseModel]:
+        """Rebuild a shared model after a restart, from the latest snapshot in the journal and every update journaled since.
+        Host it as usual, and clients pick up where they left off.
+
+        Args:
+            model_id (str): id of the model
 
         Returns:
-            Update: the initial model to send to the client
+            Optional[BaseModel]: the model, or None if it isn't journaled
         """
-        return Update(model=self.models[client_id])
+        latest = self.journal.latest(model_id) if self.journal is not None else None
+        if latest is None:
+            return None
+
+        seq, frame = latest
+        model: BaseModel = (await self.decode(frame)).model  # type: ignore[assignment]
+        # attach first, so updates to nested models can be routed
+        model.onTransport(self)
+        for frame in self.journal.since(model_id, seq) or ():  # type: ignore[union-attr]
+            update = await self.decode(frame)
+            target = model if update.model_target == model.id else self.registry.get(update.model_target)
+            if target is not None:
+                target.receive(update)
+        return model
 
     ##################
     # Client methods #
@@ -157,32 +647,397 @@ class Transport(ThreadedMixin, metaclass=ABCMeta):
         # TODO
         self.server_models = {}
 
-    async def onInitial(self, update: Update) -> BaseModel:
-        # TODO multi model and events
-        model = update.model
+    async def onInitial(self, update: Update, client_id: str = "") -> BaseModel:
+        # register, then route everything from the server through the model
+        model = self._onSnapshot(update, client_id)
+
+        # keyed like the connection's sends and receives, see `Connection`
+        self.models[client_id] = model
+
+        # return the instance
+        return model
+
+    def _onSnapshot(self, update: Update, client_id: str) -> BaseModel:
+        model: BaseModel = update.model  # type: ignore[assignment]
 
-        # register in model map
+        # register in model map, along with everything nested within
         self.server_models[model.id] = model
+        model.onTransport(self)
+        if update.seq:
+            self.seqs[model.id] = update.seq
+        if update.chunks:
+            # the rest of the model is on its way, see `loaded`
+            self.loading[model.id] = get_running_loop().create_future()
+            self._chunks[model.id] = update.chunks
+        self._subscribe(client_id, model)
+        return model
 
-        # FIXME
-        self.models[""] = model
+    def loaded(self, model_id: str) -> Future:
+        """Future for a model once every chunk of its snapshot has been received, see `chunk_size`
 
-        # return the instance
+        Args:
+            model_id (str): id of the model
+
+        Returns:
+            Future: resolves to the model, straight away unless it is still loading
+        """
+        future = self.loading.get(model_id)
+        if future is None:
+            future = get_running_loop().create_future()
+            future.set_result(self.server_models.get(model_id))
+        return future
+
+    def _onChunk(self, chunk: Chunk) -> None:
+        model = self.server_models.get(chunk.model_target)
+        if model is None:
+            # e.g. unsubscribed while loading
+            return
+        extend(model, chunk.field, chunk.items)
+
+        remaining = self._chunks.get(model.id)
+        if remaining is None:
+            # e.g. a new snapshot after reconnecting, which replaced the model's contents
+            return
+        if remaining > 1:
+            self._chunks[model.id] = remaining - 1
+            return
+        self._chunks.pop(model.id)
+        self.loading.pop(model.id).set_result(model)
+
+    def expect(self, model_id: str) -> Future:
+        """Future for the snapshot of a model we asked the server to subscribe us to
+
+        Args:
+            model_id (str): id of the model
+
+        Returns:
+            Future: resolves to the model once its snapshot is received
+        """
+        future = self.subscribing[model_id] = get_running_loop().create_future()
+        return future
+
+    def rebind(self, client_id: str, model_id: str) -> None:
+        """Expect a model to come back under a new id, e.g. after reconnecting to a server which hosts
+        each client its own copy, see `BaseModel.view`. If the first update the client is then sent is
+        the snapshot of a model it doesn't know, the model takes on its id and contents.
+
+        Args:
+            client_id (str): client id
+            model_id (str): id of the model, as the client knows it
+        """
+        self.rebinding[client_id] = model_id
+
+    def _rebind(self, client_id: str, model_id: str, update: Update) -> Optional[BaseModel]:
+        model = self.subscriptions.get(client_id, {}).pop(model_id, None)
+        if model is None:
+            return None
+
+        # re-register, with its nested models now under the new id
+        self.muxes[client_id].remove(model_id)
+        self.server_models.pop(model_id, None)
+        self.seqs.pop(model_id, None)
+        detach(model, self)
+        # NOTE: not a change of ours, so neither tracked nor sent
+        model.__dict__["id"] = update.model_target
+        self.server_models[model.id] = model
+        model.onTransport(self)
+        self._subscribe(client_id, model)
         return model
 
     #################
     # Bidirectional #
     #################
-    async def send(self, client_id: str) -> Update:
-        # grab model from client
-        model = self.models[client_id]
+    def encode(self, update: Update) -> Any:
+        """Encode an update for the wire, to be overloaded by concrete transports
 
-        # pull latest send update
-        return await model.getAsync()
+        Args:
+            update (Update): update to encode
 
-    async def receive(self, client_id: str, update: Update) -> None:
-        # grab model from client
+        Returns:
+            Any: the encoded update, of type `type`
+        """
+        return update
+
+    async def decode(self, frame: Any) -> Update:
+        """Decode a single update encoded by `encode`, to be overloaded by concrete transports"""
+        return frame
+
+    def encodeBatch(self, updates: List[Any]) -> Any:
+        """Combine several encoded updates into a single frame, to be overloaded by concrete transports
+
+        Args:
+            updates (List[Any]): updates, as returned by `encode`
+
+        Returns:
+            Any: the encoded batch, of type `type`
+        """
+        return updates
+
+    def _encode(self, update: Update) -> Any:
+        """`encode`, measured if instrumented"""
+        sink = self.sink
+        if sink is None:
+            return self.encode(update)
+
+        start = perf_counter()
+        encoded = self.encode(update)
+        sink.observe("encode.seconds", perf_counter() - start, model=model_type(update))
+        sink.span(update.id, "serialize", time())
+        return encoded
+
+    async def encodeAsync(self, update: Update, traced: bool = True) -> Any:
+        """`encode`, in the `offload` pool if the update carries a model too large to encode on the loop.
+
+        Sizes are learned from the last time each model was encoded, a model not seen before
+        is encoded inline, and forgotten once it's no longer hosted. While a model is being encoded off the loop, incoming
+        updates to it wait, so that they can't change it halfway through.
+
+        Args:
+            update (Update): update to encode
+            traced (bool, optional): whether to measure inline encodes, false for snapshots. Defaults to True.
+
+        Returns:
+            Any: the encoded update, of type `type`
+        """
+        encode = self._encode if traced else self.encode
+        model = update.model
+        if self.offload is None or model is None:
+            return encode(update)
+
+        estimate = self._sizes.get(model.id, 0)
+        if estimate < self.offload_threshold:
+            frame = encode(update)
+            self._sizes[model.id] = len(frame) if isinstance(frame, (str, bytes)) else 0
+            return frame
+
+        while model.id in self._encoding:
+            await self._encoding[model.id]
+        encoding = self._encoding[model.id] = get_running_loop().create_future()
+        try:
+            start = perf_counter()
+            frame = await get_running_loop().run_in_executor(self.offload, self._encodeLarge, update)
+            elapsed = perf_counter() - start
+        finally:
+            del self._encoding[model.id]
+            encoding.set_result(None)
+
+        self._sizes[model.id] = len(frame) if isinstance(frame, (str, bytes)) else 0
+        if self.sink is not None:
+            self.sink.count("encode.offloaded", model=model_type(update))
+            self.sink.count("encode.offloaded.bytes", self._sizes[model.id], model=model_type(update))
+            self.sink.observe("encode.offloaded.seconds", elapsed, model=model_type(update))
+        return frame
+
+    def _encodeLarge(self, update: Update) -> Any:
+        """`encode` for large models, run in the `offload` pool, to be overloaded by concrete transports"""
+        return self.encode(update)
+
+    async def send(self, client_id: str) -> Any:
+        # pull the next update from any of the client's models, already encoded
+        frame, update_id = await self.muxes[client_id].get()
+
+        if self.sink is not None:
+            self._handedOut(client_id, update_id)
+        return frame
+
+    def sendNowait(self, client_id: str) -> Optional[Any]:
+        """Like `send`, but return None instead of waiting if nothing is queued for the client"""
+        try:
+            frame, update_id = self.muxes[client_id].get_nowait()
+        except QueueEmpty:
+            return None
+
+        if self.sink is not None:
+            self._handedOut(client_id, update_id)
+        return frame
+
+    def _handedOut(self, client_id: str, update_id: str) -> None:
+        if update_id:
+            # remember the update until its frame is sent, see `onSent`
+            self._unsent.setdefault(client_id, []).append(update_id)
+        self.sink.gauge("queue.depth", self.queueStats(client_id)["size"], client=client_id)  # type: ignore[union-attr]
+
+    def onSent(self, client_id: str, frame: Any) -> None:
+        """Record a frame sent to the peer, called by connections only when instrumented
+
+        Args:
+            client_id (str): client id
+            frame (Any): the frame as sent
+        """
+        sink: Sink = self.sink  # type: ignore[assignment]
+        now = time()
+        sink.count("messages.out", client=client_id)
+        sink.count("bytes.out", size(frame), client=client_id)
+        for update_id in self._unsent.pop(client_id, ()):
+            sink.span(update_id, "send", now, client=client_id)
+
+    def onReceived(self, client_id: str, frame: Any) -> None:
+        """Record a frame received from the peer, called by connections only when instrumented
+
+        Args:
+            client_id (str): client id
+            frame (Any): the frame as received
+        """
+        sink: Sink = self.sink  # type: ignore[assignment]
+        sink.count("messages.in", client=client_id)
+        sink.count("bytes.in", size(frame), client=client_id)
+
+    def queueStats(self, client_id: str) -> Dict[str, int]:
+        """Size, bound, drops and high-water mark of the queue feeding a client
+
+        Args:
+            client_id (str): client id
+
+        Returns:
+            Dict[str, int]: see `UpdateQueue.stats`
+        """
         model = self.models[client_id]
+        broadcast = self.broadcasts.get(model.id)
+        if broadcast is not None and client_id in broadcast.channels:
+            return broadcast.channels[client_id].stats()
+        return model._queue().stats()
+
+    async def receive(self, client_id: str, update: Update) -> None:
+        if isinstance(update, list):
+            # unpack batches
+            for batched in update:
+                await self.receive(client_id=client_id, update=batched)
+            return
+
+        if isinstance(update, Chunk):
+            self._onChunk(update)
+            return
+
+        if isinstance(update, Subscription):
+            if update.op == "reject":
+                # the server doesn't serve a model we asked for
+                subscribing = self.subscribing.pop(update.model_target, None)
+                if subscribing is not None:
+                    subscribing.set_exception(UpdateMalformed(f"Model ({update.model_target}) not served"))
+            elif update.op == "unsubscribe":
+                self.unsubscribe(client_id=client_id, model_id=update.model_target)
+            elif update.model_target not in self.serving:
+                # tell the client, rather than drop the connection
+                self.muxes[client_id].reply(self.encode(Subscription(op="reject", model_target=update.model_target)))  # type: ignore[arg-type]
+            else:
+                await self.subscribe(client_id=client_id, model_id=update.model_target)
+            return
+
+        if self.readonly.get(client_id):
+            # whatever the target, see `host`
+            return
+
+        # only the first update after reconnecting, see `rebind`
+        rebinding = self.rebinding.pop(client_id, None) if self.rebinding else None
+
+        # route to the target model
+        subscribed = self.subscriptions.get(client_id, {})
+        model = subscribed.get(update.model_target)
+        root = update.model_target
+        if model is None:
+            if update.model_target in self.subscribing and update.model is not None:
+                # snapshot of a model we subscribed to
+                self.subscribing.pop(update.model_target).set_result(self._onSnapshot(update, client_id))
+                return
+            if rebinding is not None and update.model is not None:
+                # snapshot of a fresh copy of our model, applied below like any other
+                model = self._rebind(client_id, rebinding, update)
+                if model is None:
+                    return
+                root = model.id
+            elif not update.model_target:
+                model, root = self.models[client_id], self.models[client_id].id
+            else:
+                # straight to a nested model, as long as it is below one the client subscribed to
+                model = self.registry.get(update.model_target)
+                root = self.roots.get(update.model_target, "")
+                if model is None:
+                    # added in place since it was attached, e.g. appended to a plain list
+                    model, root = self._adopt(subscribed, update.model_target)
+                if model is None or root not in subscribed:
+                    # or below the client's own copy of one, found when applied, see `_nested`
+                    model = next(
+                        (
+                            view
+                            for view in subscribed.values()
+                            if view._owned is not None and locate(view, update.model_target, self._indexes.get(view.id)) is not None
+                        ),
+                        None,
+                    )
+                    if model is None:
+                        # e.g. in flight while unsubscribing
+                        return
+                    root = model.id
+
+        if update.seq:
+            # remember where we are, to resume from after reconnecting
+            self.seqs[root] = update.seq
+
+        if self.dispatcher is None:
+            await self._apply(client_id, model, root, update)
+        else:
+            # NOTE: nested targets share their top level model's lane, so a tree
+            # is never updated by two handlers at once
+            await self.dispatcher.dispatch(root, self._apply, client_id, model, root, update)
+
+    def _adopt(self, subscribed: Dict[str, BaseModel], model_id: str) -> Tuple[Optional[BaseModel], str]:
+        """find a model by id below the registered models a client subscribed to, and register it along with everything below it"""
+        for root in subscribed.values():
+            if self.registry.get(root.id) is not root:
+                # a view, see `_nested`
+                continue
+            found = locate(root, model_id)
+            if found is not None:
+                attach(found[1], self, root=self.roots.get(root.id, root.id))
+                return found[1], root.id
+        return None, ""
+
+    async def _apply(self, client_id: str, model: BaseModel, root: str, update: Update) -> None:
+        """push an update to its target model, then on to the other clients sharing it"""
+        while root in self._encoding:
+            # being encoded off the loop, see `encodeAsync`
+            await self._encoding[root]
+
+        broadcast = self.broadcasts.get(root)
+        if broadcast is None:
+            await self._receive(client_id, model, update)
+        else:
+            # forward the change to the other clients sharing the model
+            await broadcast.apply(partial(self._receive, client_id, model, update), update, origin=client_id)
+
+    async def _receive(self, client_id: str, model: BaseModel, update: Update) -> None:
+        if update.model_target and update.model_target != model.id:
+            nested = self._nested(model, update)
+            if nested is None:
+                return
+            update = nested
+
+        sink = self.sink
+        if sink is not None:
+            start = perf_counter()
+
+        if self.dispatcher is not None and self.dispatcher.executor is not None:
+            await self.dispatcher.call(model.receive, update)
+        else:
+            await model.receiveAsync(update)
+
+        if sink is not None:
+            now, name = time(), model_type(update)
+            sink.observe("apply.seconds", perf_counter() - start, model=name)
+            sink.span(update.id, "apply", now, client=client_id)
+            produced = created(update)
+            if produced is not None:
+                # end to end, across processes this relies on synchronized clocks
+                sink.observe("latency.seconds", now - produced, model=name)
+
+    def _nested(self, view: BaseModel, update: Update) -> Optional[Update]:
+        """an update to a model nested within a view, as patches to the view itself, which copy the path down to it"""
+        found = locate(view, update.model_target, self._indexes.get(view.id))
+        if found is None:
+            # e.g. removed by an earlier update
+            return None
 
-        # push update to model
-        await model.receiveAsync(update)
+        path, target = found
+        patch = update.patch if update.patch is not None else diff(target, update.model)
+        prefixed = [change.model_copy(update={"path": path + change.path}) for change in patch]
+        return update.model_copy(update={"model": None, "patch": prefixed, "model_type": view.__class__.__name__, "model_target": view.id})
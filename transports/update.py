@@ -1,10 +1,12 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, List, Literal, Optional
 from uuid import uuid4
 
+from orjson import dumps
 from pydantic import BaseModel as PydanticBaseModel, Field, PrivateAttr, root_validator  # noqa: F401
 
 from .model import BaseModel
+from .patch import Patch
 
 
 class Update(PydanticBaseModel):
@@ -12,9 +14,12 @@ class Update(PydanticBaseModel):
     id: str = ""
     created: Optional[datetime] = None
     modified: Optional[datetime] = None
+    seq: int = 0  # position in the model's replay buffer, 0 if not sequenced
+    chunks: int = 0  # number of `Chunk`s following a snapshot, to fill in its large list fields
 
     # Advanced fields
-    model: BaseModel
+    model: Optional[BaseModel] = None  # full model
+    patch: Optional[List[Patch]] = None  # or only the changes to `model_target`
 
     # internals
     model_type: str = ""  # class type of `model`
@@ -23,9 +28,12 @@ class Update(PydanticBaseModel):
     @root_validator(pre=True)
     @classmethod
     def apply_validation(cls, values):
-        values["id"] = values.get("id", str(uuid4()))
-        values["created"] = values.get("created", datetime.utcnow())
-        values["model_target"] = values.get("model_target", values["model"].id)
+        if "id" not in values:
+            values["id"] = str(uuid4())
+        if "created" not in values:
+            values["created"] = datetime.utcnow()
+        if "model_target" not in values and values.get("model") is not None:
+            values["model_target"] = values["model"].id
         return values
 
     # pydantic configuration
@@ -40,10 +48,59 @@ class Update(PydanticBaseModel):
 
     # overload dict to include model name
     def dict(self, *args, **kwargs):
-        ret = super().dict(*args, **kwargs)
-        ret["model_type"] = self.model.__class__.__name__
-        return ret
+        # serialize `model` as its concrete subclass, not as the declared base
+        ret = self.model_dump(*args, serialize_as_any=True, **kwargs)
+        model_type = ret.pop("model_type", self.model_type)
+        if self.model is not None:
+            model_type = self.model.__class__.__name__
+
+        # lead with the model type, see `decoder.peek_model_type`
+        return {"model_type": model_type, **ret}
 
     # `json()` doesnt use `dict`, so have to get creative
     def json(self, *args, **kwargs):
-        return self.__config__.json_dumps(self.dict(), default=self.__json_encoder__)
+        return self.binary().decode()
+
+    def binary(self) -> bytes:
+        return dumps(self.dict())
+
+
+class Subscription(PydanticBaseModel):
+    """Ask the other side to start or stop sending a model over the connection, or refuse to"""
+
+    op: Literal["subscribe", "unsubscribe", "reject"]
+    model_target: str  # id of the model
+
+    # pydantic configuration
+    class Config:
+        extra = "forbid"
+        frozen = True
+
+    def json(self, *args, **kwargs):
+        return self.binary().decode()
+
+    def binary(self) -> bytes:
+        # leads with the op, see `JSONTransport.receive`
+        return dumps(self.model_dump())
+
+
+class Chunk(PydanticBaseModel):
+    """Items of a large list field of a snapshot, sent after it and appended in order, see `chunks.split`"""
+
+    op: Literal["chunk"] = "chunk"
+    id: str = ""  # id of the snapshot
+    model_target: str  # id of the model
+    field: str  # name of the list field
+    items: List[Any]
+
+    # pydantic configuration
+    class Config:
+        extra = "forbid"
+        frozen = True
+
+    def json(self, *args, **kwargs):
+        return self.binary().decode()
+
+    def binary(self) -> bytes:
+        # leads with the op, like `Subscription`
+        return dumps(self.model_dump(serialize_as_any=True))